@@ -23,17 +23,25 @@ We train a 1D convnet to predict the correct speaker given a noisy FFT speech sa
 Note:
 
 This example should be run with TensorFlow 2.3 or higher, or tf-nightly.
-The noise samples in the dataset need to be resampled to a sampling rate of 16000 Hz before using the code in this example. In order to do this, you will need to have installed ffmpg.
+The noise samples in the dataset need to be resampled to a sampling rate of 16000 Hz before using the code in this example. This is done in-process with SciPy's polyphase resampling.
+The same pipeline is packaged in `speaker_recognition`, where nothing runs at import time: `python -m speaker_recognition train` trains and saves the model, and the `enroll`, `verify` and `serve` commands load it lazily. This page walks through the steps one at a time.
 Setup
+import math
 import os
-import shutil
 import numpy as np
 
 import tensorflow as tf
 from tensorflow import keras
 
 from pathlib import Path
-from IPython.display import display, Audio
+
+from speaker_recognition.augment import NoiseAugmenter
+from speaker_recognition.enroll import save_class_names
+from speaker_recognition.feature_store import FeatureStore
+from speaker_recognition.noise_bank import build_noise_bank
+from speaker_recognition.packed import ensure_packed, packed_to_dataset
+from speaker_recognition.quantize import export_int8
+from speaker_recognition.train import prepare_dataset_folders
 
 # Get the data from https://www.kaggle.com/kongaevans/speaker-recognition-dataset/download
 # and save it to the 'Downloads' folder in your HOME directory
@@ -66,6 +74,17 @@ SCALE = 0.5
 
 BATCH_SIZE = 128
 EPOCHS = 100
+
+# Where the samples are read from during training:
+#   "files":         one read and decode per wav file, every epoch
+#   "packed":        a few large shards of fixed-length int16 records, which
+#                    is much faster on network filesystems and mounted drives
+#   "feature_store": every clean sample decoded and transformed only once and
+#                    kept in memory-mapped shards
+DATA_SOURCE = "feature_store"
+FEATURE_STORE_PATH = os.path.join(DATASET_ROOT, "feature_store")
+PACKED_PATH = os.path.join(DATASET_ROOT, "packed")
+NOISE_BANK_PATH = os.path.join(DATASET_ROOT, "noise_bank")
 Data preparation
 The dataset is composed of 7 folders, divided into 2 groups:
 
@@ -97,33 +116,9 @@ main_directory/
 ...noise/
 ......other/
 ......_background_noise_/
-# If folder `audio`, does not exist, create it, otherwise do nothing
-if os.path.exists(DATASET_AUDIO_PATH) is False:
-    os.makedirs(DATASET_AUDIO_PATH)
-
-# If folder `noise`, does not exist, create it, otherwise do nothing
-if os.path.exists(DATASET_NOISE_PATH) is False:
-    os.makedirs(DATASET_NOISE_PATH)
-
-for folder in os.listdir(DATASET_ROOT):
-    if os.path.isdir(os.path.join(DATASET_ROOT, folder)):
-        if folder in [AUDIO_SUBFOLDER, NOISE_SUBFOLDER]:
-            # If folder is `audio` or `noise`, do nothing
-            continue
-        elif folder in ["other", "_background_noise_"]:
-            # If folder is one of the folders that contains noise samples,
-            # move it to the `noise` folder
-            shutil.move(
-                os.path.join(DATASET_ROOT, folder),
-                os.path.join(DATASET_NOISE_PATH, folder),
-            )
-        else:
-            # Otherwise, it should be a speaker folder, then move it to
-            # `audio` folder
-            shutil.move(
-                os.path.join(DATASET_ROOT, folder),
-                os.path.join(DATASET_AUDIO_PATH, folder),
-            )
+# Create the `audio` and `noise` folders if needed, then move the speaker
+# folders to `audio` and the `other` and `_background_noise_` folders to `noise`
+prepare_dataset_folders(DATASET_ROOT)
 Noise preparation
 In this section:
 
@@ -146,43 +141,11 @@ print(
     )
 )
 Found 6 files belonging to 2 directories
-Resample all noise samples to 16000 Hz
-
-command = (
-    "for dir in `ls -1 " + DATASET_NOISE_PATH + "`; do "
-    "for file in `ls -1 " + DATASET_NOISE_PATH + "/$dir/*.wav`; do "
-    "sample_rate=`ffprobe -hide_banner -loglevel panic -show_streams "
-    "$file | grep sample_rate | cut -f2 -d=`; "
-    "if [ $sample_rate -ne 16000 ]; then "
-    "ffmpeg -hide_banner -loglevel panic -y "
-    "-i $file -ar 16000 temp.wav; "
-    "mv temp.wav $file; "
-    "fi; done; done"
-)
+Resample all noise samples to 16000 Hz and split them into chunks of 16000 samples, which correspond to 1 second each. This is done in-process with polyphase resampling, one noise file per process, and the resulting bank is saved next to the dataset so that later runs reuse it.
 
-os.system(command)
-
-# Split noise into chunks of 16000 each
-def load_noise_sample(path):
-    sample, sampling_rate = tf.audio.decode_wav(
-        tf.io.read_file(path), desired_channels=1
-    )
-    if sampling_rate == SAMPLING_RATE:
-        # Number of slices of 16000 each that can be generated from the noise sample
-        slices = int(sample.shape[0] / SAMPLING_RATE)
-        sample = tf.split(sample[: slices * SAMPLING_RATE], slices)
-        return sample
-    else:
-        print("Sampling rate for {} is incorrect. Ignoring it".format(path))
-        return None
-
-
-noises = []
-for path in noise_paths:
-    sample = load_noise_sample(path)
-    if sample:
-        noises.extend(sample)
-noises = tf.stack(noises)
+# Resampled streams, 1 second chunks and their peak amplitudes
+noise_bank = build_noise_bank(noise_paths, NOISE_BANK_PATH)
+noises = tf.constant(noise_bank.chunks())
 
 print(
     "{} noise files were split into {} noise samples where each is {} sec. long".format(
@@ -215,9 +178,10 @@ def add_noise(audio, noises=None, scale=0.5):
         )
         noise = tf.gather(noises, tf_rnd, axis=0)
 
-        # Get the amplitude proportion between the audio and the noise
+        # Get the amplitude proportion between the audio and the noise, and
+        # broadcast it over the samples instead of repeating it for each one
         prop = tf.math.reduce_max(audio, axis=1) / tf.math.reduce_max(noise, axis=1)
-        prop = tf.repeat(tf.expand_dims(prop, axis=1), tf.shape(audio)[1], axis=1)
+        prop = tf.expand_dims(prop, axis=1)
 
         # Adding the rescaled noise to audio
         audio = audio + noise * prop * scale
@@ -226,13 +190,13 @@ def add_noise(audio, noises=None, scale=0.5):
 
 
 def audio_to_fft(audio):
-    # Since tf.signal.fft applies FFT on the innermost dimension,
+    # Since tf.signal.rfft applies FFT on the innermost dimension,
     # we need to squeeze the dimensions and then expand them again
-    # after FFT
+    # after FFT. The input is real, so the real FFT only computes the
+    # positive frequencies instead of a full complex FFT of which
+    # half would be thrown away
     audio = tf.squeeze(audio, axis=-1)
-    fft = tf.signal.fft(
-        tf.cast(tf.complex(real=audio, imag=tf.zeros_like(audio)), tf.complex64)
-    )
+    fft = tf.signal.rfft(audio)
     fft = tf.expand_dims(fft, axis=-1)
 
     # Return the absolute value of the first half of the FFT
@@ -279,20 +243,49 @@ valid_audio_paths = audio_paths[-num_val_samples:]
 valid_labels = labels[-num_val_samples:]
 
 # Create 2 datasets, one for training and the other for validation
-train_ds = paths_and_labels_to_dataset(train_audio_paths, train_labels)
+if DATA_SOURCE == "feature_store":
+    # Only new or modified files are decoded. The training set streams the
+    # clean waveforms, since noise is added to them before the FFT, while the
+    # validation set gets no noise and is served straight from the stored FFT
+    store = FeatureStore(FEATURE_STORE_PATH)
+    store.refresh(audio_paths)
+    train_ds = store.to_dataset(
+        train_audio_paths, train_labels, kind="audio", shuffle=True
+    )
+    valid_ds = store.to_dataset(valid_audio_paths, valid_labels, kind="fft")
+elif DATA_SOURCE == "packed":
+    # Pack each split when its files or labels changed, then read the shards
+    # in parallel
+    for split, paths, split_labels in [
+        ("train", train_audio_paths, train_labels),
+        ("valid", valid_audio_paths, valid_labels),
+    ]:
+        ensure_packed(
+            paths, split_labels, os.path.join(PACKED_PATH, split), class_names=class_names
+        )
+    train_ds = packed_to_dataset(
+        os.path.join(PACKED_PATH, "train"), shuffle_shards=True, seed=SHUFFLE_SEED
+    )
+    valid_ds = packed_to_dataset(os.path.join(PACKED_PATH, "valid"))
+else:
+    train_ds = paths_and_labels_to_dataset(train_audio_paths, train_labels)
+    valid_ds = paths_and_labels_to_dataset(valid_audio_paths, valid_labels)
+
 train_ds = train_ds.shuffle(buffer_size=BATCH_SIZE * 8, seed=SHUFFLE_SEED).batch(
     BATCH_SIZE
 )
-
-valid_ds = paths_and_labels_to_dataset(valid_audio_paths, valid_labels)
 valid_ds = valid_ds.shuffle(buffer_size=32 * 8, seed=SHUFFLE_SEED).batch(32)
 
 
-# Add noise to the training set
-train_ds = train_ds.map(
-    lambda x, y: (add_noise(x, noises, scale=SCALE), y),
-    num_parallel_calls=tf.data.AUTOTUNE,
-)
+# Add noise to the training set. The augmenter draws 1 second crops at random
+# offsets of the noise streams, with their peaks precomputed, and reseeds at
+# every epoch; pass `snr_db=(low, high)` to mix at a signal-to-noise ratio
+# instead. `add_noise(x, noises, scale=SCALE)` still works on the fixed chunks.
+# The dataset repeats, so that every batch knows its epoch, and `fit` is given
+# the number of batches per epoch
+steps_per_epoch = math.ceil(len(train_audio_paths) / BATCH_SIZE)
+noise_augmenter = NoiseAugmenter(noise_bank, scale=SCALE, seed=SHUFFLE_SEED)
+train_ds = noise_augmenter.apply(train_ds, steps_per_epoch)
 
 # Transform audio wave to the frequency domain using `audio_to_fft`
 train_ds = train_ds.map(
@@ -300,9 +293,10 @@ train_ds = train_ds.map(
 )
 train_ds = train_ds.prefetch(tf.data.AUTOTUNE)
 
-valid_ds = valid_ds.map(
-    lambda x, y: (audio_to_fft(x), y), num_parallel_calls=tf.data.AUTOTUNE
-)
+if DATA_SOURCE != "feature_store":
+    valid_ds = valid_ds.map(
+        lambda x, y: (audio_to_fft(x), y), num_parallel_calls=tf.data.AUTOTUNE
+    )
 valid_ds = valid_ds.prefetch(tf.data.AUTOTUNE)
 Our class names: ['Julia_Gillard', 'Jens_Stoltenberg', 'Nelson_Mandela', 'Magaret_Tarcher', 'Benjamin_Netanyau']
 Processing speaker Julia_Gillard
@@ -359,6 +353,10 @@ model.compile(
 # 'ModelCheckPoint' to always keep the model that has the best val_accuracy
 model_save_filename = "model.h5"
 
+# Save the label order next to the model, so that new speakers can later be
+# enrolled with `python -m speaker_recognition.enroll` without retraining
+save_class_names("class_names.json", class_names)
+
 earlystopping_cb = keras.callbacks.EarlyStopping(patience=10, restore_best_weights=True)
 mdlcheckpoint_cb = keras.callbacks.ModelCheckpoint(
     model_save_filename, monitor="val_accuracy", save_best_only=True
@@ -474,6 +472,7 @@ Training
 history = model.fit(
     train_ds,
     epochs=EPOCHS,
+    steps_per_epoch=steps_per_epoch,
     validation_data=valid_ds,
     callbacks=[earlystopping_cb, mdlcheckpoint_cb],
 )
@@ -561,12 +560,16 @@ print(model.evaluate(valid_ds))
 [0.014629718847572803, 0.9946666955947876]
 We get ~ 98% validation accuracy.
 
+Export for CPU deployment
+Convert the model to an int8-quantized TFLite file, calibrated on validation samples. It is about 4 times smaller, and `TFLiteSpeakerModel` runs it without Keras. `python -m benchmarks.quantization --model model.h5` compares its accuracy and latency with the float model.
+export_int8(model, valid_ds, "model_int8.tflite")
+
 Demonstration
 Let's take some samples and:
 
 Predict the speaker
 Compare the prediction with the real speaker
-Listen to the audio to see that despite the samples being noisy, the model is still pretty accurate
+Write the audio to wav files and listen to it to see that despite the samples being noisy, the model is still pretty accurate
 SAMPLES_TO_DISPLAY = 10
 
 test_ds = paths_and_labels_to_dataset(valid_audio_paths, valid_labels)
@@ -589,11 +592,13 @@ for audios, labels in test_ds.take(1):
 
     for index in range(SAMPLES_TO_DISPLAY):
         # For every sample, print the true and predicted label
-        # as well as run the voice with the noise
+        # and write the voice with the noise to a wav file
         print(
             "Speaker: {} - Predicted: {}".format(
                 class_names[labels[index]],
                 class_names[y_pred[index]],
             )
         )
-        display(Audio(audios[index, :, :].squeeze(), rate=SAMPLING_RATE))
\ No newline at end of file
+        tf.io.write_file(
+            "sample_{}.wav".format(index), tf.audio.encode_wav(audios[index], SAMPLING_RATE)
+        )
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""Parameters, peak RSS, per-pair latency and verification accuracy of the fingerprint towers.
+
+Every backbone is measured in a fresh process, so that the peak resident
+memory of one does not hide the other. Latency is per pair, on random
+images. With `--dataset`, each Siamese network is also trained with the
+`PairSampler` on 80% of the people and its accuracy at a 0.5 threshold is
+measured on balanced pairs of the remaining people. From the repository
+root:
+
+    python -m benchmarks.fingerprint_backbones --dataset ~/fingerprints --epochs 5
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fingerprint.model import BACKBONES
+
+PERSON_SPLIT = 0.8
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def split_people(labels, label_map):
+    """Returns the indices of the training and evaluation people's images."""
+    people = np.array([label_map[label] for label in labels])
+    unique = np.unique(people)
+    train_people = unique[: int(PERSON_SPLIT * len(unique))]
+    train = np.isin(people, train_people)
+    return np.flatnonzero(train), np.flatnonzero(~train)
+
+
+def measure(backbone, dataset, cache_dir, epochs, steps_per_epoch, repeats):
+    """Builds, optionally trains, and times one Siamese network, in the current process."""
+    import tensorflow as tf
+
+    from fingerprint.data import IMAGE_SIZE, load_fingerprint_dataset_cached, normalize_batch
+    from fingerprint.model import build_siamese_network
+    from fingerprint.pairs import PairSampler
+
+    input_shape = IMAGE_SIZE + (1,)
+    model = build_siamese_network(input_shape, backbone)
+    params = model.count_params()
+    forward = tf.function(lambda a, b: model([a, b], training=False))
+
+    rng = np.random.RandomState(0)
+    pair = [tf.constant(rng.uniform(size=(1,) + input_shape).astype(np.float32)) for _ in range(2)]
+    forward(*pair)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        forward(*pair)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    accuracy = float("nan")
+    if dataset:
+        images, labels, label_map = load_fingerprint_dataset_cached(dataset, cache_dir)
+        train, test = split_people(labels, label_map)
+        train_images = np.asarray(images[train])
+        test_images = np.asarray(images[test])
+        sampler = PairSampler(labels[train], label_map, batch_size=32, seed=0)
+        model.compile(loss="binary_crossentropy", optimizer="adam", metrics=["accuracy"])
+        model.fit(
+            sampler.to_dataset(train_images),
+            epochs=epochs,
+            steps_per_epoch=steps_per_epoch,
+            verbose=0,
+        )
+        test_sampler = PairSampler(labels[test], label_map, batch_size=256, seed=1)
+        first, second, targets = test_sampler.sample()
+        scores = np.asarray(
+            forward(normalize_batch(test_images[first]), normalize_batch(test_images[second]))
+        )[:, 0]
+        accuracy = float(np.mean((scores >= 0.5) == (targets == 1)))
+
+    return params, peak_rss_mb(), np.percentile(latencies, 50), np.percentile(latencies, 99), accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backbones", nargs="+", default=list(BACKBONES))
+    parser.add_argument("--dataset", default=None, help="fingerprint dataset root")
+    parser.add_argument("--cache-dir", default="fingerprint_cache")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--steps-per-epoch", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    print(
+        "{:<10} {:>14} {:>13} {:>12} {:>12} {:>10}".format(
+            "backbone", "params", "peak RSS MB", "pair p50 ms", "pair p99 ms", "accuracy"
+        )
+    )
+    context = multiprocessing.get_context("spawn")
+    for backbone in args.backbones:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            params, rss, p50, p99, accuracy = executor.submit(
+                measure,
+                backbone,
+                args.dataset,
+                args.cache_dir,
+                args.epochs,
+                args.steps_per_epoch,
+                args.repeats,
+            ).result()
+        print(
+            "{:<10} {:>14,} {:>13.0f} {:>12.2f} {:>12.2f} {:>10.4f}".format(
+                backbone, params, rss, p50, p99, accuracy
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-batch latency and memory of every spectral front-end, in TF and in NumPy.
+
+Runs on synthetic audio, so no dataset is needed. From the repository root:
+
+    python -m benchmarks.frontends --batch-size 128 --repeats 20
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from speaker_recognition.config import SAMPLING_RATE
+from speaker_recognition.frontend import FRONTENDS, get_frontend
+
+
+def time_batches(fn, batch, repeats):
+    """Returns the per-call latencies of `fn(batch)` in milliseconds, after a warm-up."""
+    fn(batch)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def numpy_peak_memory(fn, batch):
+    """Returns the peak memory allocated by one NumPy call, in MB."""
+    tracemalloc.start()
+    fn(batch)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", default=["tf", "numpy"])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    batch = rng.uniform(-1, 1, (args.batch_size, SAMPLING_RATE, 1)).astype(np.float32)
+
+    print(
+        "{:<8} {:<6} {:>18} {:>10} {:>10} {:>12} {:>12}".format(
+            "variant", "backend", "feature shape", "p50 ms", "p99 ms", "output MB", "peak MB"
+        )
+    )
+    for name in FRONTENDS:
+        for backend in args.backends:
+            fn = get_frontend(name, backend)
+            if backend == "tf":
+                import tensorflow as tf
+
+                fn = tf.function(fn)
+                inputs = tf.constant(batch)
+            else:
+                inputs = batch
+            output = np.asarray(fn(inputs))
+            latencies = time_batches(fn, inputs, args.repeats)
+            peak = numpy_peak_memory(fn, inputs) if backend == "numpy" else float("nan")
+            print(
+                "{:<8} {:<6} {:>18} {:>10.2f} {:>10.2f} {:>12.2f} {:>12.2f}".format(
+                    name,
+                    backend,
+                    str(output.shape[1:]),
+                    np.percentile(latencies, 50),
+                    np.percentile(latencies, 99),
+                    output.nbytes / 2 ** 20,
+                    peak,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Logins/sec and p50/p99 latency of the verification engine, with and without micro-batching.
+
+`model.predict` is the notebook's per-request call on a single sample;
+`engine` scores one probe per forward pass; `batcher` runs `--concurrency`
+clients that each send their next probe as soon as the previous one is
+answered. Uses a randomly initialized model and synthetic PCM unless
+`--model` is given. From the repository root:
+
+    python -m benchmarks.inference_engine --requests 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from speaker_recognition.config import SAMPLING_RATE
+from speaker_recognition.engine import MicroBatcher, VerificationEngine
+from speaker_recognition.frontend import numpy_fft
+
+
+def report(name, latencies, elapsed):
+    latencies = np.array(latencies) * 1000
+    print(
+        "{:<14} {:>10.1f} {:>10.2f} {:>10.2f}".format(
+            name,
+            len(latencies) / elapsed,
+            np.percentile(latencies, 50),
+            np.percentile(latencies, 99),
+        )
+    )
+
+
+def run_sequential(fn, probes):
+    latencies = []
+    start = time.perf_counter()
+    for probe in probes:
+        request_start = time.perf_counter()
+        fn(probe)
+        latencies.append(time.perf_counter() - request_start)
+    return latencies, time.perf_counter() - start
+
+
+async def run_batched(engine, probes, concurrency, max_batch_size, max_wait_ms):
+    latencies = []
+    pending = list(reversed(probes))
+
+    async def client(batcher):
+        while pending:
+            probe = pending.pop()
+            request_start = time.perf_counter()
+            await batcher.predict(probe)
+            latencies.append(time.perf_counter() - request_start)
+
+    async with MicroBatcher(engine, max_batch_size, max_wait_ms) as batcher:
+        start = time.perf_counter()
+        await asyncio.gather(*[client(batcher) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=None, help="saved Keras model")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--baseline-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.model:
+        from tensorflow import keras
+
+        model = keras.models.load_model(args.model)
+    else:
+        from speaker_recognition.model import build_model
+
+        model = build_model((SAMPLING_RATE // 2, 1), 5)
+    class_names = ["speaker_{}".format(i) for i in range(model.output_shape[-1])]
+    engine = VerificationEngine(model, class_names)
+
+    rng = np.random.RandomState(0)
+    probes = [
+        (rng.standard_normal(SAMPLING_RATE) * 3000).astype(np.int16)
+        for _ in range(args.requests)
+    ]
+
+    print("{:<14} {:>10} {:>10} {:>10}".format("mode", "logins/s", "p50 ms", "p99 ms"))
+
+    def notebook_predict(probe):
+        features = numpy_fft(engine.load_input(probe)[np.newaxis, :, np.newaxis])
+        return model.predict(features, verbose=0)
+
+    report("model.predict", *run_sequential(notebook_predict, probes[: args.baseline_requests]))
+    report("engine", *run_sequential(engine.predict, probes))
+    report(
+        "batcher",
+        *asyncio.run(
+            run_batched(
+                engine, probes, args.concurrency, args.max_batch_size, args.max_wait_ms
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""FLOPs, parameters, CPU latency and validation accuracy of every speaker model variant.
+
+FLOPs are counted analytically from the layers (one multiply-add is two
+FLOPs). Latency is measured per single sample and per batch on synthetic
+features. With `--epochs`, every variant is also trained on the dataset,
+without noise augmentation, and evaluated on the validation split; this is
+meant to compare variants with each other, not to reproduce the accuracy of
+a full training run. From the repository root:
+
+    python -m benchmarks.model_variants --epochs 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from speaker_recognition.audio import read_pcm16
+from speaker_recognition.config import DATASET_AUDIO_PATH
+from speaker_recognition.dataset import list_audio_paths, split_paths
+from speaker_recognition.frontend import feature_shape, get_frontend
+from speaker_recognition.model import MODEL_VARIANTS, build_variant
+
+
+def count_flops(model):
+    """Returns the FLOPs of one forward pass through the conv and dense layers."""
+    from tensorflow import keras
+
+    flops = 0
+    for layer in model.layers:
+        if isinstance(layer, keras.layers.SeparableConv1D):
+            length, filters = layer.output.shape[1:]
+            channels = layer.input.shape[-1]
+            kernel_size = layer.kernel_size[0]
+            multiplier = layer.depth_multiplier
+            flops += 2 * length * kernel_size * channels * multiplier
+            flops += 2 * length * channels * multiplier * filters
+        elif isinstance(layer, keras.layers.Conv1D):
+            length, filters = layer.output.shape[1:]
+            flops += 2 * length * layer.kernel_size[0] * layer.input.shape[-1] * filters
+        elif isinstance(layer, keras.layers.Dense):
+            flops += 2 * layer.input.shape[-1] * layer.units
+    return flops
+
+
+def latency_ms(forward, features, repeats):
+    """Returns the p50 and p99 latency of `forward(features)` in milliseconds."""
+    forward(features)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        forward(features)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def load_split_audio(dataset_audio_path, limit=None):
+    """Returns the int16 audio and labels of the training and validation splits."""
+    _, audio_paths, labels = list_audio_paths(dataset_audio_path)
+    splits = split_paths(audio_paths, labels)
+    return [
+        (np.stack([read_pcm16(path) for path in paths[:limit]]), np.array(split_labels[:limit]))
+        for paths, split_labels in splits
+    ], len(set(labels))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", nargs="+", default=list(MODEL_VARIANTS))
+    parser.add_argument("--num-classes", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--epochs", type=int, default=0)
+    parser.add_argument("--dataset-audio-path", default=DATASET_AUDIO_PATH)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    splits = None
+    num_classes = args.num_classes
+    if args.epochs:
+        splits, num_classes = load_split_audio(args.dataset_audio_path, args.limit)
+
+    print(
+        "{:<18} {:>8} {:>10} {:>8} {:>11} {:>11} {:>9}".format(
+            "variant", "input", "params", "MFLOPs", "1-sample ms", "batch ms", "val acc"
+        )
+    )
+    for name in args.variants:
+        frontend_name, _ = MODEL_VARIANTS[name]
+        shape = feature_shape(frontend_name)
+        model = build_variant(name, shape, num_classes)
+        forward = tf.function(lambda x, model=model: model(x, training=False))
+
+        rng = np.random.RandomState(0)
+        one = tf.constant(rng.standard_normal((1,) + shape).astype(np.float32))
+        batch = tf.constant(
+            rng.standard_normal((args.batch_size,) + shape).astype(np.float32)
+        )
+        one_p50, _ = latency_ms(forward, one, args.repeats)
+        batch_p50, _ = latency_ms(forward, batch, args.repeats)
+
+        accuracy = float("nan")
+        if splits:
+            frontend = get_frontend(frontend_name, "numpy")
+            (train_audio, train_labels), (valid_audio, valid_labels) = splits
+            train_x = frontend(train_audio[..., np.newaxis].astype(np.float32) / 32768)
+            valid_x = frontend(valid_audio[..., np.newaxis].astype(np.float32) / 32768)
+            model.compile(
+                optimizer="Adam",
+                loss="sparse_categorical_crossentropy",
+                metrics=["accuracy"],
+            )
+            model.fit(
+                train_x,
+                train_labels,
+                batch_size=128,
+                epochs=args.epochs,
+                shuffle=True,
+                verbose=0,
+            )
+            _, accuracy = model.evaluate(valid_x, valid_labels, verbose=0)
+
+        print(
+            "{:<18} {:>8} {:>10,} {:>8.1f} {:>11.2f} {:>11.2f} {:>9.4f}".format(
+                name,
+                "x".join(str(d) for d in shape),
+                model.count_params(),
+                count_flops(model) / 1e6,
+                one_p50,
+                batch_p50,
+                accuracy,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
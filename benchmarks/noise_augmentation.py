@@ -0,0 +1,93 @@
+"""Compares batches/sec of the noise augmentation variants on synthetic audio.
+
+`legacy` is `add_noise` as it was, repeating the per-sample scale over every
+sample; `add_noise` is the broadcasting version; `peak` and `snr` are the
+`NoiseAugmenter` drawing random crops from the noise streams. Usage, from the
+repository root:
+
+    python -m benchmarks.noise_augmentation --batches 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from speaker_recognition.augment import NoiseAugmenter
+from speaker_recognition.config import BATCH_SIZE, SAMPLING_RATE, SCALE
+from speaker_recognition.dataset import add_noise
+from speaker_recognition.noise_bank import NoiseBank
+
+
+def legacy_add_noise(audio, noises, scale=SCALE):
+    """`add_noise` before it broadcast the scale, kept here as the baseline."""
+    tf_rnd = tf.random.uniform((tf.shape(audio)[0],), 0, noises.shape[0], dtype=tf.int32)
+    noise = tf.gather(noises, tf_rnd, axis=0)
+    prop = tf.math.reduce_max(audio, axis=1) / tf.math.reduce_max(noise, axis=1)
+    prop = tf.repeat(tf.expand_dims(prop, axis=1), tf.shape(audio)[1], axis=1)
+    return audio + noise * prop * scale
+
+
+def synthetic_bank(num_streams, seconds, sampling_rate=SAMPLING_RATE, seed=0):
+    """Returns a `NoiseBank` of random streams, `seconds` long each, without touching disk."""
+    rng = np.random.RandomState(seed)
+    streams = rng.uniform(-0.5, 0.5, num_streams * seconds * sampling_rate)
+    streams = streams.astype(np.float32)
+    length = seconds * sampling_rate
+    chunk_starts = list(range(0, len(streams), sampling_rate))
+    manifest = {
+        "sampling_rate": sampling_rate,
+        "sources": [
+            {"path": "synthetic-{}".format(i), "offset": i * length, "length": length}
+            for i in range(num_streams)
+        ],
+        "chunk_starts": chunk_starts,
+        "peaks": [float(streams[s : s + sampling_rate].max()) for s in chunk_starts],
+    }
+    return NoiseBank(streams, manifest)
+
+
+def batches_per_second(ds, num_batches):
+    """Iterates over `num_batches` batches of `ds`, after one warm-up, and returns batches/sec."""
+    iterator = iter(ds)
+    next(iterator)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        next(iterator)
+    return num_batches / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--noise-streams", type=int, default=6)
+    parser.add_argument("--noise-seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    bank = synthetic_bank(args.noise_streams, args.noise_seconds)
+    noises = tf.constant(bank.chunks())
+    audio = tf.random.uniform((args.batch_size, SAMPLING_RATE, 1), -1, 1, seed=0)
+    # One batch per epoch: `NoiseAugmenter.apply` repeats it itself
+    batch = tf.data.Dataset.from_tensors((audio, tf.zeros(args.batch_size, tf.int32)))
+    ds = batch.repeat()
+
+    augmenter = NoiseAugmenter(bank)
+    print("{} noise chunks, {} crop offsets".format(len(bank), augmenter.num_crops))
+    variants = [
+        ("legacy", ds.map(lambda x, y: (legacy_add_noise(x, noises), y))),
+        ("add_noise", ds.map(lambda x, y: (add_noise(x, noises), y))),
+        ("peak", augmenter.apply(batch)),
+        ("peak-chunks", NoiseAugmenter(bank, random_crops=False).apply(batch)),
+        ("snr", NoiseAugmenter(bank, snr_db=(0, 20)).apply(batch)),
+    ]
+    baseline = None
+    for name, variant in variants:
+        rate = batches_per_second(variant, args.batches)
+        baseline = baseline or rate
+        print("{:12s} {:8.1f} batches/sec {:6.2f}x".format(name, rate, rate / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compares files/sec of the per-file wav loader against the packed shard reader.
+
+Usage, from the repository root:
+
+    python -m benchmarks.packed_loader --dataset-root ~/Downloads/16000_pcm_speeches
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from speaker_recognition.config import DATASET_ROOT
+from speaker_recognition.dataset import list_audio_paths, paths_and_labels_to_dataset
+from speaker_recognition.packed import pack_audio, packed_to_dataset
+
+
+def files_per_second(ds, batch_size):
+    """Iterates once over `ds` in batches and returns the number of samples/sec."""
+    start = time.perf_counter()
+    count = 0
+    for audio, _ in ds.batch(batch_size):
+        count += int(audio.shape[0])
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset-root", default=DATASET_ROOT)
+    parser.add_argument("--packed-dir", default=None)
+    parser.add_argument("--num-shards", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    _, audio_paths, labels = list_audio_paths(os.path.join(args.dataset_root, "audio"))
+    audio_paths, labels = audio_paths[: args.limit], labels[: args.limit]
+    packed_dir = args.packed_dir or tempfile.mkdtemp(prefix="packed-")
+
+    start = time.perf_counter()
+    pack_audio(audio_paths, labels, packed_dir, num_shards=args.num_shards)
+    print(
+        "Packed {} files into {} shards in {:.2f} s".format(
+            len(audio_paths), args.num_shards, time.perf_counter() - start
+        )
+    )
+
+    path_rate = files_per_second(
+        paths_and_labels_to_dataset(audio_paths, labels), args.batch_size
+    )
+    packed_rate = files_per_second(packed_to_dataset(packed_dir), args.batch_size)
+    print("path-based loader: {:10.1f} files/sec".format(path_rate))
+    print("packed shards:     {:10.1f} files/sec".format(packed_rate))
+    print("speedup:           {:10.2f}x".format(packed_rate / path_rate))
+
+
+if __name__ == "__main__":
+    main()
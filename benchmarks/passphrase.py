@@ -0,0 +1,76 @@
+"""Per-login latency of the passphrase verifier, with and without the DTW band.
+
+Enrolls synthetic passphrases (random tone sequences, so no dataset or
+microphone is needed) in a temporary store, then times `verify` against
+the genuine user's templates and against another user's. From the
+repository root:
+
+    python -m benchmarks.passphrase --templates 5 --repeats 100
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from speaker_recognition.config import SAMPLING_RATE
+from speaker_recognition.passphrase import (
+    PassphraseStore,
+    PassphraseVerifier,
+    passphrase_features,
+)
+
+
+def synthetic_passphrase(rng, notes, seconds=1.5, jitter=0.1):
+    """Returns a sequence of tones at `notes` Hz, with random timing and noise."""
+    durations = np.full(len(notes), seconds / len(notes))
+    durations *= 1 + rng.uniform(-jitter, jitter, len(notes))
+    parts = []
+    for note, duration in zip(notes, durations):
+        t = np.arange(int(duration * SAMPLING_RATE)) / SAMPLING_RATE
+        parts.append(0.3 * np.sin(2 * np.pi * note * t))
+    audio = np.concatenate(parts)
+    return (audio + 0.01 * rng.standard_normal(len(audio))).astype(np.float32)
+
+
+def time_verify(verifier, user, probes, repeats):
+    latencies = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        verifier.verify(user, probes[i % len(probes)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--templates", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    phrases = {"alice": [300, 500, 400, 700, 600], "bob": [800, 350, 650, 450, 550]}
+    store = PassphraseStore(os.path.join(tempfile.mkdtemp(), "passphrases.sqlite"))
+    for user, notes in phrases.items():
+        for i in range(args.templates):
+            store.add(user, str(i), passphrase_features(synthetic_passphrase(rng, notes)))
+    genuine = [synthetic_passphrase(rng, phrases["alice"]) for _ in range(10)]
+    impostor = [synthetic_passphrase(rng, phrases["bob"]) for _ in range(10)]
+
+    print("{:<10} {:<9} {:>9} {:>9} {:>9}".format("band", "probe", "accepted", "p50 ms", "p99 ms"))
+    for band in (0.2, 1.0):
+        verifier = PassphraseVerifier(store, band=band)
+        for name, probes in (("genuine", genuine), ("impostor", impostor)):
+            accepted = np.mean([verifier.verify("alice", probe)[0] for probe in probes])
+            p50, p99 = time_verify(verifier, "alice", probes, args.repeats)
+            print(
+                "{:<10} {:<9} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    band, name, accepted, p50, p99
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
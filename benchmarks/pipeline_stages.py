@@ -0,0 +1,158 @@
+"""Samples/sec and p50/p99 latency of every training and verification stage on synthetic audio.
+
+A seeded set of random wav files is written to a temporary directory, so
+the numbers only depend on the code and the machine. The `tf.data` stages
+run inside one graph and are timed by prefix: `data.decode` is reading and
+decoding the files, `data.augment` adds the noise augmentation and
+`data.fft` the FFT, so the cost of a stage is the difference with the
+previous prefix. `augment` and `fft` time the same transforms alone, on a
+batch already in memory. `train.forward` and `train.step` are the forward
+pass and a full forward and backward step of the untrained model, and the
+`verify.*` stages come from the instrumented `VerificationEngine`, next to
+`verify.legacy_predict`, `model.predict` on a single probe as the notebook
+does. Keep the `--output` JSON of each release to compare them. From the
+repository root:
+
+    python -m benchmarks.pipeline_stages --output pipeline_stages.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import wave
+
+import numpy as np
+import tensorflow as tf
+
+from benchmarks.noise_augmentation import synthetic_bank
+from speaker_recognition import profiling
+from speaker_recognition.augment import NoiseAugmenter
+from speaker_recognition.config import BATCH_SIZE, SAMPLING_RATE
+from speaker_recognition.dataset import audio_to_fft, paths_and_labels_to_dataset
+from speaker_recognition.engine import VerificationEngine
+from speaker_recognition.model import build_model
+
+NUM_CLASSES = 5
+
+
+def write_dataset(directory, num_files, seed=0):
+    """Writes `num_files` one second wav files of random noise; returns their paths and labels."""
+    rng = np.random.RandomState(seed)
+    paths, labels = [], []
+    for i in range(num_files):
+        audio = (0.1 * rng.standard_normal(SAMPLING_RATE) * 32767).astype("<i2")
+        path = os.path.join(directory, "{}.wav".format(i))
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLING_RATE)
+            f.writeframes(audio.tobytes())
+        paths.append(path)
+        labels.append(i % NUM_CLASSES)
+    return paths, labels
+
+
+def time_calls(name, fn, repeats, samples, warmup=2):
+    """Times `repeats` calls of `fn` as the stage `name`, after `warmup` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        profiling.record(name, time.perf_counter() - start, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    profiling.enable()
+    profiling.profiler.reset()
+    tf.random.set_seed(args.seed)
+    directory = tempfile.mkdtemp()
+    paths, labels = write_dataset(directory, args.files, args.seed)
+    augmenter = NoiseAugmenter(synthetic_bank(6, 60, seed=args.seed), seed=args.seed)
+
+    epoch = paths_and_labels_to_dataset(paths, labels).batch(args.batch_size)
+    decoded = epoch.repeat()
+    augmented = augmenter.apply(epoch)
+    transformed = augmented.map(lambda x, y: (audio_to_fft(x), y))
+    for name, ds in [
+        ("data.decode", decoded),
+        ("data.augment", augmented),
+        ("data.fft", transformed),
+    ]:
+        profiling.time_dataset(ds, name, args.batches)
+
+    audio, label = next(iter(decoded))
+    features = audio_to_fft(audio)
+    augment_fn = tf.function(lambda x: augmenter(x))
+    fft_fn = tf.function(audio_to_fft)
+    time_calls("augment", lambda: augment_fn(audio).numpy(), args.batches, args.batch_size)
+    time_calls("fft", lambda: fft_fn(audio).numpy(), args.batches, args.batch_size)
+
+    model = build_model((SAMPLING_RATE // 2, 1), NUM_CLASSES)
+    loss_fn = tf.keras.losses.SparseCategoricalCrossentropy()
+    optimizer = tf.keras.optimizers.Adam()
+
+    @tf.function
+    def forward(x):
+        return model(x, training=False)
+
+    @tf.function
+    def train_step(x, y):
+        with tf.GradientTape() as tape:
+            loss = loss_fn(y, model(x, training=True))
+        gradients = tape.gradient(loss, model.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+        return loss
+
+    time_calls("train.forward", lambda: forward(features).numpy(), args.batches, args.batch_size)
+    time_calls(
+        "train.step", lambda: train_step(features, label).numpy(), args.batches, args.batch_size
+    )
+
+    probe = paths[0]
+    probe_features = audio_to_fft(audio[:1])
+    time_calls(
+        "verify.legacy_predict", lambda: model.predict(probe_features, verbose=0), args.probes, 1
+    )
+    # The engine records its own verify.decode, verify.frontend and
+    # verify.forward; its warm-up calls are left out
+    profiling.disable()
+    engine = VerificationEngine(model, ["speaker_{}".format(i) for i in range(NUM_CLASSES)])
+    engine.predict(probe)
+    profiling.enable()
+    for _ in range(args.probes):
+        engine.predict(probe)
+
+    stages = profiling.profiler.snapshot()
+    print("{:<24} {:>14} {:>10} {:>10}".format("stage", "samples/sec", "p50 ms", "p99 ms"))
+    for name, summary in stages.items():
+        print(
+            "{:<24} {:>14.1f} {:>10.2f} {:>10.2f}".format(
+                name, summary["samples_per_sec"], summary["p50_ms"], summary["p99_ms"]
+            )
+        )
+    if args.output:
+        results = {
+            "config": vars(args),
+            "tensorflow": tf.__version__,
+            "platform": platform.platform(),
+            "stages": stages,
+        }
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Accuracy vs. latency of the float Keras model and its float32 and int8 TFLite exports.
+
+Calibrates the int8 model on the first `--calibration-samples` validation
+samples and evaluates every variant on the rest of the validation split, so
+that calibration and evaluation never share samples. From the repository
+root, with a model trained by `Speaker Recognition.py`:
+
+    python -m benchmarks.quantization --model model.h5 --output-dir exported
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from speaker_recognition.audio import read_pcm16
+from speaker_recognition.config import DATASET_AUDIO_PATH
+from speaker_recognition.dataset import list_audio_paths, split_paths
+from speaker_recognition.frontend import numpy_fft
+from speaker_recognition.quantize import TFLiteSpeakerModel, export_float, export_int8
+
+
+def load_validation_features(dataset_audio_path):
+    """Returns the FFT features and labels of the validation split, in order."""
+    _, audio_paths, labels = list_audio_paths(dataset_audio_path)
+    _, (valid_paths, valid_labels) = split_paths(audio_paths, labels)
+    audio = np.stack([read_pcm16(path) for path in valid_paths]).astype(np.float32) / 32768
+    return numpy_fft(audio[..., np.newaxis]), np.array(valid_labels)
+
+
+def evaluate(fn, features, labels, batch_size, repeats):
+    """Returns the accuracy, p50/p99 single-sample latency in ms and batched samples/sec."""
+    predictions = np.concatenate(
+        [
+            np.asarray(fn(features[start : start + batch_size]))
+            for start in range(0, len(features), batch_size)
+        ]
+    )
+    accuracy = float(np.mean(np.argmax(predictions, axis=-1) == labels))
+
+    fn(features[:1])
+    latencies = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(features[i % len(features)][np.newaxis])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = features[:batch_size]
+    fn(batch)
+    start = time.perf_counter()
+    for _ in range(max(1, repeats // 10)):
+        fn(batch)
+    throughput = max(1, repeats // 10) * len(batch) / (time.perf_counter() - start)
+    return accuracy, np.percentile(latencies, 50), np.percentile(latencies, 99), throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="trained Keras model")
+    parser.add_argument("--dataset-audio-path", default=DATASET_AUDIO_PATH)
+    parser.add_argument("--output-dir", default="exported")
+    parser.add_argument("--calibration-samples", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--num-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from tensorflow import keras
+
+    features, labels = load_validation_features(args.dataset_audio_path)
+    n = args.calibration_samples
+    calibration_ds = tf.data.Dataset.from_tensor_slices((features[:n], labels[:n])).batch(32)
+    features, labels = features[n:], labels[n:]
+
+    model = keras.models.load_model(args.model)
+    os.makedirs(args.output_dir, exist_ok=True)
+    float_path = export_float(model, os.path.join(args.output_dir, "speaker_float32.tflite"))
+    int8_path = export_int8(
+        model, calibration_ds, os.path.join(args.output_dir, "speaker_int8.tflite"), n
+    )
+
+    forward = tf.function(lambda x: model(x, training=False))
+    variants = [
+        ("keras float32", lambda x: forward(tf.constant(x)), os.path.getsize(args.model)),
+        (
+            "tflite float32",
+            TFLiteSpeakerModel(float_path, args.num_threads),
+            os.path.getsize(float_path),
+        ),
+        (
+            "tflite int8",
+            TFLiteSpeakerModel(int8_path, args.num_threads),
+            os.path.getsize(int8_path),
+        ),
+    ]
+
+    print("Evaluating on {} validation samples".format(len(labels)))
+    print(
+        "{:<15} {:>9} {:>9} {:>9} {:>9} {:>12}".format(
+            "variant", "size MB", "accuracy", "p50 ms", "p99 ms", "samples/s"
+        )
+    )
+    for name, fn, size in variants:
+        accuracy, p50, p99, throughput = evaluate(
+            fn, features, labels, args.batch_size, args.repeats
+        )
+        print(
+            "{:<15} {:>9.2f} {:>9.4f} {:>9.2f} {:>9.2f} {:>12.1f}".format(
+                name, size / 2 ** 20, accuracy, p50, p99, throughput
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Hashing and lookup latency of the replay index, and its size as logins accumulate.
+
+Synthetic one-second utterances (random chirps and noise, so no dataset is
+needed) are added one by one to an index bounded to `--max-utterances`.
+Every attempt is checked first, as a login would be. Replays are re-played
+with gain, noise and a shift of up to 50 ms, so they start anywhere within
+the hop of the spectrogram; the report gives their detection rate and the
+false alarm rate on fresh utterances, each with a 95% Wilson interval. A
+few hundred replays only pin the rate down to a few percent, so the
+benchmark fails when the whole interval of the detection rate is below
+`--min-detection`, or the whole interval of the false alarm rate above
+`--max-false-alarms`, rather than on one unlucky run. From the repository
+root:
+
+    python -m benchmarks.replay --logins 20000 --max-utterances 5000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from speaker_recognition.config import SAMPLING_RATE
+from speaker_recognition.replay import ReplayIndex, landmark_hashes
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """Returns the Wilson score interval of a binomial rate, 95% by default."""
+    if not trials:
+        return 0.0, 1.0
+    rate = successes / trials
+    centre = (rate + z ** 2 / (2 * trials)) / (1 + z ** 2 / trials)
+    half_width = (
+        z
+        * np.sqrt(rate * (1 - rate) / trials + z ** 2 / (4 * trials ** 2))
+        / (1 + z ** 2 / trials)
+    )
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def synthetic_utterance(rng, seconds=1.0):
+    """Returns a few random chirps over background noise."""
+    t = np.arange(int(seconds * SAMPLING_RATE)) / SAMPLING_RATE
+    audio = 0.02 * rng.standard_normal(len(t))
+    for _ in range(6):
+        f0, f1 = rng.uniform(100, 4000, 2)
+        onset, length = rng.uniform(0, seconds), rng.uniform(0.1, 0.4)
+        active = (t >= onset) & (t < onset + length)
+        phase = 2 * np.pi * (f0 * t + (f1 - f0) * t ** 2 / (2 * seconds))
+        audio[active] += 0.3 * np.sin(phase[active])
+    return audio.astype(np.float32)
+
+
+def replayed(rng, audio):
+    """Returns `audio` with a gain change, added noise and a shift of up to 50 ms."""
+    shift = rng.randint(0, SAMPLING_RATE // 20)
+    audio = np.pad(audio, (shift, 0))[: len(audio)] * rng.uniform(0.5, 1.5)
+    return (audio + 0.01 * rng.standard_normal(len(audio))).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=5000)
+    parser.add_argument("--max-utterances", type=int, default=2000)
+    parser.add_argument("--replay-every", type=int, default=10)
+    parser.add_argument("--report-every", type=int, default=1000)
+    parser.add_argument("--min-detection", type=float, default=0.9)
+    parser.add_argument("--max-false-alarms", type=float, default=0.001)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    index = ReplayIndex(max_utterances=args.max_utterances)
+    recent = []
+    hash_ms, lookup_ms = [], []
+    replays = detected = fresh = false_alarms = 0
+
+    print(
+        "{:>8} {:>11} {:>10} {:>10} {:>13} {:>14}".format(
+            "logins", "utterances", "postings", "MB", "hash p50 ms", "lookup p99 ms"
+        )
+    )
+    for login in range(1, args.logins + 1):
+        is_replay = bool(recent) and login % args.replay_every == 0
+        if is_replay:
+            audio = replayed(rng, recent[rng.randint(len(recent))])
+        else:
+            audio = synthetic_utterance(rng)
+
+        start = time.perf_counter()
+        hashes, anchors = landmark_hashes(audio)
+        hash_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        match = index.match_hashes(hashes, anchors)
+        lookup_ms.append((time.perf_counter() - start) * 1000)
+
+        if is_replay:
+            replays += 1
+            detected += match.is_replay
+        else:
+            fresh += 1
+            false_alarms += match.is_replay
+            index.add(str(login), audio)
+            # Only replay utterances the bounded index still holds
+            recent = (recent + [audio])[-min(100, args.max_utterances) :]
+
+        if login % args.report_every == 0:
+            print(
+                "{:>8} {:>11} {:>10} {:>10.1f} {:>13.3f} {:>14.3f}".format(
+                    login,
+                    len(index),
+                    index.num_postings,
+                    index.nbytes / 1e6,
+                    np.percentile(hash_ms, 50),
+                    np.percentile(lookup_ms, 99),
+                )
+            )
+            hash_ms, lookup_ms = [], []
+
+    detection = wilson_interval(detected, replays)
+    false_alarm = wilson_interval(false_alarms, fresh)
+    print(
+        "Replays detected {}/{} (95% interval {:.3f}-{:.3f}), "
+        "false alarms {}/{} (95% interval {:.4f}-{:.4f})".format(
+            detected, replays, detection[0], detection[1], false_alarms, fresh, *false_alarm
+        )
+    )
+    if detection[1] < args.min_detection:
+        raise SystemExit(
+            "Detection rate {:.3f} is below the floor of {}".format(
+                detected / replays, args.min_detection
+            )
+        )
+    if false_alarm[0] > args.max_false_alarms:
+        raise SystemExit(
+            "False alarm rate {:.4f} is above the ceiling of {}".format(
+                false_alarms / fresh, args.max_false_alarms
+            )
+        )
+
+if __name__ == "__main__":
+    main()
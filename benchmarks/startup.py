@@ -0,0 +1,132 @@
+"""Cold-start cost of the speaker_recognition commands: import time and time to first verification.
+
+Every measurement runs in a fresh interpreter. Import times are those of
+the command modules, with whether TensorFlow got loaded. Time to first
+verification covers importing, loading the model and scoring one probe,
+followed by the time of a second, warm probe. Without `--model`, an
+untrained model (and its float TFLite copy) is written to a temporary
+directory, so no training is needed. From the repository root:
+
+    python -m benchmarks.startup --model model_int8.tflite --class-names class_names.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+from speaker_recognition.config import SAMPLING_RATE
+
+MODULES = (
+    "speaker_recognition",
+    "speaker_recognition.verify",
+    "speaker_recognition.serve",
+    "speaker_recognition.engine",
+    "speaker_recognition.train",
+)
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - start, "tensorflow" in sys.modules]))
+"""
+
+FIRST_VERIFICATION_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from speaker_recognition.engine import load_engine
+imported = time.perf_counter()
+engine = load_engine({model!r}, {class_names!r})
+loaded = time.perf_counter()
+engine.predict({probe!r})
+first = time.perf_counter()
+engine.predict({probe!r})
+second = time.perf_counter()
+print(json.dumps([imported - start, loaded - imported, first - loaded, second - first]))
+"""
+
+UNTRAINED_MODEL_SCRIPT = """
+from speaker_recognition.enroll import save_class_names
+from speaker_recognition.model import build_model
+from speaker_recognition.quantize import export_float
+model = build_model(({sampling_rate} // 2, 1), 5)
+model.save({directory!r} + "/model.keras")
+export_float(model, {directory!r} + "/model.tflite")
+save_class_names({directory!r} + "/class_names.json", ["speaker_{{}}".format(i) for i in range(5)])
+print("[]")
+"""
+
+
+def run(script):
+    """Runs a script in a fresh interpreter from the repository root and returns its JSON output."""
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def write_probe(path, seconds=1.0):
+    rng = np.random.RandomState(0)
+    audio = (0.1 * rng.standard_normal(int(seconds * SAMPLING_RATE)) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLING_RATE)
+        f.writeframes(audio.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", nargs="+", default=None, help="one or more saved models")
+    parser.add_argument("--class-names", default="class_names.json")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    probe = os.path.join(directory, "probe.wav")
+    write_probe(probe)
+    models, class_names = args.model, args.class_names
+    if models is None:
+        run(UNTRAINED_MODEL_SCRIPT.format(sampling_rate=SAMPLING_RATE, directory=directory))
+        models = [os.path.join(directory, name) for name in ("model.keras", "model.tflite")]
+        class_names = os.path.join(directory, "class_names.json")
+
+    print("{:<30} {:>10} {:>12}".format("module", "import ms", "tensorflow"))
+    for module in MODULES:
+        times = [run(IMPORT_SCRIPT.format(module=module)) for _ in range(args.repeats)]
+        print(
+            "{:<30} {:>10.0f} {:>12}".format(
+                module, 1000 * np.median([t for t, _ in times]), str(times[0][1])
+            )
+        )
+
+    print()
+    print(
+        "{:<20} {:>10} {:>10} {:>12} {:>10} {:>10}".format(
+            "model", "import ms", "load ms", "1st probe ms", "total ms", "warm ms"
+        )
+    )
+    for model in models:
+        script = FIRST_VERIFICATION_SCRIPT.format(
+            model=model, class_names=class_names, probe=probe
+        )
+        times = np.median([run(script) for _ in range(args.repeats)], axis=0) * 1000
+        print(
+            "{:<20} {:>10.0f} {:>10.0f} {:>12.0f} {:>10.0f} {:>10.1f}".format(
+                os.path.basename(model), times[0], times[1], times[2], times[:3].sum(), times[3]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Fingerprint matching with a Siamese convnet."""
@@ -0,0 +1,157 @@
+"""Loading and preprocessing of fingerprint images."""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGE_SIZE = (128, 128)
+
+CACHE_IMAGES_FILENAME = "images.u8.npy"
+CACHE_LABELS_FILENAME = "labels.json"
+
+
+# Function to load and preprocess fingerprint images from the updated folder structure
+def load_fingerprint_dataset(base_path):
+    images = []
+    labels = []
+    label_map = {}
+
+    for person_id in range(1, 46):  # 45 people
+        person_folder = os.path.join(base_path, str(person_id), 'Fingerprint')
+
+        # Loop through all 10 fingerprint images for this person
+        for filename in os.listdir(person_folder):
+            if filename.endswith('.BMP'):
+                image_path = os.path.join(person_folder, filename)
+                image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+                image = cv2.resize(image, IMAGE_SIZE)  # Resize for uniform input
+                image = image / 255.0  # Normalize to [0, 1]
+                images.append(image)
+
+                # Use the filename (e.g., "1_M_Left_index_finger") as the label
+                label = f"person_{person_id}_{filename.split('.')[0]}"
+                labels.append(label)
+
+                # Store the mapping from label to person ID
+                label_map[label] = person_id
+
+    images = np.array(images)
+    labels = np.array(labels)
+    return images, labels, label_map
+
+
+# Preprocess a fingerprint image before comparison
+def preprocess_image(image_path):
+    # Check if the file exists
+    if not os.path.exists(image_path):
+        print(f"File not found: {image_path}")
+        return None
+
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+
+    if image is None:
+        print(f"Error reading the image: {image_path}")
+        return None
+
+    image = cv2.resize(image, IMAGE_SIZE)
+    image = image / 255.0
+    image = np.expand_dims(image, axis=-1)  # Add channel dimension for model input
+    return image
+
+
+def list_fingerprint_files(base_path):
+    """Returns the path and label of every fingerprint, in `load_fingerprint_dataset` order.
+
+    Every numbered person folder of `base_path` is used, not only the first 45.
+    """
+    people = sorted(
+        (name for name in os.listdir(base_path) if name.isdigit()), key=int
+    )
+    paths = []
+    labels = []
+    label_map = {}
+    for person_id in people:
+        person_folder = os.path.join(base_path, person_id, 'Fingerprint')
+        if not os.path.isdir(person_folder):
+            continue
+        for filename in os.listdir(person_folder):
+            if filename.endswith('.BMP'):
+                label = f"person_{person_id}_{filename.split('.')[0]}"
+                paths.append(os.path.join(person_folder, filename))
+                labels.append(label)
+                label_map[label] = int(person_id)
+    return paths, labels, label_map
+
+
+def _read_fingerprint(image_path):
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise IOError(f"Error reading the image: {image_path}")
+    return cv2.resize(image, IMAGE_SIZE)
+
+
+def load_fingerprint_dataset_cached(base_path, cache_dir, num_workers=8, validate=True):
+    """Loads the fingerprints as a memory-mapped uint8 array, decoding them only once.
+
+    Images are decoded and resized on a thread pool straight into
+    `images.u8.npy` in `cache_dir`, next to a `labels.json` sidecar holding
+    the labels, the label map and the mtime of every source file. Later calls
+    memory-map the cache, so warm starts are near-instant and only the batches
+    in use are paged in. With `validate`, the cache is rebuilt when a file was
+    added, removed or modified; pass `validate=False` to skip that scan.
+
+    Images stay in uint8 [0, 255]; scale them per batch with `normalize_batch`.
+    Returns the images, labels and label map, like `load_fingerprint_dataset`.
+    """
+    images_path = os.path.join(cache_dir, CACHE_IMAGES_FILENAME)
+    labels_path = os.path.join(cache_dir, CACHE_LABELS_FILENAME)
+
+    cached = None
+    if os.path.exists(images_path) and os.path.exists(labels_path):
+        with open(labels_path) as f:
+            cached = json.load(f)
+
+    if cached is not None and not validate:
+        return (
+            np.load(images_path, mmap_mode='r'),
+            np.array(cached["labels"]),
+            cached["label_map"],
+        )
+
+    paths, labels, label_map = list_fingerprint_files(base_path)
+    mtimes = [os.stat(path).st_mtime_ns for path in paths]
+    if cached is not None and cached["paths"] == paths and cached["mtimes"] == mtimes:
+        return np.load(images_path, mmap_mode='r'), np.array(labels), label_map
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = images_path + ".tmp"
+    images = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.uint8, shape=(len(paths),) + IMAGE_SIZE
+    )
+    with ThreadPoolExecutor(num_workers) as executor:
+        for row, image in enumerate(executor.map(_read_fingerprint, paths)):
+            images[row] = image
+    images.flush()
+    del images
+    os.replace(tmp_path, images_path)
+
+    with open(labels_path, "w") as f:
+        json.dump(
+            {"paths": paths, "mtimes": mtimes, "labels": labels, "label_map": label_map},
+            f,
+        )
+    return np.load(images_path, mmap_mode='r'), np.array(labels), label_map
+
+
+def normalize_batch(images):
+    """Scales a batch of uint8 images to float32 [0, 1] and adds the channel axis."""
+    if images.dtype == np.uint8:
+        images = images.astype(np.float32) / 255.0
+    else:
+        images = images.astype(np.float32, copy=False)
+    if images.ndim == 3:
+        images = images[..., np.newaxis]
+    return images
@@ -0,0 +1,128 @@
+"""Gallery of enrolled fingerprints embedded once through the Siamese tower.
+
+`is_authorized` in the notebook reloads every reference image and runs the
+whole Siamese model once per reference, so the shared tower embeds the same
+references again on every call. A `FingerprintGallery` embeds the references
+once, then scores a probe with a single tower pass and the L1 + sigmoid head
+applied to the whole gallery at once with NumPy.
+"""
+
+import os
+
+import numpy as np
+
+from .data import preprocess_image
+from .model import split_siamese_network
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class FingerprintGallery:
+    """Cached tower embeddings of reference fingerprints with vectorized pair scoring."""
+
+    def __init__(self, base_model, head_kernel, head_bias):
+        self.base_model = base_model
+        self.head_kernel = np.asarray(head_kernel, dtype=np.float32)
+        self.head_bias = head_bias
+        self.paths = []
+        self.embeddings = np.zeros((0, len(self.head_kernel)), dtype=np.float32)
+
+    @classmethod
+    def from_siamese(cls, siamese_model, reference_images_paths=(), batch_size=32):
+        """Builds a gallery from a trained Siamese model and enrolls references."""
+        gallery = cls(*split_siamese_network(siamese_model))
+        gallery.enroll(reference_images_paths, batch_size)
+        return gallery
+
+    def __len__(self):
+        return len(self.paths)
+
+    def embed(self, images, batch_size=32):
+        """Runs a batch of preprocessed images through the shared tower."""
+        return np.concatenate(
+            [
+                np.asarray(self.base_model(images[start : start + batch_size], training=False))
+                for start in range(0, len(images), batch_size)
+            ]
+        ).astype(np.float32)
+
+    def enroll(self, reference_images_paths, batch_size=32):
+        """Embeds reference images and adds them to the gallery.
+
+        Images that cannot be loaded are skipped, as `is_authorized` does.
+        """
+        paths = []
+        images = []
+        for path in reference_images_paths:
+            image = preprocess_image(path)
+            if image is None:
+                print(f"Skipping reference image: {path}")
+                continue
+            paths.append(path)
+            images.append(image)
+        if not images:
+            return
+        self.embeddings = np.concatenate(
+            [self.embeddings, self.embed(np.stack(images), batch_size)]
+        )
+        self.paths += paths
+
+    def score(self, probe_embedding):
+        """Returns the Siamese similarity of one probe embedding to every reference."""
+        distances = np.abs(self.embeddings - probe_embedding)
+        return sigmoid(distances @ self.head_kernel + self.head_bias)
+
+    def score_matrix(self, probe_embeddings, reference_embeddings=None, batch_size=64):
+        """Returns the `(probes, references)` Siamese similarities, a batch of probes at a time.
+
+        References default to the gallery.
+        """
+        if reference_embeddings is None:
+            reference_embeddings = self.embeddings
+        scores = []
+        for start in range(0, len(probe_embeddings), batch_size):
+            batch = probe_embeddings[start : start + batch_size, np.newaxis]
+            distances = np.abs(batch - reference_embeddings)
+            scores.append(sigmoid(distances @ self.head_kernel + self.head_bias))
+        return np.concatenate(scores)
+
+    def match(self, input_image_path):
+        """Returns the best matching reference path and its score, or (None, 0.0)."""
+        input_image = preprocess_image(input_image_path)
+        if input_image is None or not len(self.paths):
+            return None, 0.0
+        scores = self.score(self.embed(input_image[np.newaxis])[0])
+        best = int(np.argmax(scores))
+        return self.paths[best], float(scores[best])
+
+    def is_authorized(self, input_image_path, threshold=0.45):
+        """Same decision as the notebook's `is_authorized`, with one tower pass."""
+        ref_image_path, score = self.match(input_image_path)
+        if ref_image_path is not None and score >= threshold:
+            print(f"Authorized based on reference: {ref_image_path} with score {score}")
+            return "Authorized"
+        print("No match found, not authorized")
+        return "Not Authorized"
+
+    def save(self, path):
+        """Writes the gallery embeddings and their paths to an .npz file."""
+        np.savez(path, paths=np.array(self.paths), embeddings=self.embeddings)
+
+    def load(self, path):
+        """Replaces the gallery with one written by `save`.
+
+        References whose image file is newer than the cache are embedded again.
+        """
+        with np.load(path) as data:
+            paths = [str(p) for p in data["paths"]]
+            embeddings = data["embeddings"]
+        cache_mtime = os.path.getmtime(path)
+        fresh = np.array(
+            [not os.path.exists(p) or os.path.getmtime(p) <= cache_mtime for p in paths],
+            dtype=bool,
+        )
+        self.paths = [p for p, keep in zip(paths, fresh) if keep]
+        self.embeddings = embeddings[fresh]
+        self.enroll([p for p, keep in zip(paths, fresh) if not keep])
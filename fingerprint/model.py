@@ -0,0 +1,100 @@
+"""Siamese network whose shared tower embeds fingerprints and whose head scores pairs."""
+
+from tensorflow.keras import backend as K
+from tensorflow.keras.layers import (
+    Activation,
+    BatchNormalization,
+    Conv2D,
+    Dense,
+    Flatten,
+    GlobalAveragePooling2D,
+    Input,
+    Lambda,
+    MaxPooling2D,
+)
+from tensorflow.keras.models import Model
+
+
+# Building the base model to learn fingerprint features
+def build_base_model(input_shape):
+    inputs = Input(input_shape)
+    x = Conv2D(32, (3, 3), activation='relu', padding='same')(inputs)
+    x = BatchNormalization()(x)
+    x = Conv2D(64, (3, 3), activation='relu', padding='same')(x)
+    x = BatchNormalization()(x)
+    x = Conv2D(128, (3, 3), activation='relu', padding='same')(x)
+    x = BatchNormalization()(x)
+    x = Flatten()(x)
+    x = Dense(256, activation='relu')(x)
+    outputs = Dense(128, activation='relu')(x)
+
+    return Model(inputs, outputs)
+
+
+def build_compact_base_model(input_shape, filters=(32, 64, 128, 128), embedding_dim=128):
+    """A drop-in for `build_base_model` that does not flatten full-resolution features.
+
+    A strided stem halves the resolution, every block halves it again with
+    max pooling, and global average pooling feeds a small embedding head, so
+    the tower has about 0.4M parameters instead of 537M. It outputs the same
+    `embedding_dim` ReLU embedding.
+    """
+    inputs = Input(input_shape)
+    x = Conv2D(filters[0], (5, 5), strides=2, padding='same', use_bias=False)(inputs)
+    x = BatchNormalization()(x)
+    x = Activation('relu')(x)
+    for block_filters in filters[1:]:
+        x = Conv2D(block_filters, (3, 3), padding='same', use_bias=False)(x)
+        x = BatchNormalization()(x)
+        x = Activation('relu')(x)
+        x = MaxPooling2D((2, 2))(x)
+    x = Conv2D(filters[-1], (3, 3), padding='same', use_bias=False)(x)
+    x = BatchNormalization()(x)
+    x = Activation('relu')(x)
+    x = GlobalAveragePooling2D()(x)
+    outputs = Dense(embedding_dim, activation='relu')(x)
+
+    return Model(inputs, outputs)
+
+
+# name -> shared tower builder
+BACKBONES = {
+    "full": build_base_model,
+    "compact": build_compact_base_model,
+}
+
+
+# Custom Lambda layer to calculate the L1 distance between embeddings
+def l1_distance(vectors):
+    x, y = vectors
+    return K.abs(x - y)
+
+
+# Building the Siamese network for fingerprint matching
+def build_siamese_network(input_shape, backbone="full"):
+    if backbone not in BACKBONES:
+        raise ValueError(
+            "Unknown backbone {}, expected one of {}".format(backbone, list(BACKBONES))
+        )
+    base_model = BACKBONES[backbone](input_shape)
+
+    input_a = Input(input_shape)
+    input_b = Input(input_shape)
+
+    feats_a = base_model(input_a)
+    feats_b = base_model(input_b)
+
+    distance = Lambda(l1_distance)([feats_a, feats_b])
+
+    outputs = Dense(1, activation='sigmoid')(distance)
+
+    model = Model([input_a, input_b], outputs)
+
+    return model
+
+
+def split_siamese_network(siamese_model):
+    """Returns the shared tower of a Siamese model and the weights of its sigmoid head."""
+    base_model = next(layer for layer in siamese_model.layers if isinstance(layer, Model))
+    kernel, bias = siamese_model.layers[-1].get_weights()
+    return base_model, kernel[:, 0], float(bias[0])
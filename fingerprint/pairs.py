@@ -0,0 +1,162 @@
+"""Streaming pair sampling for Siamese training, with optional hard-negative mining.
+
+`create_pairs` scans the whole label list once per label and materializes
+every pair of images before training. `PairSampler` indexes the samples of
+every identity once, then draws balanced batches of index pairs and gathers
+only the images of the current batch, so memory does not grow with the
+number of pairs drawn.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from .data import IMAGE_SIZE, normalize_batch
+
+
+def build_label_index(labels):
+    """Returns the unique labels, the class of every sample and the indices of every class.
+
+    Runs in O(N log N) instead of one O(N) scan per label.
+    """
+    classes, class_of = np.unique(np.asarray(labels), return_inverse=True)
+    order = np.argsort(class_of, kind="stable")
+    bounds = np.cumsum(np.bincount(class_of, minlength=len(classes)))[:-1]
+    return classes, class_of, np.split(order, bounds)
+
+
+class PairSampler:
+    """Draws balanced batches of positive and negative index pairs.
+
+    Labels are grouped by identity: with a `label_map`, as returned by
+    `load_fingerprint_dataset`, every label is replaced by its person ID, so
+    different fingers of the same person form positive pairs.
+    """
+
+    def __init__(
+        self,
+        labels,
+        label_map=None,
+        batch_size=32,
+        positive_fraction=0.5,
+        hard_negative_fraction=0.5,
+        hard_negative_pool=5,
+        seed=None,
+    ):
+        if label_map is not None:
+            labels = [label_map[label] for label in labels]
+        self.classes, self.class_of, self.class_indices = build_label_index(labels)
+        if len(self.classes) < 2:
+            raise ValueError("At least two identities are needed to draw negative pairs")
+        self.positive_classes = np.array(
+            [c for c, indices in enumerate(self.class_indices) if len(indices) > 1]
+        )
+        if positive_fraction > 0 and not len(self.positive_classes):
+            raise ValueError("No identity has two samples to draw positive pairs from")
+
+        self.batch_size = batch_size
+        self.positive_fraction = positive_fraction
+        self.hard_negative_fraction = hard_negative_fraction
+        self.hard_negative_pool = hard_negative_pool
+        self.embeddings = None
+        self.rng = np.random.RandomState(seed)
+
+    def update_embeddings(self, embeddings):
+        """Sets the current tower embeddings of every sample, used to mine hard negatives."""
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    def _positives(self, n):
+        if n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        classes = self.positive_classes[self.rng.randint(len(self.positive_classes), size=n)]
+        sizes = np.array([len(self.class_indices[c]) for c in classes])
+        first = self.rng.randint(sizes)
+        # A non-zero offset guarantees two different samples of the same class
+        second = (first + self.rng.randint(1, sizes)) % sizes
+        anchors = np.array([self.class_indices[c][i] for c, i in zip(classes, first)])
+        others = np.array([self.class_indices[c][i] for c, i in zip(classes, second)])
+        return anchors, others
+
+    def _random_negatives(self, anchors):
+        num_classes = len(self.classes)
+        classes = (self.class_of[anchors] + self.rng.randint(1, num_classes, len(anchors)))
+        classes %= num_classes
+        return np.array(
+            [self.class_indices[c][self.rng.randint(len(self.class_indices[c]))] for c in classes]
+        )
+
+    def _hard_negatives(self, anchors):
+        # Pick one of the `hard_negative_pool` closest samples of another
+        # identity, by the same L1 distance the Siamese head scores
+        negatives = np.empty(len(anchors), dtype=np.int64)
+        for i, anchor in enumerate(anchors):
+            distances = np.abs(self.embeddings - self.embeddings[anchor]).sum(axis=-1)
+            distances[self.class_of == self.class_of[anchor]] = np.inf
+            pool = min(self.hard_negative_pool, int(np.isfinite(distances).sum()))
+            nearest = np.argpartition(distances, pool - 1)[:pool]
+            negatives[i] = nearest[self.rng.randint(pool)]
+        return negatives
+
+    def sample(self, batch_size=None):
+        """Returns the first indices, second indices and 0/1 targets of one batch of pairs."""
+        batch_size = batch_size or self.batch_size
+        num_positives = int(round(batch_size * self.positive_fraction))
+        num_negatives = batch_size - num_positives
+
+        positive_a, positive_b = self._positives(num_positives)
+        negative_a = self.rng.randint(len(self.class_of), size=num_negatives)
+        negative_b = self._random_negatives(negative_a)
+        if self.embeddings is not None and self.hard_negative_fraction > 0:
+            num_hard = int(round(num_negatives * self.hard_negative_fraction))
+            if num_hard:
+                negative_b[:num_hard] = self._hard_negatives(negative_a[:num_hard])
+
+        first = np.concatenate([positive_a, negative_a]).astype(np.int64)
+        second = np.concatenate([positive_b, negative_b]).astype(np.int64)
+        targets = np.concatenate([np.ones(num_positives), np.zeros(num_negatives)])
+        order = self.rng.permutation(batch_size)
+        return first[order], second[order], targets[order].astype(np.float32)
+
+    def batches(self, images):
+        """Endlessly yields `([images_a, images_b], targets)` batches gathered from `images`.
+
+        uint8 images are scaled to [0, 1] per batch, and a channel axis is added
+        to images stored without one.
+        """
+        while True:
+            first, second, targets = self.sample()
+            pair = [normalize_batch(images[first]), normalize_batch(images[second])]
+            yield pair, targets
+
+    def to_dataset(self, images):
+        """Wraps `batches` in an endless `tf.data.Dataset`; pass `steps_per_epoch` to `fit`."""
+        image_spec = tf.TensorSpec((None,) + IMAGE_SIZE + (1,), tf.float32)
+        ds = tf.data.Dataset.from_generator(
+            lambda: ((tuple(pair), targets) for pair, targets in self.batches(images)),
+            output_signature=((image_spec, image_spec), tf.TensorSpec((None,), tf.float32)),
+        )
+        return ds.prefetch(tf.data.AUTOTUNE)
+
+
+class HardNegativeMining(tf.keras.callbacks.Callback):
+    """Refreshes the sampler's embeddings with the shared tower every `every` epochs."""
+
+    def __init__(self, sampler, base_model, images, every=1, batch_size=64):
+        super().__init__()
+        self.sampler = sampler
+        self.base_model = base_model
+        self.images = images
+        self.every = every
+        self.batch_size = batch_size
+
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % self.every:
+            return
+        embeddings = [
+            np.asarray(
+                self.base_model(
+                    normalize_batch(self.images[start : start + self.batch_size]), training=False
+                )
+            )
+            for start in range(0, len(self.images), self.batch_size)
+        ]
+        self.sampler.update_embeddings(np.concatenate(embeddings))
@@ -0,0 +1 @@
+"""Speaker recognition from FFT speech samples with a 1D convnet."""
@@ -0,0 +1,29 @@
+"""Command line entry points: `python -m speaker_recognition <command> [options]`.
+
+Only the module of the chosen command is imported, so `verify` and `serve`
+start without loading the training code or TensorFlow.
+"""
+
+import importlib
+import sys
+
+# command -> module whose `main(argv)` runs it
+COMMANDS = {
+    "train": "speaker_recognition.train",
+    "enroll": "speaker_recognition.enroll",
+    "verify": "speaker_recognition.verify",
+    "serve": "speaker_recognition.serve",
+    "evaluate": "speaker_recognition.evaluation",
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print("usage: python -m speaker_recognition {{{}}} [options]".format(",".join(COMMANDS)))
+        return 2
+    return importlib.import_module(COMMANDS[argv[0]]).main(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""NumPy wav decoding that matches `tf.audio.decode_wav` without building a graph."""
+
+import wave
+
+import numpy as np
+
+from .config import SAMPLING_RATE
+
+
+def decode_pcm(frames, sample_width, channels=1):
+    """Decodes raw little-endian PCM frames into a (samples, channels) float32 array.
+
+    Values are scaled to [-1.0, 1.0) the same way `tf.audio.decode_wav` does.
+    """
+    if sample_width == 1:
+        audio = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        audio = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((raw.shape[0], 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        audio = padded.view("<i4").reshape(-1).astype(np.float32) / 2 ** 31
+    elif sample_width == 4:
+        audio = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2 ** 31
+    else:
+        raise ValueError("Unsupported sample width: {} bytes".format(sample_width))
+    return audio.reshape(-1, channels)
+
+
+def read_wav(path):
+    """Reads a PCM wav file and returns its (samples, channels) audio and sampling rate.
+
+    `path` can also be a binary file object, e.g. the body of an upload.
+    """
+    with wave.open(path if hasattr(path, "read") else str(path), "rb") as f:
+        sampling_rate = f.getframerate()
+        audio = decode_pcm(
+            f.readframes(f.getnframes()), f.getsampwidth(), f.getnchannels()
+        )
+    return audio, sampling_rate
+
+
+def read_pcm16(path, desired_samples=SAMPLING_RATE):
+    """Reads the first channel of a 16-bit wav file as int16, padded or cut to length.
+
+    Dividing the result by 32768 gives exactly what `path_to_audio` returns.
+    """
+    with wave.open(str(path), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError("{} is not a 16-bit PCM wav file".format(path))
+        channels = f.getnchannels()
+        frames = f.readframes(min(f.getnframes(), desired_samples))
+    audio = np.frombuffer(frames, dtype="<i2").reshape(-1, channels)[:, 0]
+    return fit_length(audio, desired_samples)
+
+
+def fit_length(audio, length):
+    """Zero-pads or truncates the first axis of `audio` to `length` samples."""
+    if audio.shape[0] >= length:
+        return audio[:length]
+    padding = [(0, length - audio.shape[0])] + [(0, 0)] * (audio.ndim - 1)
+    return np.pad(audio, padding, "constant")
+
+
+def load_mono(path, sampling_rate=SAMPLING_RATE):
+    """Reads a wav file as float32 mono at `sampling_rate`, like `librosa.load`.
+
+    Channels are averaged, and other sampling rates are converted with
+    polyphase resampling.
+    """
+    audio, rate = read_wav(path)
+    audio = audio.mean(axis=1)
+    if rate != sampling_rate:
+        from math import gcd
+
+        from scipy.signal import resample_poly
+
+        g = gcd(rate, sampling_rate)
+        audio = resample_poly(audio, sampling_rate // g, rate // g)
+    return audio.astype(np.float32, copy=False)
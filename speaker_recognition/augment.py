@@ -0,0 +1,157 @@
+"""Noise augmentation on the training hot path, drawn from a `NoiseBank`.
+
+Compared to `add_noise`, `NoiseAugmenter`:
+
+- draws 1 second crops at random offsets of the long resampled noise streams,
+  instead of only the fixed chunks (or draws the fixed chunks, if asked to),
+- looks up the peak or energy of every possible crop in tables computed once,
+  instead of reducing over every gathered noise sample,
+- broadcasts the per-sample gain over the samples instead of repeating it,
+- can mix at a target signal-to-noise ratio in dB instead of a peak ratio,
+- seeds every batch from `(seed, epoch, batch index)`, so that each epoch is
+  reproducible and different from the others.
+
+The epoch and batch index are derived inside the pipeline: `apply` repeats
+the batched dataset and splits the running batch count by the number of
+steps per epoch. A Keras callback setting the epoch would race with the
+prefetching of the next epoch's first batches. Train on the repeated
+dataset with `model.fit(..., steps_per_epoch=steps_per_epoch)`.
+
+TensorFlow is imported by the methods that use it, as in `dataset`.
+"""
+
+import numpy as np
+
+from .config import SCALE, SHUFFLE_SEED
+
+
+def _sliding_peaks(stream, window):
+    from scipy.ndimage import maximum_filter1d
+
+    # The centred maximum at `start + window // 2` covers [start, start + window)
+    peaks = maximum_filter1d(np.asarray(stream), window)
+    return peaks[window // 2 : len(stream) - window + 1 + window // 2]
+
+
+def _sliding_energy(stream, window):
+    squares = np.concatenate([[0.0], np.cumsum(np.square(stream, dtype=np.float64))])
+    return (squares[window:] - squares[:-window]) / window
+
+
+class NoiseAugmenter:
+    """Mixes noise from a `NoiseBank` into batches of audio.
+
+    With `snr_db=None`, the noise is scaled like `add_noise` does, by
+    `scale` times the ratio between the audio and noise maxima. Otherwise the
+    noise is scaled so that the signal-to-noise ratio, in dB, is `snr_db`, or
+    drawn uniformly from the `(low, high)` range `snr_db`.
+    """
+
+    def __init__(
+        self, noise_bank, scale=SCALE, snr_db=None, random_crops=True, seed=SHUFFLE_SEED
+    ):
+        import tensorflow as tf
+
+        self.scale = scale
+        self.snr_db = snr_db
+        self.random_crops = random_crops
+        self.seed = seed
+        self.window = noise_bank.sampling_rate
+
+        streams = np.asarray(noise_bank.streams, dtype=np.float32)
+        self.streams = tf.constant(streams)
+        if random_crops:
+            # Every start offset that leaves a full window in its own stream
+            offsets = []
+            tables = []
+            counts = []
+            for source in noise_bank.manifest["sources"]:
+                if source["length"] < self.window:
+                    continue
+                stream = streams[source["offset"] : source["offset"] + source["length"]]
+                offsets.append(source["offset"])
+                counts.append(source["length"] - self.window + 1)
+                if snr_db is None:
+                    tables.append(_sliding_peaks(stream, self.window))
+                else:
+                    tables.append(_sliding_energy(stream, self.window))
+            self.num_crops = int(sum(counts))
+            self.crop_ends = tf.constant(np.cumsum(counts), dtype=tf.int64)
+            self.crop_firsts = tf.constant(
+                np.array(offsets) - np.cumsum([0] + counts[:-1]), dtype=tf.int64
+            )
+        else:
+            starts = noise_bank.chunk_starts
+            self.num_crops = len(starts)
+            self.chunk_starts = tf.constant(starts, dtype=tf.int64)
+            if snr_db is None:
+                tables = [noise_bank.peaks]
+            else:
+                tables = [
+                    _sliding_energy(streams[start : start + self.window], self.window)
+                    for start in starts
+                ]
+        self.table = tf.constant(np.concatenate(tables).astype(np.float32))
+
+    def _crop_starts(self, crops):
+        import tensorflow as tf
+
+        if not self.random_crops:
+            return tf.gather(self.chunk_starts, crops)
+        source = tf.searchsorted(self.crop_ends, crops, side="right")
+        return tf.gather(self.crop_firsts, source) + crops
+
+    def __call__(self, audio, batch_index=0, epoch=0):
+        """Returns `audio`, shaped `(batch, samples, 1)`, with noise added.
+
+        The noise only depends on the seed, `epoch` and `batch_index`.
+        """
+        import tensorflow as tf
+
+        batch_size = tf.shape(audio)[0]
+        batch_index = tf.cast(batch_index, tf.int64)
+        epoch = tf.cast(epoch, tf.int64)
+        seed = tf.stack([tf.constant(self.seed, tf.int64), epoch * (1 << 32) + batch_index])
+        crops = tf.random.stateless_uniform(
+            (batch_size,), seed, 0, self.num_crops, dtype=tf.int64
+        )
+        starts = self._crop_starts(crops)
+        # Only the rows of this batch are gathered, straight from the streams
+        index = starts[:, tf.newaxis] + tf.range(tf.shape(audio)[1], dtype=tf.int64)
+        noise = tf.gather(self.streams, index)[..., tf.newaxis]
+        noise_stat = tf.gather(self.table, crops)
+
+        if self.snr_db is None:
+            gain = self.scale * tf.math.reduce_max(audio, axis=[1, 2]) / noise_stat
+        else:
+            low, high = (self.snr_db,) * 2 if np.isscalar(self.snr_db) else self.snr_db
+            snr_db = tf.random.stateless_uniform(
+                (batch_size,), seed + 1, low, high + 1e-9, dtype=tf.float32
+            )
+            signal_energy = tf.math.reduce_mean(tf.math.square(audio), axis=[1, 2])
+            gain = tf.math.sqrt(
+                signal_energy / (tf.maximum(noise_stat, 1e-12) * 10 ** (snr_db / 10))
+            )
+        return audio + noise * gain[:, tf.newaxis, tf.newaxis]
+
+    def apply(self, ds, steps_per_epoch=None):
+        """Repeats a batched dataset of `(audio, label)` and adds noise to every batch.
+
+        `ds` is one epoch of `steps_per_epoch` batches, by default its
+        cardinality. Batch `i` of the repeated dataset is batch
+        `i % steps_per_epoch` of epoch `i // steps_per_epoch`.
+        """
+        import tensorflow as tf
+
+        if steps_per_epoch is None:
+            steps_per_epoch = int(ds.cardinality())
+            if steps_per_epoch <= 0:
+                raise ValueError(
+                    "The number of batches per epoch is unknown, pass steps_per_epoch"
+                )
+
+        def add_noise(i, xy):
+            epoch, batch_index = i // steps_per_epoch, i % steps_per_epoch
+            return self(xy[0], batch_index, epoch), xy[1]
+
+        return ds.repeat().enumerate().map(add_noise, num_parallel_calls=tf.data.AUTOTUNE)
@@ -0,0 +1,186 @@
+"""Two-layer authentication: voice and passphrase checked concurrently on one decode.
+
+`authenticate_user_with_keywords` in the notebook runs `predict` and then
+`predict_keywords`, each decoding the same file again, and always runs the
+keyword layer even when the voice layer already rejected the user.
+
+`TwoLayerAuthenticator` decodes and resamples the recording once into a
+read-only buffer shared by every layer, runs the layers concurrently on a
+thread pool, and returns as soon as one of them rejects: layers that have
+not started are cancelled, and running ones see their `cancelled` event set
+so that they can stop early. Every result carries per-layer timings.
+
+With a `ReplayIndex`, every attempt is first screened for a replay of an
+earlier accepted utterance, before any layer runs, and accepted attempts are
+added to the index.
+
+A layer is a callable `layer(audio, cancelled, user)` that returns an
+`(accepted, detail)` pair, where `audio` is the shared float32 buffer,
+`cancelled` a `threading.Event` and `user` the claimed identity, or None.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from .audio import load_mono
+from .config import SAMPLING_RATE
+from .profiling import profiler
+
+AuthenticationResult = namedtuple(
+    "AuthenticationResult", ["accepted", "details", "timings_ms"]
+)
+
+
+def voice_layer(engine, known_speakers):
+    """Returns a layer accepting recordings that `engine` attributes to a known speaker.
+
+    When a user is claimed, the speaker must also be that user. Its detail
+    is the `(speaker, confidence)` of `engine.predict`.
+    """
+
+    def layer(audio, cancelled, user):
+        speaker, confidence = engine.predict(audio)
+        accepted = speaker in known_speakers and user in (None, speaker)
+        return accepted, (speaker, confidence)
+
+    return layer
+
+
+def keyword_layer(detect_keywords, required_keywords):
+    """Returns a layer accepting recordings in which every required keyword is detected.
+
+    `detect_keywords(audio, cancelled)` returns the keywords found in the
+    buffer; its detail is that list.
+    """
+
+    def layer(audio, cancelled, user):
+        detected = list(detect_keywords(audio, cancelled))
+        return all(keyword in detected for keyword in required_keywords), detected
+
+    return layer
+
+
+def passphrase_layer(verifier):
+    """Returns a layer accepting recordings of the claimed user's enrolled passphrase.
+
+    `verifier` is a `PassphraseVerifier`; its detail is the DTW distance to
+    the closest template.
+    """
+
+    def layer(audio, cancelled, user):
+        if user is None:
+            raise ValueError("The passphrase layer needs a claimed user")
+        return verifier.verify(user, audio, cancelled)
+
+    return layer
+
+
+class TwoLayerAuthenticator:
+    """Runs authentication layers concurrently on a shared decode, stopping at the first rejection.
+
+    `layers` maps layer names to layer callables, e.g.
+    `{"voice": voice_layer(...), "keywords": keyword_layer(...)}`. Use it as
+    a context manager, or call `close`, to shut the thread pool down.
+    """
+
+    def __init__(
+        self, layers, sampling_rate=SAMPLING_RATE, max_workers=None, replay_index=None
+    ):
+        self.layers = dict(layers)
+        self.sampling_rate = sampling_rate
+        self.replay_index = replay_index
+        self._executor = ThreadPoolExecutor(max_workers or len(self.layers))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _timed(self, name, layer, audio, cancelled, user, timings):
+        start = time.perf_counter()
+        try:
+            return layer(audio, cancelled, user)
+        finally:
+            seconds = time.perf_counter() - start
+            timings[name] = seconds * 1000
+            profiler.record("auth." + name, seconds)
+
+    def authenticate(self, source, user=None):
+        """Authenticates a wav path or a float32 buffer and returns an `AuthenticationResult`.
+
+        `user` is the identity the speaker claims, if any, passed to every layer.
+
+        `details` maps every layer that finished to its detail; layers
+        skipped after a rejection are missing from it. A layer that raised,
+        e.g. for a user without an enrolled passphrase, rejects the attempt
+        with `{"error": "<type>: <message>"}` as its detail. A replay is rejected
+        with only a "replay" detail, its `ReplayMatch`. `timings_ms` holds the
+        decode and replay screening times, the time of every finished layer
+        and the total.
+        """
+        start = time.perf_counter()
+        timings = {}
+        if isinstance(source, (str, os.PathLike)):
+            audio = load_mono(source, self.sampling_rate)
+        else:
+            audio = np.array(source, dtype=np.float32)
+        # The buffer is shared between threads, so no layer may write to it
+        audio.flags.writeable = False
+        timings["decode"] = (time.perf_counter() - start) * 1000
+        profiler.record("auth.decode", timings["decode"] / 1000)
+
+        if self.replay_index is not None:
+            replay_start = time.perf_counter()
+            replay = self.replay_index.match(audio)
+            timings["replay"] = (time.perf_counter() - replay_start) * 1000
+            profiler.record("auth.replay", timings["replay"] / 1000)
+            if replay.is_replay:
+                timings["total"] = (time.perf_counter() - start) * 1000
+                profiler.record("auth.total", timings["total"] / 1000)
+                return AuthenticationResult(False, {"replay": replay}, timings)
+
+        cancelled = threading.Event()
+        futures = {
+            self._executor.submit(
+                self._timed, name, layer, audio, cancelled, user, timings
+            ): name
+            for name, layer in self.layers.items()
+        }
+        details = {}
+        accepted = True
+        pending = set(futures)
+        try:
+            while pending and accepted:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        layer_accepted, details[futures[future]] = future.result()
+                    except Exception as e:
+                        layer_accepted = False
+                        details[futures[future]] = {
+                            "error": "{}: {}".format(type(e).__name__, e)
+                        }
+                    accepted = accepted and layer_accepted
+        finally:
+            if pending:
+                cancelled.set()
+                for future in pending:
+                    future.cancel()
+
+        if accepted and self.replay_index is not None:
+            self.replay_index.add("{}-{}".format(user, uuid.uuid4().hex), audio)
+
+        timings["total"] = (time.perf_counter() - start) * 1000
+        profiler.record("auth.total", timings["total"] / 1000)
+        # Layers still running in the background may add their timing later
+        return AuthenticationResult(accepted, details, dict(timings))
@@ -0,0 +1,255 @@
+"""Bulk ECAPA embedding extraction for enrolling thousands of users at once.
+
+Files are listed from a directory or a manifest, their lengths read from the
+wav headers, and sorted so that every batch holds recordings of similar
+length. Batches are decoded on a thread pool while the previous one is being
+encoded, zero-padded with the matching relative `wav_lens`, and encoded with
+one `encode_batch` call each.
+
+Embeddings are written to numbered `part-00000.npz` files in the output
+directory as they are computed, every `flush_every` files or `flush_seconds`
+seconds, whichever comes first, and when the run is interrupted by an
+exception, so a run that is killed loses at most `flush_seconds` of work and
+resumes where it stopped. Paths are made absolute before they are stored or
+compared, so resuming from another working directory, or with a manifest
+that spells a path differently, does not embed a file twice. Usage:
+
+    python -m speaker_recognition.bulk_embed AUDIO_DIR_OR_MANIFEST OUTPUT_DIR
+"""
+
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .config import SAMPLING_RATE
+from .embedding_index import l2_normalize
+
+PART_PATTERN = "part-{:05d}.npz"
+
+
+def list_audio_files(source):
+    """Returns the absolute paths of the wav files under a directory, or listed in a manifest.
+
+    A manifest has one path per line; relative paths are resolved against the
+    manifest's folder and blank lines or lines starting with `#` are ignored.
+    """
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "**", "*.wav"), recursive=True)
+        return sorted(os.path.abspath(path) for path in paths)
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        lines = [line.strip() for line in f]
+    return [
+        os.path.abspath(os.path.join(base, line))
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def load_bulk_embeddings(output_dir):
+    """Returns the paths and embeddings of every part written so far."""
+    paths = []
+    embeddings = []
+    for part in sorted(glob.glob(os.path.join(output_dir, "part-*.npz"))):
+        with np.load(part) as data:
+            paths += list(data["paths"])
+            embeddings.append(data["embeddings"])
+    if not embeddings:
+        return paths, np.zeros((0, 0), dtype=np.float32)
+    return paths, np.concatenate(embeddings)
+
+
+def make_batches(lengths, batch_size, max_batch_samples):
+    """Groups file indices sorted by length into batches.
+
+    A batch holds at most `batch_size` files and, once padded to its longest
+    file, at most `max_batch_samples` samples (a single longer file still
+    gets a batch of its own).
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    batch = []
+    for i in order:
+        # Files are sorted, so the current one is the longest of the batch
+        if batch and (
+            len(batch) == batch_size or (len(batch) + 1) * lengths[i] > max_batch_samples
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _load_mono(path, sampling_rate):
+    import torch
+    import torchaudio
+
+    signal, rate = torchaudio.load(path)
+    signal = torch.mean(signal, dim=0)
+    if rate != sampling_rate:
+        signal = torchaudio.functional.resample(signal, rate, sampling_rate)
+    return signal
+
+
+def _num_frames(path, sampling_rate):
+    import torchaudio
+
+    info = torchaudio.info(path)
+    return int(info.num_frames * sampling_rate / info.sample_rate)
+
+
+def _pad_batch(signals):
+    import torch
+
+    lengths = torch.tensor([len(signal) for signal in signals], dtype=torch.float32)
+    wavs = torch.zeros(len(signals), int(lengths.max()))
+    for row, signal in enumerate(signals):
+        wavs[row, : len(signal)] = signal
+    return wavs, lengths / lengths.max()
+
+
+def extract_embeddings(
+    model,
+    source,
+    output_dir,
+    batch_size=32,
+    max_batch_seconds=320,
+    decode_workers=4,
+    num_threads=None,
+    flush_every=1024,
+    flush_seconds=60,
+    sampling_rate=SAMPLING_RATE,
+    verbose=True,
+):
+    """Encodes every file of `source` not yet in `output_dir` and returns files/sec.
+
+    `num_threads` is passed to `torch.set_num_threads` and defaults to the
+    number of CPU cores not used for decoding. Embeddings are written out
+    every `flush_every` files or `flush_seconds` seconds.
+    """
+    import torch
+
+    if num_threads is None:
+        num_threads = max(1, (os.cpu_count() or 1) - decode_workers)
+    torch.set_num_threads(num_threads)
+
+    os.makedirs(output_dir, exist_ok=True)
+    done, _ = load_bulk_embeddings(output_dir)
+    # Parts written before paths were made absolute hold them as given
+    done = {os.path.abspath(path) for path in done}
+    # dict.fromkeys drops a file listed twice, keeping the order
+    paths = [path for path in dict.fromkeys(list_audio_files(source)) if path not in done]
+    next_part = len(glob.glob(os.path.join(output_dir, "part-*.npz")))
+    if verbose:
+        print("{} files already embedded, {} to go".format(len(done), len(paths)))
+    if not paths:
+        return 0.0
+
+    pending_paths = []
+    pending_embeddings = []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal next_part, last_flush
+        last_flush = time.monotonic()
+        if not pending_paths:
+            return
+        part = os.path.join(output_dir, PART_PATTERN.format(next_part))
+        # The temporary name must end in .npz, which np.savez would add, and
+        # stay out of the part-*.npz pattern: a run killed mid-write leaves it
+        # behind, and resuming must neither load nor count it
+        tmp = os.path.join(output_dir, ".tmp-" + PART_PATTERN.format(next_part))
+        np.savez(
+            tmp,
+            paths=np.array(pending_paths),
+            embeddings=np.concatenate(pending_embeddings),
+        )
+        os.replace(tmp, part)
+        next_part += 1
+        pending_paths.clear()
+        pending_embeddings.clear()
+
+    start = time.perf_counter()
+    encoded = 0
+    # An exception, e.g. a KeyboardInterrupt, still writes what was encoded
+    try:
+        with ThreadPoolExecutor(decode_workers) as executor, ThreadPoolExecutor(1) as prefetcher:
+            lengths = list(executor.map(lambda path: _num_frames(path, sampling_rate), paths))
+            batches = make_batches(
+                np.array(lengths), batch_size, max_batch_seconds * sampling_rate
+            )
+
+            def decode(batch):
+                return list(
+                    executor.map(lambda i: _load_mono(paths[i], sampling_rate), batch)
+                )
+
+            # Decode the next batch while the current one is being encoded
+            future = prefetcher.submit(decode, batches[0])
+            for n, batch in enumerate(batches):
+                signals = future.result()
+                if n + 1 < len(batches):
+                    future = prefetcher.submit(decode, batches[n + 1])
+
+                wavs, wav_lens = _pad_batch(signals)
+                with torch.no_grad():
+                    embeddings = model.encode_batch(wavs, wav_lens)
+                embeddings = l2_normalize(
+                    embeddings.detach().cpu().numpy().reshape(len(batch), -1)
+                )
+
+                pending_paths.extend(paths[i] for i in batch)
+                pending_embeddings.append(embeddings)
+                encoded += len(batch)
+                if (
+                    len(pending_paths) >= flush_every
+                    or time.monotonic() - last_flush >= flush_seconds
+                ):
+                    flush()
+                if verbose:
+                    print(
+                        "{}/{} files, {:.1f} files/sec".format(
+                            encoded, len(paths), encoded / (time.perf_counter() - start)
+                        )
+                    )
+    finally:
+        flush()
+    return encoded / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ECAPA embedding extraction.")
+    parser.add_argument("source", help="directory of wav files or manifest file")
+    parser.add_argument("output_dir")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-batch-seconds", type=float, default=320)
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument(
+        "--flush-seconds", type=float, default=60, help="write embeddings at least this often"
+    )
+    args = parser.parse_args()
+
+    from .ecapa import load_ecapa
+
+    rate = extract_embeddings(
+        load_ecapa(),
+        args.source,
+        args.output_dir,
+        batch_size=args.batch_size,
+        max_batch_seconds=args.max_batch_seconds,
+        decode_workers=args.decode_workers,
+        num_threads=args.num_threads,
+        flush_seconds=args.flush_seconds,
+    )
+    print("Throughput: {:.1f} files/sec".format(rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Dataset locations and hyper-parameters shared by the pipeline modules."""
+
+import os
+
+# Get the data from https://www.kaggle.com/kongaevans/speaker-recognition-dataset/download
+# and save it to the 'Downloads' folder in your HOME directory
+DATASET_ROOT = os.environ.get(
+    "DATASET_ROOT",
+    os.path.join(os.path.expanduser("~"), "Downloads/16000_pcm_speeches"),
+)
+
+# The folders in which we will put the audio samples and the noise samples
+AUDIO_SUBFOLDER = "audio"
+NOISE_SUBFOLDER = "noise"
+
+DATASET_AUDIO_PATH = os.path.join(DATASET_ROOT, AUDIO_SUBFOLDER)
+DATASET_NOISE_PATH = os.path.join(DATASET_ROOT, NOISE_SUBFOLDER)
+
+# Percentage of samples to use for validation
+VALID_SPLIT = 0.1
+
+# Seed to use when shuffling the dataset and the noise
+SHUFFLE_SEED = 43
+
+# The sampling rate to use.
+# This is the one used in all the audio samples.
+# We will resample all the noise to this sampling rate.
+# This will also be the output size of the audio wave samples
+# (since all samples are of 1 second long)
+SAMPLING_RATE = 16000
+
+# The factor to multiply the noise with according to:
+#   noisy_sample = sample + noise * prop * scale
+#      where prop = sample_amplitude / noise_amplitude
+SCALE = 0.5
+
+BATCH_SIZE = 128
+EPOCHS = 100
+
+# Where the decoded samples and their FFT are cached between runs
+FEATURE_STORE_PATH = os.path.join(DATASET_ROOT, "feature_store")
+
+# Where the packed record shards of each split are written
+PACKED_PATH = os.path.join(DATASET_ROOT, "packed")
+
+# Where the resampled noise streams and their 1 second chunks are saved
+NOISE_BANK_PATH = os.path.join(DATASET_ROOT, "noise_bank")
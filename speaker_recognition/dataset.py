@@ -0,0 +1,122 @@
+"""tf.data helpers to load speech samples, mix in noise and take their FFT.
+
+TensorFlow is imported by the helpers that use it, so that listing and
+splitting the dataset does not load it.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .config import SAMPLING_RATE, SHUFFLE_SEED, VALID_SPLIT
+
+
+def paths_and_labels_to_dataset(audio_paths, labels):
+    """Constructs a dataset of audios and labels."""
+    import tensorflow as tf
+
+    path_ds = tf.data.Dataset.from_tensor_slices(audio_paths)
+    audio_ds = path_ds.map(lambda x: path_to_audio(x))
+    label_ds = tf.data.Dataset.from_tensor_slices(labels)
+    return tf.data.Dataset.zip((audio_ds, label_ds))
+
+
+def path_to_audio(path):
+    """Reads and decodes an audio file."""
+    import tensorflow as tf
+
+    audio = tf.io.read_file(path)
+    audio, _ = tf.audio.decode_wav(audio, 1, SAMPLING_RATE)
+    return audio
+
+
+def add_noise(audio, noises=None, scale=0.5):
+    import tensorflow as tf
+
+    if noises is not None:
+        # Create a random tensor of the same size as audio ranging from
+        # 0 to the number of noise stream samples that we have.
+        tf_rnd = tf.random.uniform(
+            (tf.shape(audio)[0],), 0, noises.shape[0], dtype=tf.int32
+        )
+        noise = tf.gather(noises, tf_rnd, axis=0)
+
+        # Get the amplitude proportion between the audio and the noise, and
+        # broadcast it over the samples instead of repeating it for each one
+        prop = tf.math.reduce_max(audio, axis=1) / tf.math.reduce_max(noise, axis=1)
+        prop = tf.expand_dims(prop, axis=1)
+
+        # Adding the rescaled noise to audio
+        audio = audio + noise * prop * scale
+
+    return audio
+
+
+def audio_to_fft(audio):
+    import tensorflow as tf
+
+    # Since tf.signal.rfft applies FFT on the innermost dimension,
+    # we need to squeeze the dimensions and then expand them again
+    # after FFT. The input is real, so the real FFT only computes the
+    # positive frequencies instead of a full complex FFT of which
+    # half would be thrown away
+    audio = tf.squeeze(audio, axis=-1)
+    fft = tf.signal.rfft(audio)
+    fft = tf.expand_dims(fft, axis=-1)
+
+    # Return the absolute value of the first half of the FFT
+    # which represents the positive frequencies
+    return tf.math.abs(fft[:, : (audio.shape[1] // 2), :])
+
+
+def list_audio_paths(dataset_audio_path, class_names=None):
+    """Returns the class names and the labelled wav paths of every speaker folder.
+
+    With `class_names`, those speakers keep their labels and the folders of
+    any other speaker are appended after them, sorted, so that labels stay
+    stable as speakers are added.
+    """
+    if class_names is None:
+        class_names = os.listdir(dataset_audio_path)
+    else:
+        folders = os.listdir(dataset_audio_path)
+        missing = [name for name in class_names if name not in folders]
+        if missing:
+            raise ValueError(
+                "No folder in {} for speakers {}".format(dataset_audio_path, missing)
+            )
+        class_names = list(class_names) + sorted(
+            name
+            for name in folders
+            if name not in class_names and os.path.isdir(os.path.join(dataset_audio_path, name))
+        )
+
+    audio_paths = []
+    labels = []
+    for label, name in enumerate(class_names):
+        dir_path = Path(dataset_audio_path) / name
+        speaker_sample_paths = [
+            os.path.join(dir_path, filepath)
+            for filepath in os.listdir(dir_path)
+            if filepath.endswith(".wav")
+        ]
+        audio_paths += speaker_sample_paths
+        labels += [label] * len(speaker_sample_paths)
+    return class_names, audio_paths, labels
+
+
+def split_paths(audio_paths, labels, valid_split=VALID_SPLIT, seed=SHUFFLE_SEED):
+    """Shuffles paths and labels together and splits them into train and valid."""
+    audio_paths = list(audio_paths)
+    labels = list(labels)
+    rng = np.random.RandomState(seed)
+    rng.shuffle(audio_paths)
+    rng = np.random.RandomState(seed)
+    rng.shuffle(labels)
+
+    num_val_samples = int(valid_split * len(audio_paths))
+    return (
+        (audio_paths[:-num_val_samples], labels[:-num_val_samples]),
+        (audio_paths[-num_val_samples:], labels[-num_val_samples:]),
+    )
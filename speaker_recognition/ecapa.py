@@ -0,0 +1,87 @@
+"""Speaker verification with the pretrained SpeechBrain ECAPA-TDNN encoder.
+
+Reference embeddings are computed once at enrollment and kept in an
+`EnrollmentStore`, and probe embeddings are kept in a small LRU cache keyed by
+the audio content hash, so verifying a probe costs at most one encoder pass.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .embedding_index import l2_normalize
+from .enrollment_store import file_hash
+
+ECAPA_SOURCE = "speechbrain/spkrec-ecapa-voxceleb"
+
+# Cosine similarity above which a probe is accepted
+ECAPA_THRESHOLD = 0.85
+
+
+def load_ecapa(source=ECAPA_SOURCE, savedir="pretrained_model"):
+    """Loads the pretrained SpeechBrain speaker recognition model."""
+    from speechbrain.pretrained import SpeakerRecognition
+
+    return SpeakerRecognition.from_hparams(source=source, savedir=savedir)
+
+
+def reduce_embedding(embedding):
+    """Averages an `encode_batch` output down to one L2-normalized 1D vector.
+
+    `encode_batch` returns `(batch, 1, dim)`. Every axis but the embedding
+    dimension is averaged, so a multi-channel file gives the mean embedding of
+    its channels.
+    """
+    embedding = np.asarray(embedding.detach().cpu() if hasattr(embedding, "detach") else embedding)
+    return l2_normalize(embedding.reshape(-1, embedding.shape[-1]).mean(axis=0))
+
+
+class EcapaEncoder:
+    """Computes reduced ECAPA embeddings of audio files, caching recent ones."""
+
+    def __init__(self, model=None, cache_size=256):
+        self.model = model if model is not None else load_ecapa()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def encode_file(self, path):
+        """Returns the reduced embedding of a file and the hash of its content."""
+        import torchaudio
+
+        audio_hash = file_hash(path)
+        if audio_hash in self._cache:
+            self._cache.move_to_end(audio_hash)
+            return self._cache[audio_hash], audio_hash
+
+        signal, _ = torchaudio.load(path)
+        embedding = reduce_embedding(self.model.encode_batch(signal))
+        self._cache[audio_hash] = embedding
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return embedding, audio_hash
+
+
+def enroll(store, encoder, user, paths):
+    """Adds the reference recordings `paths` of `user` to the enrollment store.
+
+    Recordings already enrolled for that user are not encoded again.
+    Returns the number of recordings that were encoded.
+    """
+    encoded = 0
+    for path in paths:
+        if (user, file_hash(path)) in store:
+            continue
+        embedding, audio_hash = encoder.encode_file(path)
+        store.add(user, audio_hash, embedding)
+        encoded += 1
+    return encoded
+
+
+def verify(store, encoder, user, probe_path, threshold=ECAPA_THRESHOLD):
+    """Scores a probe recording against `user`'s references with one encoder pass.
+
+    Returns whether the probe is accepted and its similarity score.
+    """
+    embedding, _ = encoder.encode_file(probe_path)
+    score = store.score_user(user, embedding)
+    return score > threshold, score
@@ -0,0 +1,157 @@
+"""Open-set 1:N speaker identification against an index of enrolled embeddings.
+
+Instead of growing and retraining the softmax of `build_model`, every enrolled
+speaker is stored as one L2-normalized embedding, taken from the penultimate
+`Dense` layer (see `build_embedding_model`). The embeddings live in one
+contiguous float32 matrix, so identifying a batch of probes against thousands
+of speakers is a single matrix product followed by a partial sort.
+
+An index is saved as a directory holding `embeddings.npy` and
+`speakers.json`, and can be loaded back memory-mapped.
+"""
+
+import json
+import os
+
+import numpy as np
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+SPEAKERS_FILENAME = "speakers.json"
+
+
+def l2_normalize(x, axis=-1, epsilon=1e-12):
+    """Scales `x` to unit L2 norm along `axis`."""
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=axis, keepdims=True), epsilon)
+
+
+def embed(embedding_model, features, batch_size=128):
+    """Returns the embeddings of `features` computed in batches."""
+    return np.concatenate(
+        [
+            np.asarray(embedding_model(features[start : start + batch_size], training=False))
+            for start in range(0, len(features), batch_size)
+        ]
+    )
+
+
+class EmbeddingIndex:
+    """Contiguous matrix of enrolled speaker embeddings with top-k cosine search."""
+
+    def __init__(self, dim=128, capacity=1024):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._speakers = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._speakers)
+
+    def __contains__(self, speaker):
+        return speaker in self._rows
+
+    @property
+    def speakers(self):
+        return list(self._speakers)
+
+    @property
+    def embeddings(self):
+        """The enrolled embeddings, one row per speaker in `speakers` order."""
+        return self._matrix[: len(self._speakers)]
+
+    def _reserve(self, size):
+        # Memory-mapped matrices are read-only, so they are copied on the first
+        # change, and the capacity doubles whenever it runs out
+        if self._matrix.flags.writeable and size <= len(self._matrix):
+            return
+        capacity = len(self._matrix)
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[: len(self._speakers)] = self.embeddings
+        self._matrix = matrix
+
+    def add(self, speaker, embeddings):
+        """Enrolls or replaces `speaker` with the centroid of one or more embeddings."""
+        embeddings = l2_normalize(np.reshape(embeddings, (-1, self.dim)))
+        centroid = l2_normalize(embeddings.mean(axis=0))
+        if speaker in self._rows:
+            self._reserve(len(self._speakers))
+            self._matrix[self._rows[speaker]] = centroid
+            return
+        self._reserve(len(self._speakers) + 1)
+        self._rows[speaker] = len(self._speakers)
+        self._matrix[len(self._speakers)] = centroid
+        self._speakers.append(speaker)
+
+    def remove(self, speaker):
+        """Removes `speaker` by moving the last row into its place."""
+        self._reserve(len(self._speakers))
+        row = self._rows.pop(speaker)
+        last = len(self._speakers) - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._speakers[row] = self._speakers[last]
+            self._rows[self._speakers[row]] = row
+        self._speakers.pop()
+
+    def search(self, queries, k=5):
+        """Returns the top-k speakers and cosine scores for every query embedding.
+
+        `queries` is a single embedding or a batch of them. The result is a pair
+        of `(num_queries, k)` arrays of speaker names and scores, best first.
+        """
+        queries = l2_normalize(np.reshape(queries, (-1, self.dim)))
+        k = min(k, len(self._speakers))
+        if k == 0:
+            return (
+                np.empty((len(queries), 0), dtype=object),
+                np.empty((len(queries), 0), dtype=np.float32),
+            )
+        scores = queries @ self.embeddings.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return np.asarray(self._speakers, dtype=object)[top], top_scores
+
+    def identify(self, queries, threshold=0.8):
+        """Returns the best speaker and score per query, or "Unknown" below `threshold`."""
+        speakers, scores = self.search(queries, k=1)
+        if speakers.shape[1] == 0:
+            return [("Unknown", 0.0) for _ in range(len(speakers))]
+        return [
+            (speaker if score >= threshold else "Unknown", float(score))
+            for speaker, score in zip(speakers[:, 0], scores[:, 0])
+        ]
+
+    def save(self, path):
+        """Writes the index to the directory `path`.
+
+        Both files are written to temporary names and renamed over the old
+        ones, so an index loaded memory-mapped from `path` can be saved back
+        to it: its mapping keeps the old file alive until it is released.
+        """
+        os.makedirs(path, exist_ok=True)
+        embeddings_path = os.path.join(path, EMBEDDINGS_FILENAME)
+        speakers_path = os.path.join(path, SPEAKERS_FILENAME)
+        with open(embeddings_path + ".tmp", "wb") as f:
+            np.save(f, self.embeddings)
+        with open(speakers_path + ".tmp", "w") as f:
+            json.dump({"dim": self.dim, "speakers": self._speakers}, f)
+        os.replace(embeddings_path + ".tmp", embeddings_path)
+        os.replace(speakers_path + ".tmp", speakers_path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Reads an index saved with `save`, memory-mapping the embeddings by default."""
+        with open(os.path.join(path, SPEAKERS_FILENAME)) as f:
+            meta = json.load(f)
+        index = cls(meta["dim"], capacity=0)
+        index._matrix = np.load(
+            os.path.join(path, EMBEDDINGS_FILENAME), mmap_mode="r" if mmap else None
+        )
+        index._speakers = list(meta["speakers"])
+        index._rows = {speaker: row for row, speaker in enumerate(index._speakers)}
+        return index
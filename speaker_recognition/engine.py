@@ -0,0 +1,269 @@
+"""Long-lived speaker verification engine with asyncio micro-batching.
+
+`predict` in the notebook builds a new `tf.data` pipeline for every request,
+adds random training noise to the probe and calls `model.predict` on a
+single sample. `VerificationEngine` loads the model once, traces its forward
+pass once for any batch size, and scores raw PCM or wav paths through the
+same deterministic front-end as training, without noise: the same audio
+always gets the same score.
+
+`MicroBatcher` merges concurrent `authenticate_user` calls into one forward
+pass: the first pending request waits at most `max_wait_ms` for others to
+join its batch, and a batch never exceeds `max_batch_size` requests. While a
+batch is being scored, new requests queue up for the next one, so batches
+grow with the load and the latency stays bounded.
+
+`load_engine` loads a saved model on its first call only, so a serving
+process pays for TensorFlow and the weights once, when the first probe
+arrives.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .audio import fit_length, read_wav
+from .config import SAMPLING_RATE
+from .frontend import numpy_fft
+from .profiling import profiler
+from .quantize import TFLiteSpeakerModel
+from .streaming import to_float_pcm
+
+
+def authentication_message(speaker, confidence, known_speakers):
+    """Returns the message `authenticate_user` prints for a prediction."""
+    if speaker in known_speakers:
+        return f"Authenticated: {speaker} with confidence {confidence:.2f}"
+    return f"Access Denied: Confidence {confidence:.2f}"
+
+
+class VerificationEngine:
+    """Scores 1 second probes with a speaker model loaded once.
+
+    A probe is a wav path, int16 PCM bytes, or an array of int16 or float
+    samples; it is zero-padded or cut to one second, as `load_and_pad_audio`
+    does. `model` is a Keras model or a `TFLiteSpeakerModel`, which runs
+    without importing TensorFlow when `tflite_runtime` is installed.
+    """
+
+    def __init__(
+        self,
+        model,
+        class_names,
+        threshold=0.94,
+        frontend=numpy_fft,
+        sampling_rate=SAMPLING_RATE,
+    ):
+        self.model = model
+        self.class_names = list(class_names)
+        self.threshold = threshold
+        self.frontend = frontend
+        self.sampling_rate = sampling_rate
+
+        if isinstance(model, TFLiteSpeakerModel):
+            self._forward = model
+        else:
+            import tensorflow as tf
+
+            shape = frontend(np.zeros((1, sampling_rate, 1), dtype=np.float32)).shape[1:]
+            # One trace serves every batch size
+            self._forward = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec((None,) + tuple(shape), tf.float32)],
+            )
+        self.predict_batch([np.zeros(sampling_rate, dtype=np.float32)])
+
+    @classmethod
+    def from_saved(cls, model_path, class_names, **kwargs):
+        """Loads a saved Keras model, e.g. `best_model.keras`, or a `.tflite` file."""
+        if str(model_path).endswith(".tflite"):
+            return cls(TFLiteSpeakerModel(str(model_path)), class_names, **kwargs)
+
+        from tensorflow import keras
+
+        return cls(keras.models.load_model(model_path), class_names, **kwargs)
+
+    def load_input(self, source):
+        """Returns a probe as a float32 waveform of exactly one second."""
+        if not isinstance(source, (str, os.PathLike)):
+            return fit_length(to_float_pcm(source), self.sampling_rate)
+        audio, rate = read_wav(source)
+        if rate != self.sampling_rate:
+            raise ValueError(
+                "Sampling rate for {} is {}, expected {}".format(
+                    source, rate, self.sampling_rate
+                )
+            )
+        return fit_length(audio[:, 0], self.sampling_rate)
+
+    def score(self, audio):
+        """Returns the class probabilities of a `(batch, samples)` array of waveforms."""
+        with profiler.stage("verify.frontend", len(audio)):
+            features = self.frontend(audio[..., np.newaxis])
+        with profiler.stage("verify.forward", len(audio)):
+            return np.asarray(self._forward(features))
+
+    def decide(self, probabilities):
+        """Returns the `(speaker, confidence)` of every row of class probabilities.
+
+        Like `predict`, the speaker is "Unknown" when the confidence is below
+        the threshold.
+        """
+        results = []
+        for row in probabilities:
+            best = int(np.argmax(row))
+            confidence = float(row[best])
+            speaker = self.class_names[best] if confidence >= self.threshold else "Unknown"
+            results.append((speaker, confidence))
+        return results
+
+    def predict_batch(self, sources):
+        """Returns the `(speaker, confidence)` of every probe, with one forward pass."""
+        with profiler.stage("verify.decode", len(sources)):
+            audio = np.stack([self.load_input(source) for source in sources])
+        return self.decide(self.score(audio))
+
+    def predict(self, source):
+        return self.predict_batch([source])[0]
+
+    def authenticate_user(self, source, known_speakers):
+        """Synchronous `authenticate_user` for a single probe."""
+        return authentication_message(*self.predict(source), known_speakers)
+
+
+# (model path, class names path, threshold) -> VerificationEngine
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def load_engine(model_path, class_names_path, threshold=0.94):
+    """Returns the `VerificationEngine` of a saved model, loaded on the first call only."""
+    from .enroll import load_class_names
+
+    key = (os.path.abspath(model_path), os.path.abspath(class_names_path), threshold)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = VerificationEngine.from_saved(
+                model_path, load_class_names(class_names_path), threshold=threshold
+            )
+        return _engines[key]
+
+
+class MicroBatcher:
+    """Merges concurrent requests to a `VerificationEngine` into batches.
+
+    Use it from a running event loop, as an async context manager or with
+    `start` and `close`. Decoding and the forward pass run on a worker
+    thread, so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, engine, max_batch_size=32, max_wait_ms=2.0):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = None
+        self._task = None
+        self._executor = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(1)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """Scores the requests already queued, then stops the worker."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._executor.shutdown()
+        self._task = None
+
+    async def predict(self, source):
+        """Returns the `(speaker, confidence)` of one probe, scored with its batch."""
+        if self._task is None:
+            self.start()
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((source, future))
+        try:
+            return await future
+        finally:
+            profiler.record("batcher.request", time.perf_counter() - start)
+
+    async def authenticate_user(self, source, known_speakers):
+        """Same result as the notebook's `authenticate_user`, batched with concurrent calls."""
+        speaker, confidence = await self.predict(source)
+        return authentication_message(speaker, confidence, known_speakers)
+
+    async def _collect(self, first):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        batch = [first]
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            try:
+                if timeout > 0:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _score(self, batch):
+        # A probe that cannot be decoded fails alone, not its whole batch
+        audio = []
+        results = [None] * len(batch)
+        with profiler.stage("verify.decode", len(batch)):
+            for i, (source, _) in enumerate(batch):
+                try:
+                    audio.append((i, self.engine.load_input(source)))
+                except Exception as e:
+                    results[i] = e
+        if not audio:
+            return results
+        try:
+            decisions = self.engine.decide(
+                self.engine.score(np.stack([waveform for _, waveform in audio]))
+            )
+        except Exception as e:
+            decisions = [e] * len(audio)
+        for (i, _), decision in zip(audio, decisions):
+            results[i] = decision
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch, stopping = await self._collect(first)
+            start = time.perf_counter()
+            results = await loop.run_in_executor(self._executor, self._score, batch)
+            profiler.record("batcher.batch", time.perf_counter() - start, len(batch))
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
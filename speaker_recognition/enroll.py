@@ -0,0 +1,308 @@
+"""Incremental speaker enrollment: refit only the classification head.
+
+Adding a speaker used to mean re-running the whole `model.fit` on every
+recording. Here the residual backbone of a trained model (everything up to
+the trailing stack of `Dense` layers) is frozen, and its activations for
+every training recording are cached on disk, so they are computed once per
+recording. Enrolling new speakers then only embeds their recordings and
+refits the `Dense` head on the cached activations, with one more output per
+new speaker.
+
+Labels stay stable: the class names of the trained model are saved in
+`class_names.json`, existing speakers keep their index, and new speaker
+folders are appended after them. Usage:
+
+    python -m speaker_recognition enroll --model model.h5 --class-names class_names.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from .audio import read_pcm16
+from .config import DATASET_AUDIO_PATH, SAMPLING_RATE
+from .dataset import list_audio_paths, split_paths
+from .frontend import numpy_fft
+
+ACTIVATIONS_FILENAME = "activations.npy"
+ACTIVATIONS_INDEX_FILENAME = "activations.json"
+
+
+def save_class_names(path, class_names):
+    """Writes the label order of a model next to it."""
+    with open(path, "w") as f:
+        json.dump(list(class_names), f)
+
+
+def load_class_names(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def split_head(model):
+    """Returns the backbone of `model` and the trailing `Dense` layers on top of it."""
+    from tensorflow import keras
+
+    layers = model.layers
+    start = len(layers)
+    while start > 0 and isinstance(layers[start - 1], keras.layers.Dense):
+        start -= 1
+    head = layers[start:]
+    if not head:
+        raise ValueError("{} does not end with Dense layers".format(model.name))
+    backbone = keras.models.Model(inputs=model.inputs, outputs=head[0].input, name="backbone")
+    return backbone, head
+
+
+def backbone_fingerprint(backbone):
+    """Returns a hash of the backbone weights, which identifies cached activations."""
+    digest = hashlib.sha1()
+    for weight in backbone.get_weights():
+        digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()
+
+
+def load_features(audio_paths, sampling_rate=SAMPLING_RATE):
+    """Decodes wav files and returns their FFT, like the validation pipeline."""
+    audio = np.stack([read_pcm16(path, sampling_rate) for path in audio_paths])
+    return numpy_fft(audio[..., np.newaxis].astype(np.float32) / 32768)
+
+
+class ActivationCache:
+    """Backbone activations of every recording, stored as float16 in one array.
+
+    The cache is tied to the backbone weights: activations computed by a
+    different backbone are discarded. Recordings whose mtime changed are
+    recomputed, and removed ones are dropped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _load_index(self):
+        index_path = os.path.join(self.path, ACTIVATIONS_INDEX_FILENAME)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            return json.load(f)
+
+    def update(self, backbone, audio_paths, batch_size=128, verbose=True):
+        """Returns the activations of `audio_paths`, in order, computing missing ones."""
+        fingerprint = backbone_fingerprint(backbone)
+        mtimes = [os.stat(path).st_mtime_ns for path in audio_paths]
+        index = self._load_index()
+        rows = {}
+        if index is not None and index["backbone"] == fingerprint:
+            rows = {
+                (path, mtime): row
+                for row, (path, mtime) in enumerate(zip(index["paths"], index["mtimes"]))
+            }
+            cached = np.load(os.path.join(self.path, ACTIVATIONS_FILENAME), mmap_mode="r")
+
+        dim = int(np.prod(backbone.output_shape[1:]))
+        activations = np.empty((len(audio_paths), dim), dtype=np.float16)
+        missing = []
+        for i, key in enumerate(zip(audio_paths, mtimes)):
+            if key in rows:
+                activations[i] = cached[rows[key]]
+            else:
+                missing.append(i)
+        if verbose:
+            print(
+                "{} cached activations, {} to compute".format(
+                    len(audio_paths) - len(missing), len(missing)
+                )
+            )
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            features = load_features([audio_paths[i] for i in batch])
+            output = np.asarray(backbone(features, training=False))
+            activations[batch] = output.reshape(len(batch), -1)
+
+        if missing or index is None or len(rows) != len(audio_paths):
+            os.makedirs(self.path, exist_ok=True)
+            array_path = os.path.join(self.path, ACTIVATIONS_FILENAME)
+            # np.save adds the extension, so the temporary name must end in it too
+            tmp = array_path[: -len(".npy")] + ".tmp.npy"
+            np.save(tmp, activations)
+            os.replace(tmp, array_path)
+            index_path = os.path.join(self.path, ACTIVATIONS_INDEX_FILENAME)
+            with open(index_path + ".tmp", "w") as f:
+                json.dump(
+                    {"backbone": fingerprint, "paths": list(audio_paths), "mtimes": mtimes}, f
+                )
+            os.replace(index_path + ".tmp", index_path)
+        return activations
+
+
+def build_head(input_dim, head, num_classes):
+    """Returns a copy of the `Dense` head with room for `num_classes` outputs.
+
+    Hidden layers keep their weights. The output layer keeps the weights of
+    the existing classes, and the new classes start from the mean of them.
+    """
+    from tensorflow import keras
+
+    inputs = keras.layers.Input(shape=(input_dim,), name="activations")
+    x = inputs
+    for layer in head[:-1]:
+        config = layer.get_config()
+        new_layer = keras.layers.Dense.from_config(config)
+        x = new_layer(x)
+        new_layer.set_weights(layer.get_weights())
+
+    output = head[-1]
+    config = output.get_config()
+    config["units"] = num_classes
+    new_output = keras.layers.Dense.from_config(config)
+    outputs = new_output(x)
+    kernel, bias = output.get_weights()
+    old_classes = kernel.shape[1]
+    new_kernel = np.concatenate(
+        [kernel, np.repeat(kernel.mean(axis=1, keepdims=True), num_classes - old_classes, 1)],
+        axis=1,
+    )
+    new_bias = np.concatenate([bias, np.full(num_classes - old_classes, bias.mean())])
+    new_output.set_weights([new_kernel, new_bias])
+    return keras.models.Model(inputs=inputs, outputs=outputs, name="head")
+
+
+def attach_head(backbone, head_model):
+    """Returns the full model: `backbone` followed by the layers of `head_model`."""
+    from tensorflow import keras
+
+    x = backbone.outputs[0]
+    for layer in head_model.layers[1:]:
+        x = layer(x)
+    return keras.models.Model(inputs=backbone.inputs, outputs=x)
+
+
+def enroll_speakers(
+    model,
+    class_names,
+    dataset_audio_path=DATASET_AUDIO_PATH,
+    cache_dir="activation_cache",
+    epochs=20,
+    batch_size=256,
+    learning_rate=1e-3,
+    output_only=False,
+    verbose=True,
+):
+    """Adds the speaker folders of `dataset_audio_path` missing from `class_names`.
+
+    The head is refit on the training side of `split_paths` only, and its
+    accuracy is reported on the held-out side, overall and for the new
+    speakers; that side is also the one `evaluation` calibrates on.
+
+    Returns the new model and its class names; when there is no new speaker,
+    `model` and `class_names` are returned unchanged. With `output_only`,
+    only the softmax layer is refit and the hidden `Dense` layers are frozen
+    too.
+    """
+    from tensorflow import keras
+
+    class_names, audio_paths, labels = list_audio_paths(dataset_audio_path, class_names)
+    new_speakers = class_names[model.output_shape[-1] :]
+    if not new_speakers:
+        return model, class_names
+    if verbose:
+        print("Enrolling {}".format(new_speakers))
+
+    start = time.perf_counter()
+    (train_paths, train_labels), (valid_paths, valid_labels) = split_paths(audio_paths, labels)
+    backbone, head = split_head(model)
+    # One cache for both sides, so it stays valid whatever the split
+    activations = ActivationCache(cache_dir).update(
+        backbone, train_paths + valid_paths, verbose=verbose
+    )
+    train_activations = activations[: len(train_paths)].astype(np.float32)
+    valid_activations = activations[len(train_paths) :].astype(np.float32)
+    head_model = build_head(activations.shape[1], head, len(class_names))
+    if output_only:
+        for layer in head_model.layers[1:-1]:
+            layer.trainable = False
+
+    # New speakers usually have far fewer recordings, so classes are balanced
+    train_labels = np.array(train_labels)
+    counts = np.bincount(train_labels, minlength=len(class_names))
+    class_weight = {
+        c: len(train_labels) / (len(class_names) * count)
+        for c, count in enumerate(counts)
+        if count
+    }
+    head_model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate),
+        loss="sparse_categorical_crossentropy",
+        metrics=["accuracy"],
+    )
+    head_model.fit(
+        train_activations,
+        train_labels,
+        batch_size=batch_size,
+        epochs=epochs,
+        shuffle=True,
+        class_weight=class_weight,
+        verbose=0,
+    )
+    if verbose:
+        valid_labels = np.array(valid_labels)
+        predictions = np.argmax(head_model.predict(valid_activations, verbose=0), axis=1)
+        correct = predictions == valid_labels
+        is_new = valid_labels >= model.output_shape[-1]
+        print(
+            "Head refit in {:.1f} s, held-out accuracy {:.4f} ({} recordings), "
+            "new speakers {} ({} recordings)".format(
+                time.perf_counter() - start,
+                correct.mean() if len(correct) else float("nan"),
+                len(correct),
+                "{:.4f}".format(correct[is_new].mean()) if is_new.any() else "n/a",
+                int(is_new.sum()),
+            )
+        )
+    return attach_head(backbone, head_model), class_names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll new speakers into a trained model.")
+    parser.add_argument("--model", default="model.h5")
+    parser.add_argument("--class-names", default="class_names.json")
+    parser.add_argument("--dataset-audio-path", default=DATASET_AUDIO_PATH)
+    parser.add_argument("--cache-dir", default="activation_cache")
+    parser.add_argument("--output", default=None, help="defaults to overwriting --model")
+    parser.add_argument(
+        "--class-names-output",
+        default=None,
+        help="defaults to --class-names without --output, and to OUTPUT_STEM.class_names.json "
+        "next to --output otherwise, so that the original model keeps its class names",
+    )
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--output-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    from tensorflow import keras
+
+    model, class_names = enroll_speakers(
+        keras.models.load_model(args.model),
+        load_class_names(args.class_names),
+        args.dataset_audio_path,
+        args.cache_dir,
+        epochs=args.epochs,
+        output_only=args.output_only,
+    )
+    if args.class_names_output is not None:
+        class_names_path = args.class_names_output
+    elif args.output is not None:
+        class_names_path = os.path.splitext(args.output)[0] + ".class_names.json"
+    else:
+        class_names_path = args.class_names
+    model.save(args.output or args.model)
+    save_class_names(class_names_path, class_names)
+    print("Wrote {} and {}".format(args.output or args.model, class_names_path))
+
+
+if __name__ == "__main__":
+    main()
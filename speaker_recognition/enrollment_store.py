@@ -0,0 +1,119 @@
+"""Persistent SQLite store of enrolled reference embeddings.
+
+Every reference recording of a user is stored once as a reduced,
+L2-normalized float32 embedding, keyed by the user and the SHA-256 of the
+audio file content. Enrolling the same file again is a no-op, and a probe is
+scored against every stored reference with one matrix product.
+"""
+
+import hashlib
+import sqlite3
+
+import numpy as np
+
+from .embedding_index import l2_normalize
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_hash(path):
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EnrollmentStore:
+    """Reference embeddings of enrolled users, persisted in a SQLite database."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS enrollments ("
+            " user TEXT NOT NULL,"
+            " audio_hash TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " PRIMARY KEY (user, audio_hash))"
+        )
+        self._db.commit()
+        self._cache = None
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM enrollments").fetchone()[0]
+
+    def __contains__(self, key):
+        """`(user, audio_hash) in store` tells whether that recording is enrolled."""
+        user, audio_hash = key
+        row = self._db.execute(
+            "SELECT 1 FROM enrollments WHERE user = ? AND audio_hash = ?",
+            (user, audio_hash),
+        ).fetchone()
+        return row is not None
+
+    def users(self):
+        return [
+            row[0]
+            for row in self._db.execute("SELECT DISTINCT user FROM enrollments ORDER BY user")
+        ]
+
+    def add(self, user, audio_hash, embedding):
+        """Stores the normalized `embedding` of one reference recording of `user`."""
+        embedding = l2_normalize(np.reshape(embedding, -1))
+        self._db.execute(
+            "INSERT OR REPLACE INTO enrollments VALUES (?, ?, ?, ?)",
+            (user, audio_hash, len(embedding), embedding.tobytes()),
+        )
+        self._db.commit()
+        self._cache = None
+
+    def remove(self, user):
+        """Removes every reference of `user`."""
+        self._db.execute("DELETE FROM enrollments WHERE user = ?", (user,))
+        self._db.commit()
+        self._cache = None
+
+    def references(self):
+        """Returns the user of every stored reference and their embeddings as one matrix.
+
+        The matrix is read from the database once and kept until the store changes.
+        """
+        if self._cache is None:
+            rows = self._db.execute(
+                "SELECT user, dim, embedding FROM enrollments ORDER BY user, audio_hash"
+            ).fetchall()
+            users = np.array([user for user, _, _ in rows], dtype=object)
+            if rows:
+                matrix = np.stack(
+                    [np.frombuffer(blob, dtype=np.float32, count=dim) for _, dim, blob in rows]
+                )
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            self._cache = users, matrix
+        return self._cache
+
+    def score(self, probes):
+        """Returns the cosine score of each probe embedding against every reference.
+
+        The result has shape `(num_probes, num_references)`, with columns in the
+        order of `references()`.
+        """
+        users, matrix = self.references()
+        probes = np.atleast_2d(probes)
+        if not len(users):
+            return np.zeros((len(probes), 0), dtype=np.float32)
+        return l2_normalize(np.reshape(probes, (-1, matrix.shape[1]))) @ matrix.T
+
+    def score_user(self, user, probe):
+        """Returns the best cosine score of one probe embedding against `user`'s references."""
+        users, _ = self.references()
+        mask = users == user
+        if not mask.any():
+            raise KeyError("{} is not enrolled".format(user))
+        return float(self.score(probe)[0, mask].max())
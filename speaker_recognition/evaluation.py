@@ -0,0 +1,292 @@
+"""Verification error rates from score matrices, and threshold calibration.
+
+The acceptance thresholds used so far (0.94 for the speaker model, 0.85 for
+ECAPA, 0.45 for fingerprints) were picked by hand. Here every probe of a
+labelled set is scored against every reference in batches, in the order of
+the probes, into one `(probes, references)` score matrix. Its genuine and
+impostor trials give the false acceptance and false rejection rates at
+every threshold at once: both sets of scores are sorted once and every
+threshold is located with a binary search, so millions of trials take
+seconds. A trial is accepted when its score is at least the threshold.
+
+Calibrated thresholds are written to a JSON file, one entry per modality,
+that `load_threshold` reads back. A target FAR that the trials cannot
+resolve, because there are fewer than `1 / target_far` impostor trials or
+only the +inf threshold gets below it, is stored with a `null` threshold
+and `load_threshold` refuses it. Usage:
+
+    python -m speaker_recognition evaluate --model model.h5 --class-names class_names.json
+"""
+
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from .audio import fit_length, load_mono
+from .config import DATASET_AUDIO_PATH, SAMPLING_RATE
+from .dataset import list_audio_paths, split_paths
+from .embedding_index import l2_normalize
+
+TARGET_FARS = (0.01, 0.001)
+
+# Thresholds in increasing order, with the false acceptance and false
+# rejection rate at each of them. The last threshold is +inf, which rejects
+# every trial.
+DetCurve = namedtuple("DetCurve", ["thresholds", "far", "frr"])
+
+
+def trial_scores(scores, probe_labels, reference_labels=None, same_set=False):
+    """Splits a `(probes, references)` score matrix into genuine and impostor scores.
+
+    Without `reference_labels`, column `j` is the class `j`, as for the
+    class probabilities of the speaker model. With `same_set`, probes and
+    references are the same recordings: only the trials above the diagonal
+    are kept, so that no recording is compared with itself and every pair
+    counts once.
+    """
+    scores = np.asarray(scores)
+    probe_labels = np.asarray(probe_labels)
+    if reference_labels is None:
+        reference_labels = np.arange(scores.shape[1])
+    reference_labels = np.asarray(reference_labels)
+    if same_set:
+        rows, columns = np.triu_indices(len(probe_labels), 1)
+        scores = scores[rows, columns]
+        genuine = probe_labels[rows] == reference_labels[columns]
+    else:
+        genuine = probe_labels[:, np.newaxis] == reference_labels[np.newaxis, :]
+    return scores[genuine], scores[~genuine]
+
+
+def error_rates(genuine, impostor, thresholds):
+    """Returns the false acceptance and false rejection rates at each threshold."""
+    genuine = np.sort(np.ravel(genuine))
+    impostor = np.sort(np.ravel(impostor))
+    thresholds = np.asarray(thresholds)
+    frr = np.searchsorted(genuine, thresholds, side="left") / len(genuine)
+    far = 1 - np.searchsorted(impostor, thresholds, side="left") / len(impostor)
+    return far, frr
+
+
+def det_curve(genuine, impostor):
+    """Returns the `DetCurve` of every distinct trial score."""
+    if not len(genuine) or not len(impostor):
+        raise ValueError("Both genuine and impostor trials are needed")
+    scores = np.concatenate([np.ravel(genuine), np.ravel(impostor)])
+    thresholds = np.append(np.unique(scores), np.inf)
+    far, frr = error_rates(genuine, impostor, thresholds)
+    return DetCurve(thresholds, far, frr)
+
+
+def equal_error_rate(curve):
+    """Returns the rate at which FAR and FRR cross, and the threshold there.
+
+    The rate is interpolated between the two thresholds around the crossing;
+    the threshold is the lowest one whose FAR is no more than its FRR.
+    """
+    # FAR decreases and FRR increases with the threshold. The lowest
+    # threshold accepts every trial and the +inf one rejects every trial, so
+    # the crossing is after the first threshold and at the latest on the last
+    k = int(np.argmax(curve.far <= curve.frr))
+    before = curve.far[k - 1] - curve.frr[k - 1]
+    after = curve.far[k] - curve.frr[k]
+    alpha = before / (before - after)
+    eer = curve.frr[k - 1] + alpha * (curve.frr[k] - curve.frr[k - 1])
+    threshold = curve.thresholds[k]
+    if not np.isfinite(threshold):
+        threshold = curve.thresholds[k - 1]
+    return float(eer), float(threshold)
+
+
+def threshold_at_far(curve, target_far):
+    """Returns the lowest threshold whose FAR is at most `target_far`, and its FRR.
+
+    Raises a `ValueError` when only the +inf threshold, which rejects every
+    trial, gets the FAR that low, i.e. when the highest score is an impostor's.
+    """
+    k = int(np.argmax(curve.far <= target_far))
+    if not np.isfinite(curve.thresholds[k]):
+        raise ValueError(
+            "No finite threshold reaches a FAR of {}; the lowest is {}".format(
+                target_far, curve.far[-2]
+            )
+        )
+    return float(curve.thresholds[k]), float(curve.frr[k])
+
+
+def threshold_at_frr(curve, target_frr):
+    """Returns the highest threshold whose FRR is at most `target_frr`, and its FAR."""
+    k = int(np.searchsorted(curve.frr, target_frr, side="right")) - 1
+    return float(curve.thresholds[k]), float(curve.far[k])
+
+
+def roc_auc(curve):
+    """Returns the area under the ROC curve, the true acceptance rate against FAR."""
+    far = np.concatenate([[1.0], curve.far])
+    tar = 1 - np.concatenate([[0.0], curve.frr])
+    return float(np.sum((far[:-1] - far[1:]) * (tar[:-1] + tar[1:]) / 2))
+
+
+def calibrate(genuine, impostor, target_fars=TARGET_FARS):
+    """Returns the EER, its threshold and the thresholds at `target_fars`, as a dict."""
+    curve = det_curve(genuine, impostor)
+    eer, eer_threshold = equal_error_rate(curve)
+    operating_points = {}
+    for target_far in target_fars:
+        # Fewer than 1 / target_far impostor trials cannot measure the rate
+        threshold = frr = None
+        if len(impostor) * target_far >= 1:
+            try:
+                threshold, frr = threshold_at_far(curve, target_far)
+            except ValueError:
+                pass
+        operating_points[str(target_far)] = {"threshold": threshold, "frr": frr}
+    return {
+        "eer": eer,
+        "eer_threshold": eer_threshold,
+        "auc": roc_auc(curve),
+        "far": operating_points,
+        "genuine_trials": int(len(genuine)),
+        "impostor_trials": int(len(impostor)),
+    }
+
+
+def save_thresholds(path, modality, calibration):
+    """Writes the calibration of `modality` to the JSON file `path`, keeping the others."""
+    thresholds = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            thresholds = json.load(f)
+    thresholds[modality] = calibration
+    with open(path + ".tmp", "w") as f:
+        json.dump(thresholds, f, indent=2, allow_nan=False)
+    os.replace(path + ".tmp", path)
+
+
+def load_threshold(path, modality, target_far=None):
+    """Returns the calibrated EER threshold of `modality`, or the one at `target_far`."""
+    with open(path) as f:
+        calibration = json.load(f)[modality]
+    if target_far is None:
+        return calibration["eer_threshold"]
+    threshold = calibration["far"][str(target_far)]["threshold"]
+    if threshold is None:
+        raise ValueError(
+            "FAR {} of {} is unreachable with {} impostor trials; calibrate on more".format(
+                target_far, modality, calibration["impostor_trials"]
+            )
+        )
+    return threshold
+
+
+def plot_det(curve, ax=None, label=None):
+    """Plots a DET curve, FRR against FAR on normal deviate scales."""
+    import matplotlib.pyplot as plt
+    from scipy.stats import norm
+
+    if ax is None:
+        ax = plt.gca()
+    eps = 1e-6
+    ax.plot(
+        norm.ppf(np.clip(curve.far, eps, 1 - eps)),
+        norm.ppf(np.clip(curve.frr, eps, 1 - eps)),
+        label=label,
+    )
+    ticks = np.array([0.001, 0.01, 0.05, 0.2, 0.5])
+    ax.set_xticks(norm.ppf(ticks))
+    ax.set_xticklabels(["{:g}%".format(100 * t) for t in ticks])
+    ax.set_yticks(norm.ppf(ticks))
+    ax.set_yticklabels(["{:g}%".format(100 * t) for t in ticks])
+    ax.set_xlabel("False acceptance rate")
+    ax.set_ylabel("False rejection rate")
+    return ax
+
+
+def score_audio_paths(engine, audio_paths, batch_size=256):
+    """Returns the class probabilities of every recording, in order, from a `VerificationEngine`."""
+    scores = []
+    for start in range(0, len(audio_paths), batch_size):
+        batch = audio_paths[start : start + batch_size]
+        scores.append(engine.score(np.stack([engine.load_input(path) for path in batch])))
+    return np.concatenate(scores)
+
+
+def ecapa_embeddings(encoder, audio_paths, batch_size=64, sampling_rate=SAMPLING_RATE):
+    """Returns the L2-normalized ECAPA embedding of every recording, in order.
+
+    Recordings are cut or padded to one second, so that a batch is one
+    `encode_batch` call.
+    """
+    import torch
+
+    embeddings = []
+    for start in range(0, len(audio_paths), batch_size):
+        signals = np.stack(
+            [
+                fit_length(load_mono(path, sampling_rate), sampling_rate)
+                for path in audio_paths[start : start + batch_size]
+            ]
+        )
+        output = encoder.model.encode_batch(torch.from_numpy(signals))
+        embeddings.append(np.asarray(output.detach().cpu()).reshape(len(signals), -1))
+    return l2_normalize(np.concatenate(embeddings))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate verification thresholds.")
+    parser.add_argument("--modality", choices=["speaker_model", "ecapa"], default="speaker_model")
+    parser.add_argument("--model", default="model.h5")
+    parser.add_argument("--class-names", default="class_names.json")
+    parser.add_argument("--dataset-audio-path", default=DATASET_AUDIO_PATH)
+    parser.add_argument("--output", default="thresholds.json")
+    parser.add_argument("--target-far", type=float, nargs="+", default=list(TARGET_FARS))
+    args = parser.parse_args(argv)
+
+    from .enroll import load_class_names
+
+    class_names, audio_paths, labels = list_audio_paths(
+        args.dataset_audio_path, load_class_names(args.class_names)
+    )
+    # The validation split of training, so that the model has not seen it
+    _, (audio_paths, labels) = split_paths(audio_paths, labels)
+
+    if args.modality == "speaker_model":
+        from .engine import VerificationEngine
+
+        engine = VerificationEngine.from_saved(args.model, class_names)
+        scores = score_audio_paths(engine, audio_paths)
+        genuine, impostor = trial_scores(scores, labels)
+        accuracy = np.mean(np.argmax(scores, axis=1) == np.array(labels))
+        print("Accuracy {:.4f}".format(accuracy))
+    else:
+        from .ecapa import EcapaEncoder
+
+        embeddings = ecapa_embeddings(EcapaEncoder(), audio_paths)
+        genuine, impostor = trial_scores(embeddings @ embeddings.T, labels, labels, same_set=True)
+
+    calibration = calibrate(genuine, impostor, args.target_far)
+    print(
+        "{} genuine and {} impostor trials: EER {:.4f} at threshold {:.4f}".format(
+            calibration["genuine_trials"],
+            calibration["impostor_trials"],
+            calibration["eer"],
+            calibration["eer_threshold"],
+        )
+    )
+    for target_far, point in calibration["far"].items():
+        if point["threshold"] is None:
+            print("FAR {}: unreachable with these trials".format(target_far))
+            continue
+        print(
+            "FAR {}: threshold {:.4f}, FRR {:.4f}".format(
+                target_far, point["threshold"], point["frr"]
+            )
+        )
+    save_thresholds(args.output, args.modality, calibration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Sharded, memory-mapped cache of decoded speech samples and their FFT.
+
+Every clean sample is decoded and transformed once. Each shard holds up to
+`shard_size` samples as two `.npy` files that are opened with `mmap_mode="r"`:
+
+    shard-00000.audio.npy   int16   (rows, SAMPLING_RATE)
+    shard-00000.fft.npy     float32 (rows, SAMPLING_RATE // 2)
+
+`index.json` maps every wav path to its mtime and its (shard, row), so that
+`FeatureStore.refresh` only decodes the files that were added or modified
+since the last run and forgets the ones that were removed.
+
+A modified file is decoded again into the row it already has, so editing
+files never grows the store. The rows of removed files stay in their shard
+until at most half of the shard's rows are live; the live rows are then
+copied into new shards, without decoding them again, and the old shard is
+deleted. TensorFlow is
+only imported by `to_dataset`, so filling the store does not load it.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .audio import read_pcm16
+from .config import BATCH_SIZE, SAMPLING_RATE, SHUFFLE_SEED
+from .frontend import numpy_fft
+
+INDEX_FILENAME = "index.json"
+
+# Number of samples to transform at once when filling a shard
+FFT_CHUNK_SIZE = 256
+
+
+class FeatureStore:
+    """On-disk store of clean waveforms and FFT spectra keyed by path and mtime."""
+
+    def __init__(self, root, shard_size=1024, sampling_rate=SAMPLING_RATE):
+        self.root = root
+        self.shard_size = shard_size
+        self.sampling_rate = sampling_rate
+        self._mmaps = {}
+        os.makedirs(root, exist_ok=True)
+        self.index = self._load_index()
+
+    def __len__(self):
+        return len(self.index["entries"])
+
+    def __contains__(self, path):
+        return path in self.index["entries"]
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_FILENAME)
+
+    def _shard_path(self, shard, kind):
+        return os.path.join(self.root, "{}.{}.npy".format(shard, kind))
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path()):
+            return {
+                "sampling_rate": self.sampling_rate,
+                "next_shard": 0,
+                "shards": {},
+                "entries": {},
+            }
+        with open(self._index_path()) as f:
+            index = json.load(f)
+        if index["sampling_rate"] != self.sampling_rate:
+            raise ValueError(
+                "Feature store at {} was built for {} Hz, not {} Hz".format(
+                    self.root, index["sampling_rate"], self.sampling_rate
+                )
+            )
+        return index
+
+    def _save_index(self):
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self._index_path())
+
+    def refresh(self, audio_paths, prune=True):
+        """Brings the store in sync with `audio_paths`.
+
+        Files that are not in the store yet are decoded and appended to new
+        shards, and files whose mtime changed are decoded again into their own
+        row. With `prune`, entries for paths that are no longer listed are
+        dropped, and shards left with at most half of their rows live are
+        compacted.
+
+        Returns the number of samples (re)computed and the number removed.
+        """
+        entries = self.index["entries"]
+        added, modified = {}, {}
+        for path in audio_paths:
+            mtime = os.stat(path).st_mtime_ns
+            entry = entries.get(path)
+            if entry is None:
+                added[path] = mtime
+            elif entry[0] != mtime:
+                modified[path] = mtime
+
+        removed = 0
+        if prune:
+            listed = set(audio_paths)
+            for path in [path for path in entries if path not in listed]:
+                del entries[path]
+                removed += 1
+
+        self._rewrite_rows(list(modified.items()))
+        added = list(added.items())
+        for start in range(0, len(added), self.shard_size):
+            self._write_shard(added[start : start + self.shard_size])
+        self._compact_sparse_shards()
+        # The index stops pointing at dead shards before they are deleted
+        self._save_index()
+        self._drop_dead_shards()
+        self._save_index()
+        return len(added) + len(modified), removed
+
+    def _rewrite_rows(self, paths_and_mtimes):
+        """Decodes modified files again into the rows they already have."""
+        entries = self.index["entries"]
+        by_shard = {}
+        for path, mtime in paths_and_mtimes:
+            by_shard.setdefault(entries[path][1], []).append((path, mtime))
+        for shard, items in by_shard.items():
+            # A second, writable mapping; the cached read-only one sees its writes
+            audio = np.load(self._shard_path(shard, "audio"), mmap_mode="r+")
+            fft = np.load(self._shard_path(shard, "fft"), mmap_mode="r+")
+            for start in range(0, len(items), FFT_CHUNK_SIZE):
+                chunk = items[start : start + FFT_CHUNK_SIZE]
+                rows = [entries[path][2] for path, _ in chunk]
+                decoded = np.stack([read_pcm16(path, self.sampling_rate) for path, _ in chunk])
+                audio[rows] = decoded
+                fft[rows] = numpy_fft(decoded.astype(np.float32) / 32768)
+            audio.flush()
+            fft.flush()
+            del audio, fft
+            # The index keeps the old mtime until it is saved, so a rewrite
+            # cut short is redone by the next refresh
+            for path, mtime in items:
+                entries[path][0] = mtime
+
+    def _compact_sparse_shards(self):
+        """Copies the live rows of shards that are at most half live into new shards."""
+        live = {}
+        for path, (mtime, shard, row) in self.index["entries"].items():
+            live.setdefault(shard, []).append((shard, row, path, mtime))
+        moved = []
+        for shard, rows in self.index["shards"].items():
+            if shard in live and 2 * len(live[shard]) <= rows:
+                moved += sorted(live[shard])
+        locations = {path: (shard, row) for shard, row, path, _ in moved}
+
+        def read_stored(path):
+            shard, row = locations[path]
+            return self._array(shard, "audio")[row]
+
+        moved = [(path, mtime) for _, _, path, mtime in moved]
+        for start in range(0, len(moved), self.shard_size):
+            self._write_shard(moved[start : start + self.shard_size], read_stored)
+
+    def _write_shard(self, paths_and_mtimes, read=None):
+        """Writes a new shard of `paths_and_mtimes`, decoded from disk or by `read(path)`."""
+        if read is None:
+
+            def read(path):
+                return read_pcm16(path, self.sampling_rate)
+
+        shard = "shard-{:05d}".format(self.index["next_shard"])
+        rows = len(paths_and_mtimes)
+
+        audio_tmp = self._shard_path(shard, "audio") + ".tmp"
+        fft_tmp = self._shard_path(shard, "fft") + ".tmp"
+        audio = np.lib.format.open_memmap(
+            audio_tmp, mode="w+", dtype=np.int16, shape=(rows, self.sampling_rate)
+        )
+        fft = np.lib.format.open_memmap(
+            fft_tmp, mode="w+", dtype=np.float32, shape=(rows, self.sampling_rate // 2)
+        )
+        for row, (path, _) in enumerate(paths_and_mtimes):
+            audio[row] = read(path)
+        for start in range(0, rows, FFT_CHUNK_SIZE):
+            chunk = audio[start : start + FFT_CHUNK_SIZE].astype(np.float32) / 32768
+            fft[start : start + FFT_CHUNK_SIZE] = numpy_fft(chunk)
+        audio.flush()
+        fft.flush()
+        del audio, fft
+        os.replace(audio_tmp, self._shard_path(shard, "audio"))
+        os.replace(fft_tmp, self._shard_path(shard, "fft"))
+
+        self.index["next_shard"] += 1
+        self.index["shards"][shard] = rows
+        for row, (path, mtime) in enumerate(paths_and_mtimes):
+            self.index["entries"][path] = [mtime, shard, row]
+
+    def _drop_dead_shards(self):
+        live = {shard for _, shard, _ in self.index["entries"].values()}
+        for shard in [shard for shard in self.index["shards"] if shard not in live]:
+            del self.index["shards"][shard]
+            for kind in ("audio", "fft"):
+                self._mmaps.pop((shard, kind), None)
+                if os.path.exists(self._shard_path(shard, kind)):
+                    os.remove(self._shard_path(shard, kind))
+
+    def _array(self, shard, kind):
+        if (shard, kind) not in self._mmaps:
+            self._mmaps[(shard, kind)] = np.load(
+                self._shard_path(shard, kind), mmap_mode="r"
+            )
+        return self._mmaps[(shard, kind)]
+
+    def blocks(self, audio_paths, block_size=BATCH_SIZE):
+        """Splits `audio_paths` into runs stored in consecutive rows of one shard.
+
+        Returns a list of `(start, shard, row, length)` tuples, where `start` is
+        the position of the run in `audio_paths`. Runs are at most `block_size`
+        long. A store filled in the order of `audio_paths` gives only full runs.
+        """
+        entries = self.index["entries"]
+        blocks = []
+        for start, path in enumerate(audio_paths):
+            if path not in entries:
+                raise KeyError(
+                    "{} is not in the feature store, call refresh() first".format(path)
+                )
+            _, shard, row = entries[path]
+            if blocks:
+                last_start, last_shard, last_row, length = blocks[-1]
+                if (
+                    last_shard == shard
+                    and last_row + length == row
+                    and length < block_size
+                ):
+                    blocks[-1] = (last_start, shard, last_row, length + 1)
+                    continue
+            blocks.append((start, shard, row, 1))
+        return blocks
+
+    def load(self, audio_paths, kind="fft"):
+        """Returns the stored `kind` rows of `audio_paths` as one array."""
+        return np.concatenate(
+            [
+                self._array(shard, kind)[row : row + length]
+                for _, shard, row, length in self.blocks(audio_paths)
+            ]
+        )
+
+    def to_dataset(
+        self,
+        audio_paths,
+        labels,
+        kind="fft",
+        block_size=BATCH_SIZE,
+        shuffle=False,
+        seed=SHUFFLE_SEED,
+    ):
+        """Constructs an unbatched dataset of samples and labels read from the shards.
+
+        With `kind="audio"` the samples are the clean waveforms, shaped like the
+        output of `path_to_audio`, so noise can still be added before the FFT.
+        With `kind="fft"` they are the clean spectra, shaped like the output of
+        `audio_to_fft`, and can be fed to the model as they are.
+
+        Rows are read as zero-copy slices of the memory-mapped shards, one block
+        at a time. With `shuffle`, the order of the blocks changes every epoch;
+        add a `shuffle` after it to also mix samples across blocks.
+        """
+        import tensorflow as tf
+
+        labels = np.asarray(labels, dtype=np.int32)
+        blocks = self.blocks(audio_paths, block_size)
+        rng = np.random.RandomState(seed)
+
+        def generator():
+            order = np.arange(len(blocks))
+            if shuffle:
+                rng.shuffle(order)
+            for i in order:
+                start, shard, row, length = blocks[i]
+                yield (
+                    self._array(shard, kind)[row : row + length],
+                    labels[start : start + length],
+                )
+
+        if kind == "audio":
+            signature = tf.TensorSpec((None, self.sampling_rate), tf.int16)
+        elif kind == "fft":
+            signature = tf.TensorSpec((None, self.sampling_rate // 2), tf.float32)
+        else:
+            raise ValueError("Unknown feature kind: {}".format(kind))
+
+        ds = tf.data.Dataset.from_generator(
+            generator, output_signature=(signature, tf.TensorSpec((None,), tf.int32))
+        )
+        if kind == "audio":
+            ds = ds.map(lambda x, y: (tf.cast(x, tf.float32) / 32768, y))
+        ds = ds.map(lambda x, y: (tf.expand_dims(x, axis=-1), y))
+        return ds.unbatch()
@@ -0,0 +1,188 @@
+"""Selectable spectral front-ends, in TensorFlow and in pure NumPy.
+
+Every front-end takes a batch of waveforms shaped `(batch, samples, 1)`, as
+returned by `path_to_audio` once batched, and returns features shaped
+`(batch, steps, channels)`, which is what `build_model` expects:
+
+    "fft":     magnitude of the positive frequencies, (batch, samples // 2, 1)
+    "log_mel": framed log-mel spectrogram, (batch, frames, num_mel_bins)
+    "mfcc":    MFCCs of the log-mel spectrogram, (batch, frames, num_mfccs)
+
+The NumPy implementations give the same output as the TensorFlow ones, up to
+float32 rounding, so inference can run without building a TF graph.
+"""
+
+import functools
+
+import numpy as np
+
+from .config import SAMPLING_RATE
+
+# 25 ms frames every 10 ms
+FRAME_LENGTH = 400
+FRAME_STEP = 160
+FFT_LENGTH = 512
+
+NUM_MEL_BINS = 64
+LOWER_EDGE_HERTZ = 80.0
+UPPER_EDGE_HERTZ = 7600.0
+NUM_MFCCS = 20
+
+# Added to the mel energies before taking the log
+LOG_OFFSET = 1e-6
+
+
+def audio_to_log_mel(
+    audio,
+    sampling_rate=SAMPLING_RATE,
+    frame_length=FRAME_LENGTH,
+    frame_step=FRAME_STEP,
+    fft_length=FFT_LENGTH,
+    num_mel_bins=NUM_MEL_BINS,
+    lower_edge_hertz=LOWER_EDGE_HERTZ,
+    upper_edge_hertz=UPPER_EDGE_HERTZ,
+):
+    """Returns the log-mel spectrogram of a batch of waveforms."""
+    import tensorflow as tf
+
+    audio = tf.squeeze(audio, axis=-1)
+    stft = tf.signal.stft(audio, frame_length, frame_step, fft_length)
+    weights = tf.signal.linear_to_mel_weight_matrix(
+        num_mel_bins,
+        fft_length // 2 + 1,
+        sampling_rate,
+        lower_edge_hertz,
+        upper_edge_hertz,
+    )
+    mel = tf.tensordot(tf.math.abs(stft), weights, 1)
+    return tf.math.log(mel + LOG_OFFSET)
+
+
+def audio_to_mfcc(audio, num_mfccs=NUM_MFCCS, **kwargs):
+    """Returns the first `num_mfccs` MFCCs of a batch of waveforms."""
+    import tensorflow as tf
+
+    log_mel = audio_to_log_mel(audio, **kwargs)
+    return tf.signal.mfccs_from_log_mel_spectrograms(log_mel)[..., :num_mfccs]
+
+
+def numpy_fft(audio):
+    """Returns the magnitude of the positive frequencies, like `audio_to_fft`.
+
+    Accepts a single waveform, a batch of waveforms, or a batch shaped
+    `(batch, samples, 1)`, in which case the channel axis is kept.
+    """
+    if audio.ndim == 3:
+        return numpy_fft(audio[..., 0])[..., np.newaxis]
+    fft = np.fft.rfft(audio, axis=-1)
+    return np.abs(fft[..., : audio.shape[-1] // 2]).astype(np.float32)
+
+
+def _hertz_to_mel(frequencies):
+    return 1127.0 * np.log1p(frequencies / 700.0)
+
+
+@functools.lru_cache(maxsize=None)
+def mel_weight_matrix(
+    num_mel_bins, num_spectrogram_bins, sampling_rate, lower_edge_hertz, upper_edge_hertz
+):
+    """NumPy port of `tf.signal.linear_to_mel_weight_matrix`."""
+    linear_frequencies = np.linspace(0.0, sampling_rate / 2, num_spectrogram_bins)[1:]
+    spectrogram_bins_mel = _hertz_to_mel(linear_frequencies)[:, np.newaxis]
+
+    band_edges_mel = np.linspace(
+        _hertz_to_mel(lower_edge_hertz), _hertz_to_mel(upper_edge_hertz), num_mel_bins + 2
+    )
+    lower_edge_mel = band_edges_mel[:-2]
+    center_mel = band_edges_mel[1:-1]
+    upper_edge_mel = band_edges_mel[2:]
+
+    lower_slopes = (spectrogram_bins_mel - lower_edge_mel) / (center_mel - lower_edge_mel)
+    upper_slopes = (upper_edge_mel - spectrogram_bins_mel) / (upper_edge_mel - center_mel)
+    weights = np.maximum(0.0, np.minimum(lower_slopes, upper_slopes))
+
+    # The DC bin gets no weight
+    return np.pad(weights, [[1, 0], [0, 0]]).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def _hann_window(frame_length):
+    n = np.arange(frame_length)
+    return (0.5 - 0.5 * np.cos(2 * np.pi * n / frame_length)).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_matrix(num_mel_bins):
+    # Orthonormal-scaled DCT-II, as used by `tf.signal.mfccs_from_log_mel_spectrograms`
+    n = np.arange(num_mel_bins)[:, np.newaxis]
+    k = np.arange(num_mel_bins)[np.newaxis, :]
+    dct = 2 * np.cos(np.pi * k * (2 * n + 1) / (2 * num_mel_bins))
+    return (dct / np.sqrt(2 * num_mel_bins)).astype(np.float32)
+
+
+def numpy_log_mel(
+    audio,
+    sampling_rate=SAMPLING_RATE,
+    frame_length=FRAME_LENGTH,
+    frame_step=FRAME_STEP,
+    fft_length=FFT_LENGTH,
+    num_mel_bins=NUM_MEL_BINS,
+    lower_edge_hertz=LOWER_EDGE_HERTZ,
+    upper_edge_hertz=UPPER_EDGE_HERTZ,
+):
+    """NumPy version of `audio_to_log_mel`."""
+    if audio.ndim == 3:
+        audio = audio[..., 0]
+    # Zero-copy view of the overlapping frames, as `tf.signal.frame` does
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame_length, axis=-1)
+    frames = frames[..., ::frame_step, :] * _hann_window(frame_length)
+    spectrogram = np.abs(np.fft.rfft(frames, n=fft_length, axis=-1)).astype(np.float32)
+    weights = mel_weight_matrix(
+        num_mel_bins,
+        fft_length // 2 + 1,
+        sampling_rate,
+        lower_edge_hertz,
+        upper_edge_hertz,
+    )
+    return np.log(spectrogram @ weights + LOG_OFFSET)
+
+
+def numpy_mfcc(audio, num_mfccs=NUM_MFCCS, **kwargs):
+    """NumPy version of `audio_to_mfcc`."""
+    log_mel = numpy_log_mel(audio, **kwargs)
+    return (log_mel @ _dct_matrix(log_mel.shape[-1]))[..., :num_mfccs]
+
+
+def _tf_fft(audio):
+    from .dataset import audio_to_fft
+
+    return audio_to_fft(audio)
+
+
+# name -> (TensorFlow implementation, NumPy implementation)
+FRONTENDS = {
+    "fft": (_tf_fft, numpy_fft),
+    "log_mel": (audio_to_log_mel, numpy_log_mel),
+    "mfcc": (audio_to_mfcc, numpy_mfcc),
+}
+
+
+def get_frontend(name="fft", backend="tf", **kwargs):
+    """Returns the batched feature function `name` for the `"tf"` or `"numpy"` backend.
+
+    Keyword arguments are bound to the function, e.g. `num_mel_bins=40`.
+    """
+    if name not in FRONTENDS:
+        raise ValueError(
+            "Unknown front-end {}, expected one of {}".format(name, list(FRONTENDS))
+        )
+    if backend not in ("tf", "numpy"):
+        raise ValueError("Unknown backend {}, expected 'tf' or 'numpy'".format(backend))
+    fn = FRONTENDS[name][0 if backend == "tf" else 1]
+    return functools.partial(fn, **kwargs) if kwargs else fn
+
+
+def feature_shape(name="fft", sampling_rate=SAMPLING_RATE, **kwargs):
+    """Returns the per-sample feature shape of a front-end, to pass to `build_model`."""
+    frontend = get_frontend(name, "numpy", **kwargs)
+    return frontend(np.zeros((1, sampling_rate, 1), dtype=np.float32)).shape[1:]
@@ -0,0 +1,151 @@
+"""1D convnets with residual connections that classify speakers from their spectrum.
+
+`build_model` is the network of the Keras example; `build_compact_model`
+and `MODEL_VARIANTS` are cheaper variants of it. Keras is imported by the
+functions that build layers, so `MODEL_VARIANTS` can be read without it.
+"""
+
+
+def residual_block(x, filters, conv_num=3, activation="relu"):
+    from tensorflow import keras
+
+    # Shortcut
+    s = keras.layers.Conv1D(filters, 1, padding="same")(x)
+    for i in range(conv_num - 1):
+        x = keras.layers.Conv1D(filters, 3, padding="same")(x)
+        x = keras.layers.Activation(activation)(x)
+    x = keras.layers.Conv1D(filters, 3, padding="same")(x)
+    x = keras.layers.Add()([x, s])
+    x = keras.layers.Activation(activation)(x)
+    return keras.layers.MaxPool1D(pool_size=2, strides=2)(x)
+
+
+def build_model(input_shape, num_classes):
+    from tensorflow import keras
+
+    inputs = keras.layers.Input(shape=input_shape, name="input")
+
+    x = residual_block(inputs, 16, 2)
+    x = residual_block(x, 32, 2)
+    x = residual_block(x, 64, 3)
+    x = residual_block(x, 128, 3)
+    x = residual_block(x, 128, 3)
+
+    x = keras.layers.AveragePooling1D(pool_size=3, strides=3)(x)
+    x = keras.layers.Flatten()(x)
+    x = keras.layers.Dense(256, activation="relu")(x)
+    x = keras.layers.Dense(128, activation="relu")(x)
+
+    outputs = keras.layers.Dense(num_classes, activation="softmax", name="output")(x)
+
+    return keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def build_embedding_model(model):
+    """Returns a model sharing `model`'s weights that outputs its speaker embedding.
+
+    The embedding is the 128-d activation of the last `Dense` layer before the
+    softmax, so it is not tied to the classes the model was trained on.
+    """
+    from tensorflow import keras
+
+    return keras.models.Model(
+        inputs=model.inputs, outputs=model.get_layer("output").input, name="embedding"
+    )
+
+
+def compact_residual_block(
+    x, filters, conv_num=3, activation="relu", separable=True, pool_size=2
+):
+    """`residual_block` with depthwise-separable convolutions.
+
+    A separable convolution costs about `1 / filters + 1 / kernel_size` of a
+    full one, and the shortcut stays a full 1x1 convolution.
+    """
+    from tensorflow import keras
+
+    conv = keras.layers.SeparableConv1D if separable else keras.layers.Conv1D
+    s = keras.layers.Conv1D(filters, 1, padding="same")(x)
+    for i in range(conv_num - 1):
+        x = conv(filters, 3, padding="same")(x)
+        x = keras.layers.Activation(activation)(x)
+    x = conv(filters, 3, padding="same")(x)
+    x = keras.layers.Add()([x, s])
+    x = keras.layers.Activation(activation)(x)
+    if pool_size > 1:
+        x = keras.layers.MaxPool1D(pool_size=pool_size, strides=pool_size)(x)
+    return x
+
+
+def build_compact_model(
+    input_shape,
+    num_classes,
+    filters=(16, 32, 64, 128, 128),
+    conv_nums=(2, 2, 3, 3, 3),
+    stem_stride=4,
+    separable=True,
+    embedding_dim=128,
+):
+    """A cheaper `build_model`, configurable along three axes.
+
+    - A strided stem convolution divides the sequence length by
+      `stem_stride` before the first residual block.
+    - `separable` uses depthwise-separable convolutions in the blocks.
+    - Global average pooling replaces `AveragePooling1D` -> `Flatten` ->
+      `Dense(256)`, which holds 2.72M of the 3.09M parameters of
+      `build_model`.
+
+    The last hidden layer is still an `embedding_dim` `Dense` layer feeding
+    the "output" layer, so `build_embedding_model` works on both.
+    """
+    from tensorflow import keras
+
+    inputs = keras.layers.Input(shape=input_shape, name="input")
+
+    x = inputs
+    if stem_stride > 1:
+        x = keras.layers.Conv1D(
+            filters[0], 2 * stem_stride - 1, strides=stem_stride, padding="same"
+        )(x)
+        x = keras.layers.Activation("relu")(x)
+    for block_filters, conv_num in zip(filters, conv_nums):
+        # Do not pool sequences that are already short, e.g. log-mel frames
+        pool_size = 2 if x.shape[1] is None or x.shape[1] >= 4 else 1
+        x = compact_residual_block(
+            x, block_filters, conv_num, separable=separable, pool_size=pool_size
+        )
+
+    x = keras.layers.GlobalAveragePooling1D()(x)
+    x = keras.layers.Dense(embedding_dim, activation="relu")(x)
+
+    outputs = keras.layers.Dense(num_classes, activation="softmax", name="output")(x)
+
+    return keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+# name -> (front-end, `build_compact_model` keyword arguments), or None for
+# `build_model` itself
+MODEL_VARIANTS = {
+    "baseline": ("fft", None),
+    "global_pool": ("fft", {"stem_stride": 1, "separable": False}),
+    "strided": ("fft", {"stem_stride": 4, "separable": False}),
+    "separable": ("fft", {"stem_stride": 4, "separable": True}),
+    "separable_log_mel": (
+        "log_mel",
+        {"stem_stride": 1, "separable": True, "filters": (32, 64, 128, 128, 128)},
+    ),
+}
+
+
+def build_variant(name, input_shape, num_classes):
+    """Builds the model of `MODEL_VARIANTS[name]` for features of `input_shape`."""
+    if name not in MODEL_VARIANTS:
+        raise ValueError(
+            "Unknown model variant {}, expected one of {}".format(
+                name, list(MODEL_VARIANTS)
+            )
+        )
+    _, kwargs = MODEL_VARIANTS[name]
+    if kwargs is None:
+        return build_model(input_shape, num_classes)
+    return build_compact_model(input_shape, num_classes, **kwargs)
@@ -0,0 +1,147 @@
+"""In-process noise bank: resampled background noise, split into 1 second chunks.
+
+The noise files are decoded and resampled to `SAMPLING_RATE` with polyphase
+filtering on a process pool, instead of shelling out to ffprobe and ffmpeg
+for every file. The resampled streams are concatenated into one float32
+array saved as `noise_bank.npy`, and `noise_bank.json` records, for every
+source file, its mtime and where its stream lives in the array, along with
+the start and peak amplitude of every 1 second chunk.
+
+Later runs memory-map the saved bank as long as none of the noise files
+changed.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import gcd
+
+import numpy as np
+
+from .audio import read_wav
+from .config import SAMPLING_RATE
+
+BANK_FILENAME = "noise_bank.npy"
+MANIFEST_FILENAME = "noise_bank.json"
+
+
+def load_resampled(path, sampling_rate=SAMPLING_RATE):
+    """Decodes the first channel of a wav file and resamples it to `sampling_rate`.
+
+    Returns the resampled float32 stream and the original sampling rate.
+    """
+    from scipy.signal import resample_poly
+
+    audio, rate = read_wav(path)
+    audio = audio[:, 0]
+    if rate != sampling_rate:
+        g = gcd(rate, sampling_rate)
+        audio = resample_poly(audio, sampling_rate // g, rate // g)
+    return audio.astype(np.float32), rate
+
+
+def _load_resampled(args):
+    return load_resampled(*args)
+
+
+class NoiseBank:
+    """Resampled noise streams and their 1 second chunks, backed by one array."""
+
+    def __init__(self, streams, manifest):
+        self.streams = streams
+        self.manifest = manifest
+        self.sampling_rate = manifest["sampling_rate"]
+        self.chunk_starts = np.array(manifest["chunk_starts"], dtype=np.int64)
+        self.peaks = np.array(manifest["peaks"], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.chunk_starts)
+
+    def stream(self, i):
+        """Returns a zero-copy view of the `i`-th resampled noise file."""
+        source = self.manifest["sources"][i]
+        return self.streams[source["offset"] : source["offset"] + source["length"]]
+
+    def chunks(self):
+        """Returns every 1 second chunk as a `(num_chunks, SAMPLING_RATE, 1)` array.
+
+        This is the same `noises` tensor that `load_noise_sample` used to build.
+        """
+        index = self.chunk_starts[:, np.newaxis] + np.arange(self.sampling_rate)
+        return np.asarray(self.streams[index])[..., np.newaxis]
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps a bank saved in the directory `path`."""
+        with open(os.path.join(path, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+        return cls(np.load(os.path.join(path, BANK_FILENAME), mmap_mode="r"), manifest)
+
+
+def _is_current(path, noise_paths, sampling_rate):
+    manifest_path = os.path.join(path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path) or not os.path.exists(
+        os.path.join(path, BANK_FILENAME)
+    ):
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest["sampling_rate"] == sampling_rate and [
+        (source["path"], source["mtime"]) for source in manifest["sources"]
+    ] == [(str(p), os.stat(p).st_mtime_ns) for p in noise_paths]
+
+
+def build_noise_bank(noise_paths, path, sampling_rate=SAMPLING_RATE, num_workers=None):
+    """Returns the noise bank of `noise_paths`, building it in `path` if needed.
+
+    An existing bank is reused when it was built from the same files with the
+    same mtimes. Otherwise every file is resampled on a process pool, split
+    into `sampling_rate`-long chunks (the remainder is kept in the stream but
+    not chunked), and the bank is saved.
+    """
+    noise_paths = sorted(str(p) for p in noise_paths)
+    if _is_current(path, noise_paths, sampling_rate):
+        return NoiseBank.load(path)
+
+    with ProcessPoolExecutor(num_workers) as executor:
+        resampled = list(
+            executor.map(_load_resampled, [(p, sampling_rate) for p in noise_paths])
+        )
+
+    sources = []
+    chunk_starts = []
+    peaks = []
+    offset = 0
+    for noise_path, (stream, rate) in zip(noise_paths, resampled):
+        slices = len(stream) // sampling_rate
+        sources.append(
+            {
+                "path": noise_path,
+                "mtime": os.stat(noise_path).st_mtime_ns,
+                "original_sampling_rate": rate,
+                "offset": offset,
+                "length": len(stream),
+            }
+        )
+        for i in range(slices):
+            chunk = stream[i * sampling_rate : (i + 1) * sampling_rate]
+            chunk_starts.append(offset + i * sampling_rate)
+            # `add_noise` scales by the maximum, not the absolute peak
+            peaks.append(float(chunk.max()))
+        offset += len(stream)
+
+    os.makedirs(path, exist_ok=True)
+    if resampled:
+        streams = np.concatenate([stream for stream, _ in resampled])
+    else:
+        streams = np.zeros(0, dtype=np.float32)
+    np.save(os.path.join(path, BANK_FILENAME), streams)
+    manifest = {
+        "sampling_rate": sampling_rate,
+        "sources": sources,
+        "chunk_starts": chunk_starts,
+        "peaks": peaks,
+    }
+    with open(os.path.join(path, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f)
+    return NoiseBank.load(path)
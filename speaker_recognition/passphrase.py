@@ -0,0 +1,241 @@
+"""Offline passphrase verification with MFCC templates and banded DTW.
+
+`predict_keywords` in the notebook downloads YAMNet, a 521-class audio event
+model, and compares its class indices to keyword strings, so it can never
+match. Instead, every user enrolls a few recordings of their passphrase,
+stored as MFCC frame templates in SQLite. A login recording is accepted
+when its dynamic time warping distance to the closest template is below the
+user's threshold.
+
+The DTW is restricted to a Sakoe-Chiba band around the diagonal, computes
+the frame distance matrix in one vectorized step, fills every row of the
+cost matrix with vectorized cumulative operations instead of a loop over
+columns, and gives up on a template as soon as a whole row exceeds the best
+distance found so far or the threshold. Everything runs with NumPy.
+"""
+
+import sqlite3
+
+import numpy as np
+
+from .audio import load_mono
+from .config import SAMPLING_RATE
+from .enrollment_store import file_hash
+from .frontend import FRAME_LENGTH, FRAME_STEP, numpy_mfcc
+
+# Frames quieter than this many dB below the loudest one are trimmed from
+# both ends of a recording
+TRIM_DB = 35.0
+
+# Half-width of the DTW band, as a fraction of the template length
+DTW_BAND = 0.2
+
+# Distance accepted when a user has a single template, and the margin over
+# the largest distance between a user's own templates otherwise
+PASSPHRASE_THRESHOLD = 1.0
+THRESHOLD_MARGIN = 1.25
+
+
+def passphrase_features(audio, sampling_rate=SAMPLING_RATE):
+    """Returns the normalized MFCC frames of a recording, trimmed of leading and trailing silence.
+
+    The first coefficient, which mostly tracks loudness, is dropped and every
+    coefficient is normalized to zero mean and unit variance over the
+    recording.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < FRAME_LENGTH:
+        audio = np.pad(audio, (0, FRAME_LENGTH - len(audio)))
+    mfccs = numpy_mfcc(audio, sampling_rate=sampling_rate)[:, 1:]
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME_LENGTH)[::FRAME_STEP]
+    energy_db = 10 * np.log10(np.maximum(np.mean(np.square(frames), axis=-1), 1e-10))
+    voiced = np.flatnonzero(energy_db >= energy_db.max() - TRIM_DB)
+    mfccs = mfccs[voiced[0] : voiced[-1] + 1]
+    return (mfccs - mfccs.mean(axis=0)) / (mfccs.std(axis=0) + 1e-5)
+
+
+def frame_distances(query, template):
+    """Returns the Euclidean distance between every query frame and every template frame."""
+    squares = (
+        np.sum(np.square(query), axis=1)[:, np.newaxis]
+        + np.sum(np.square(template), axis=1)[np.newaxis, :]
+        - 2 * query @ template.T
+    )
+    return np.sqrt(np.maximum(squares, 0.0))
+
+
+def dtw_distance(query, template, band=DTW_BAND, abandon_above=np.inf):
+    """Returns the banded DTW distance between two frame sequences, or inf once abandoned.
+
+    The distance is the cost of the best alignment divided by the total
+    number of frames. The computation stops as soon as every alignment costs
+    more than `abandon_above`.
+    """
+    n, m = len(query), len(template)
+    if not n or not m:
+        return np.inf
+    cost = frame_distances(query, template)
+    limit = abandon_above * (n + m)
+    # The band follows the diagonal from (0, 0) to (n - 1, m - 1) and is wide
+    # enough for consecutive rows to stay connected
+    radius = max(int(np.ceil(band * m)), int(np.ceil((m - 1) / max(n - 1, 1))), 1)
+    centers = np.arange(n) * (m - 1) / max(n - 1, 1)
+    lows = np.maximum(0, np.floor(centers - radius).astype(int))
+    highs = np.minimum(m, np.ceil(centers + radius).astype(int) + 1)
+
+    previous = np.full(m + 1, np.inf)
+    # previous[j + 1] holds the cost of row i - 1 at column j
+    previous[1 : highs[0] + 1] = np.cumsum(cost[0, : highs[0]])
+    for i in range(1, n):
+        low, high = lows[i], highs[i]
+        # Best of the diagonal and vertical predecessors of every cell
+        predecessors = np.minimum(previous[low : high], previous[low + 1 : high + 1])
+        # With S the running sum of the row costs, the recurrence
+        # D[j] = c[j] + min(p[j], D[j - 1]) solves to
+        # D[j] = S[j] + min over k <= j of (p[k] - S[k - 1])
+        running = np.cumsum(cost[i, low:high])
+        shifted = np.concatenate([[0.0], running[:-1]])
+        row = running + np.minimum.accumulate(predecessors - shifted)
+        if row.min() > limit:
+            return np.inf
+        previous = np.full(m + 1, np.inf)
+        previous[low + 1 : high + 1] = row
+    return previous[m] / (n + m)
+
+
+class PassphraseStore:
+    """MFCC passphrase templates of enrolled users, persisted in a SQLite database."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS passphrases ("
+            " user TEXT NOT NULL,"
+            " audio_hash TEXT NOT NULL,"
+            " frames INTEGER NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " template BLOB NOT NULL,"
+            " PRIMARY KEY (user, audio_hash))"
+        )
+        self._db.commit()
+        self._cache = {}
+
+    def close(self):
+        self._db.close()
+
+    def __contains__(self, key):
+        """`(user, audio_hash) in store` tells whether that recording is enrolled."""
+        user, audio_hash = key
+        row = self._db.execute(
+            "SELECT 1 FROM passphrases WHERE user = ? AND audio_hash = ?",
+            (user, audio_hash),
+        ).fetchone()
+        return row is not None
+
+    def users(self):
+        return [
+            row[0]
+            for row in self._db.execute("SELECT DISTINCT user FROM passphrases ORDER BY user")
+        ]
+
+    def add(self, user, audio_hash, template):
+        """Stores the `(frames, dim)` MFCC template of one passphrase recording of `user`."""
+        template = np.ascontiguousarray(template, dtype=np.float32)
+        self._db.execute(
+            "INSERT OR REPLACE INTO passphrases VALUES (?, ?, ?, ?, ?)",
+            (user, audio_hash, template.shape[0], template.shape[1], template.tobytes()),
+        )
+        self._db.commit()
+        self._cache.pop(user, None)
+
+    def remove(self, user):
+        """Removes every template of `user`."""
+        self._db.execute("DELETE FROM passphrases WHERE user = ?", (user,))
+        self._db.commit()
+        self._cache.pop(user, None)
+
+    def templates(self, user):
+        """Returns the templates of `user`, read from the database once and then cached."""
+        if user not in self._cache:
+            rows = self._db.execute(
+                "SELECT frames, dim, template FROM passphrases WHERE user = ?"
+                " ORDER BY audio_hash",
+                (user,),
+            ).fetchall()
+            self._cache[user] = [
+                np.frombuffer(blob, dtype=np.float32).reshape(frames, dim)
+                for frames, dim, blob in rows
+            ]
+        return self._cache[user]
+
+
+class PassphraseVerifier:
+    """Enrolls passphrase recordings and verifies login recordings against them."""
+
+    def __init__(self, store, band=DTW_BAND, sampling_rate=SAMPLING_RATE):
+        self.store = store
+        self.band = band
+        self.sampling_rate = sampling_rate
+        self._thresholds = {}
+
+    def features(self, source):
+        """Returns the passphrase features of a wav path or a float32 buffer."""
+        if not isinstance(source, np.ndarray):
+            source = load_mono(source, self.sampling_rate)
+        return passphrase_features(source, self.sampling_rate)
+
+    def enroll(self, user, audio_paths):
+        """Adds passphrase recordings of `user`; returns how many were new."""
+        added = 0
+        for path in audio_paths:
+            audio_hash = file_hash(path)
+            if (user, audio_hash) in self.store:
+                continue
+            self.store.add(user, audio_hash, self.features(path))
+            added += 1
+        self._thresholds.pop(user, None)
+        return added
+
+    def threshold(self, user):
+        """Returns the distance below which a recording matches `user`'s passphrase.
+
+        With several templates, it is `THRESHOLD_MARGIN` times the largest
+        distance between two of them, so it adapts to how consistently the
+        user says their passphrase.
+        """
+        if user not in self._thresholds:
+            templates = self.store.templates(user)
+            distances = [
+                dtw_distance(a, b, self.band)
+                for i, a in enumerate(templates)
+                for b in templates[i + 1 :]
+            ]
+            if distances:
+                self._thresholds[user] = THRESHOLD_MARGIN * max(distances)
+            else:
+                self._thresholds[user] = PASSPHRASE_THRESHOLD
+        return self._thresholds[user]
+
+    def distance(self, user, source, abandon_above=np.inf, cancelled=None):
+        """Returns the DTW distance of a recording to the closest template of `user`.
+
+        Templates are abandoned as soon as they cannot beat the best one so
+        far, and `abandon_above` is returned when none does.
+        """
+        templates = self.store.templates(user)
+        if not templates:
+            raise KeyError("{} has no enrolled passphrase".format(user))
+        query = self.features(source)
+        best = abandon_above
+        for template in templates:
+            if cancelled is not None and cancelled.is_set():
+                break
+            best = min(best, dtw_distance(query, template, self.band, best))
+        return best
+
+    def verify(self, user, source, cancelled=None):
+        """Returns whether a recording matches `user`'s passphrase, and its distance."""
+        threshold = self.threshold(user)
+        distance = self.distance(user, source, threshold, cancelled)
+        return distance < threshold, distance
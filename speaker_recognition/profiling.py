@@ -0,0 +1,265 @@
+"""Opt-in timing of pipeline stages, with samples/sec and p50/p99 latency.
+
+Profiling is off by default, and `stage` then returns a shared no-op
+context manager, so instrumented code pays one flag check per call. Turn it
+on with `enable()`, or with `SPEAKER_RECOGNITION_PROFILE=1` in the
+environment.
+
+Every stage keeps a call count, a sample count, its total time and a
+histogram of latencies in logarithmic buckets, 8 per octave from 1 us, so
+that percentiles need no memory per call and are within about 5% of the
+exact value. Reports are a dict (`snapshot`), one JSON line per stage on the
+`speaker_recognition.profiling` logger (`log_report`), or JSON over HTTP
+(`start_metrics_server`).
+
+Stages that run inside a `tf.data` graph cannot be timed from Python; time
+pipeline prefixes with `time_dataset` instead, as `benchmarks.pipeline_stages`
+does.
+"""
+
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_PER_OCTAVE = 8
+MIN_SECONDS = 1e-6
+# 1 us to about 18 minutes
+NUM_BUCKETS = 30 * BUCKETS_PER_OCTAVE
+
+
+class StageStats:
+    """Counters and a latency histogram of one stage."""
+
+    def __init__(self):
+        self.count = 0
+        self.samples = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * NUM_BUCKETS
+
+    def record(self, seconds, samples=1):
+        self.count += 1
+        self.samples += samples
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if seconds > MIN_SECONDS:
+            bucket = int(math.log2(seconds / MIN_SECONDS) * BUCKETS_PER_OCTAVE)
+            self.buckets[min(bucket, NUM_BUCKETS - 1)] += 1
+        else:
+            self.buckets[0] += 1
+
+    def percentile(self, q):
+        """Returns the `q`th percentile latency in seconds, from the histogram."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                # Geometric middle of the bucket, capped by the largest latency
+                return min(
+                    MIN_SECONDS * 2 ** ((bucket + 0.5) / BUCKETS_PER_OCTAVE), self.max
+                )
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "samples": self.samples,
+            "total_s": self.total,
+            "samples_per_sec": self.samples / self.total if self.total else 0.0,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(50),
+            "p99_ms": 1000 * self.percentile(99),
+            "max_ms": 1000 * self.max,
+        }
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "samples", "start")
+
+    def __init__(self, profiler, name, samples):
+        self.profiler = profiler
+        self.name = name
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start, self.samples)
+        return False
+
+
+class Profiler:
+    """Thread-safe collection of `StageStats` by stage name."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, samples=1):
+        """Adds one call of `seconds` that processed `samples` samples to a stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats()
+            stats.record(seconds, samples)
+
+    def stage(self, name, samples=1):
+        """Returns a context manager that times its block as one call of `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, samples)
+
+    def set_stats(self, name, stats):
+        """Replaces the `StageStats` of a stage, e.g. with ones measured elsewhere."""
+        with self._lock:
+            self._stages[name] = stats
+
+    def snapshot(self):
+        """Returns the summary of every stage, by name."""
+        with self._lock:
+            return {name: stats.summary() for name, stats in sorted(self._stages.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def log_report(self, level=logging.INFO, **fields):
+        """Logs one JSON line per stage, with `fields` added to each."""
+        for name, summary in self.snapshot().items():
+            logger.log(level, json.dumps(dict(fields, stage=name, **summary)))
+
+
+# The process-wide profiler used by the instrumented modules
+profiler = Profiler(enabled=os.environ.get("SPEAKER_RECOGNITION_PROFILE", "") not in ("", "0"))
+
+
+def enable():
+    profiler.enabled = True
+
+
+def disable():
+    profiler.enabled = False
+
+
+def stage(name, samples=1):
+    """`Profiler.stage` of the process-wide profiler."""
+    return profiler.stage(name, samples)
+
+
+def record(name, seconds, samples=1):
+    profiler.record(name, seconds, samples)
+
+
+def profiled(name):
+    """Decorator that times every call of a function as the stage `name`."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profiler.stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def time_dataset(ds, name, num_batches, warmup=1):
+    """Iterates over `num_batches` batches of a `tf.data` dataset, timing each `next`.
+
+    The samples of a batch are the length of its first component. Returns
+    the summary of the stage, which is recorded even when profiling is off.
+    """
+    stats = StageStats()
+    iterator = iter(ds)
+    for _ in range(warmup):
+        next(iterator)
+    for _ in range(num_batches):
+        start = time.perf_counter()
+        batch = next(iterator)
+        seconds = time.perf_counter() - start
+        first = batch[0] if isinstance(batch, tuple) else batch
+        stats.record(seconds, int(first.shape[0]))
+    profiler.set_stats(name, stats)
+    return stats.summary()
+
+
+def training_callback(batch_size, log_every_epoch=True):
+    """Returns a Keras callback that times every training step and logs a report per epoch.
+
+    The step time includes waiting for the input pipeline, since Keras
+    fetches batches inside the training step.
+    """
+    from tensorflow import keras
+
+    starts = {}
+
+    def on_train_batch_begin(batch, logs=None):
+        starts["batch"] = time.perf_counter()
+
+    def on_train_batch_end(batch, logs=None):
+        profiler.record("train.step", time.perf_counter() - starts["batch"], batch_size)
+
+    def on_epoch_begin(epoch, logs=None):
+        starts["epoch"] = time.perf_counter()
+
+    def on_epoch_end(epoch, logs=None):
+        profiler.record("train.epoch", time.perf_counter() - starts["epoch"])
+        if log_every_epoch:
+            profiler.log_report(epoch=epoch)
+
+    return keras.callbacks.LambdaCallback(
+        on_train_batch_begin=on_train_batch_begin,
+        on_train_batch_end=on_train_batch_end,
+        on_epoch_begin=on_epoch_begin,
+        on_epoch_end=on_epoch_end,
+    )
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        data = json.dumps(profiler.snapshot()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=9100, host="127.0.0.1"):
+    """Serves `snapshot()` as JSON at `GET /metrics` from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
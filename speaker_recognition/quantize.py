@@ -0,0 +1,145 @@
+"""Int8 TFLite export of the speaker model, and a runtime that does not need Keras.
+
+`export_int8` converts a trained Keras model with full-integer post-training
+quantization: weights and activations are stored as int8, with activation
+ranges calibrated on a few hundred batches of real features, e.g. from
+`valid_ds`. `export_float` writes the same model as a float32 TFLite file,
+for comparison or for deployments that cannot afford the accuracy loss.
+
+`TFLiteSpeakerModel` runs either file with the standalone `tflite_runtime`
+interpreter when it is installed, and with `tf.lite.Interpreter` otherwise.
+It takes and returns float32 arrays whatever the model's input type, so it
+can replace the Keras model in `StreamingVerifier` or `VerificationEngine`.
+"""
+
+import os
+
+import numpy as np
+
+# Number of calibration samples drawn from the representative dataset
+CALIBRATION_SAMPLES = 256
+
+
+def representative_dataset(ds, num_samples=CALIBRATION_SAMPLES):
+    """Returns a generator of single `(1, ...)` float32 inputs from a dataset.
+
+    `ds` yields `(features, labels)` batches, like `valid_ds` once mapped
+    through `audio_to_fft`.
+    """
+
+    def generator():
+        count = 0
+        for features, _ in ds:
+            for sample in np.asarray(features, dtype=np.float32):
+                if count == num_samples:
+                    return
+                yield [sample[np.newaxis]]
+                count += 1
+
+    return generator
+
+
+def _write(path, flatbuffer):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(flatbuffer)
+    os.replace(tmp, path)
+    return path
+
+
+def export_float(model, path):
+    """Writes `model` as a float32 TFLite file and returns its path."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    return _write(path, converter.convert())
+
+
+def export_int8(model, calibration_ds, path, num_samples=CALIBRATION_SAMPLES, int8_io=True):
+    """Writes `model` with full-integer int8 quantization and returns its path.
+
+    Activation ranges are calibrated on `num_samples` inputs of
+    `calibration_ds`. With `int8_io`, the input and output tensors are int8
+    too, and `TFLiteSpeakerModel` (de)quantizes them; otherwise they stay
+    float32 and the interpreter converts them.
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(calibration_ds, num_samples)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    if int8_io:
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return _write(path, converter.convert())
+
+
+def _interpreter(path, num_threads):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class TFLiteSpeakerModel:
+    """Runs a TFLite speaker model on float32 batches of features.
+
+    Called like the Keras model, it returns the class probabilities of a
+    `(batch, ...)` array of features.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = _interpreter(path, num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+
+    @property
+    def input_shape(self):
+        return tuple(self._input["shape"][1:])
+
+    @property
+    def quantized(self):
+        return self._input["dtype"] == np.int8
+
+    def _resize(self, batch_size):
+        self.interpreter.resize_tensor_input(
+            self._input["index"], [batch_size] + list(self.input_shape)
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def __call__(self, features, training=False):
+        features = np.asarray(features, dtype=np.float32)
+        if len(features) != self._batch_size:
+            self._resize(len(features))
+
+        scale, zero_point = self._input["quantization"]
+        if self._input["dtype"] != np.float32:
+            info = np.iinfo(self._input["dtype"])
+            features = np.clip(np.round(features / scale + zero_point), info.min, info.max)
+        self.interpreter.set_tensor(self._input["index"], features.astype(self._input["dtype"]))
+        self.interpreter.invoke()
+
+        output = self.interpreter.get_tensor(self._output["index"])
+        scale, zero_point = self._output["quantization"]
+        if self._output["dtype"] != np.float32:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def predict(self, features, batch_size=32):
+        """Returns the class probabilities of any number of samples, in batches."""
+        return np.concatenate(
+            [
+                self(features[start : start + batch_size])
+                for start in range(0, len(features), batch_size)
+            ]
+        )
@@ -0,0 +1,398 @@
+"""Replay screening with spectral landmark hashes, before any model runs.
+
+Nothing in the login flow stops an exact or near-exact replay of an earlier
+login or enrollment recording. Every accepted utterance is reduced to a few
+hundred landmark hashes: pairs of spectral peaks, each hash packing the
+frequency of both peaks and their distance in frames, stored with the time
+of the first peak. A new attempt is a replay when many of its hashes are
+found in one stored utterance with the same time offset, which survives
+re-encoding, gain changes and added noise far better than comparing
+samples.
+
+Peaks only line up when both recordings are framed at the same point of the
+160 sample hop, and a replay can start anywhere. Stored utterances are
+therefore hashed `SUB_HOP_SHIFTS` times, each time dropping another fraction
+of a hop from their start, so that one of the copies is always within
+`FRAME_STEP / (2 * SUB_HOP_SHIFTS)` samples of the attempt's framing. Every
+copy gets its own votes, so the copies never add up to a false match.
+
+The hashes live in an inverted index of `(utterance, time)` postings sorted
+by hash, so checking an attempt costs two binary searches per hash. The
+index keeps at most `max_utterances` utterances, none older than
+`max_age_seconds`, and evicts the oldest first, so its size does not grow
+with the number of logins. Its methods can be called from several threads.
+
+Screening is not entirely sub-millisecond: `match` first hashes the attempt,
+a spectrogram and a peak search that take about 2.3 ms p50 for one second of
+audio, and only the index lookup that follows stays well under 1 ms with
+thousands of stored utterances. A caller checking one attempt against
+several indexes can hash it once with `landmark_hashes` and call
+`match_hashes` on each.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from .config import SAMPLING_RATE
+from .frontend import FRAME_LENGTH, FRAME_STEP, FFT_LENGTH
+
+# Peaks must be the maximum of a neighbourhood this many frames and bins wide
+PEAK_NEIGHBOURHOOD = (9, 9)
+# At most this many peaks are kept per second of audio
+PEAKS_PER_SECOND = 30
+# Every peak is paired with up to this many following peaks ...
+FAN_OUT = 5
+# ... at most this many frames later
+MAX_DELTA_FRAMES = 63
+
+# Stored utterances are hashed at this many evenly spaced offsets within a hop
+SUB_HOP_SHIFTS = 4
+
+# An attempt is a replay when at least this many hashes, and this fraction
+# of its hashes, agree on the time offset into one stored utterance. Against
+# 1000 stored utterances in `benchmarks.replay`, 99.9% of fresh utterances
+# stay below 0.09 and 15 matches and noisy replays have a median of 0.31;
+# these bounds detect about 96% of replays at about 1 false alarm in 3000
+MIN_MATCHES = 15
+MIN_MATCH_FRACTION = 0.12
+
+ReplayMatch = namedtuple("ReplayMatch", ["is_replay", "utterance", "matches", "fraction"])
+
+
+def spectral_peaks(audio, sampling_rate=SAMPLING_RATE):
+    """Returns the frame and frequency bin of the strongest local peaks of the spectrogram."""
+    from scipy.ndimage import maximum_filter
+
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    if len(audio) < FRAME_LENGTH:
+        audio = np.pad(audio, (0, FRAME_LENGTH - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME_LENGTH)[::FRAME_STEP]
+    spectrogram = np.abs(np.fft.rfft(frames * np.hanning(FRAME_LENGTH), FFT_LENGTH))
+    spectrogram = np.log(spectrogram + 1e-6)
+
+    is_peak = spectrogram == maximum_filter(spectrogram, PEAK_NEIGHBOURHOOD)
+    # Flat silent regions are their own maximum everywhere
+    is_peak &= spectrogram > np.median(spectrogram)
+    times, bins = np.nonzero(is_peak)
+    budget = max(1, int(PEAKS_PER_SECOND * len(audio) / sampling_rate))
+    if len(times) > budget:
+        strongest = np.argpartition(-spectrogram[times, bins], budget - 1)[:budget]
+        times, bins = times[strongest], bins[strongest]
+    order = np.lexsort((bins, times))
+    return times[order], bins[order]
+
+
+def landmark_hashes(audio, sampling_rate=SAMPLING_RATE):
+    """Returns the landmark hashes of a recording and the frame of each anchor peak.
+
+    A hash packs the bins of an anchor peak and of one of the next
+    `FAN_OUT` peaks with their distance in frames:
+    `anchor_bin << 15 | target_bin << 6 | delta`.
+    """
+    times, bins = spectral_peaks(audio, sampling_rate)
+    hashes = []
+    anchors = []
+    for k in range(1, FAN_OUT + 1):
+        delta = times[k:] - times[:-k]
+        valid = (delta > 0) & (delta <= MAX_DELTA_FRAMES)
+        hashes.append(
+            (bins[:-k][valid] << 15) | (bins[k:][valid] << 6) | delta[valid]
+        )
+        anchors.append(times[:-k][valid])
+    return np.concatenate(hashes).astype(np.int64), np.concatenate(anchors).astype(np.int64)
+
+
+def shifted_landmark_hashes(audio, sampling_rate=SAMPLING_RATE, num_shifts=SUB_HOP_SHIFTS):
+    """Returns the landmark hashes, anchor frames and shift index of `audio` at every sub-hop shift.
+
+    Copy `i` is hashed after dropping `i * FRAME_STEP // num_shifts` samples
+    from the start of the recording.
+    """
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    hashes, anchors, shifts = [], [], []
+    for i in range(num_shifts):
+        h, t = landmark_hashes(audio[i * FRAME_STEP // num_shifts :], sampling_rate)
+        hashes.append(h)
+        anchors.append(t)
+        shifts.append(np.full(len(h), i, dtype=np.int64))
+    return np.concatenate(hashes), np.concatenate(anchors), np.concatenate(shifts)
+
+
+# Postings are sorted by hash in one large array and one small pending array
+# of recent additions, merged into the large one when it outgrows this many
+# postings or an eighth of the large one
+MIN_PENDING_POSTINGS = 1 << 14
+
+# Columns of a posting array: hash, utterance slot, anchor frame, shift index
+_POSTING_DTYPES = (np.int32, np.int32, np.int32, np.int8)
+
+
+def _empty_postings():
+    return tuple(np.zeros(0, dtype=dtype) for dtype in _POSTING_DTYPES)
+
+
+def _merge_postings(a, b):
+    """Returns the postings of `a` and `b`, each sorted by hash, sorted by hash."""
+    columns = [np.concatenate([x, y]) for x, y in zip(a, b)]
+    # Two sorted runs, which the stable sort merges in linear time
+    order = np.argsort(columns[0], kind="stable")
+    return tuple(column[order] for column in columns)
+
+
+def _lookup(postings, hashes):
+    """Returns the positions in `postings` equal to each of `hashes`, and the query of each."""
+    # Searching with the dtype of the postings saves converting all of them
+    hashes = hashes.astype(postings[0].dtype)
+    low = np.searchsorted(postings[0], hashes, side="left")
+    counts = np.searchsorted(postings[0], hashes, side="right") - low
+    queries = np.repeat(np.arange(len(hashes)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return positions + np.repeat(low, counts), queries
+
+
+class ReplayIndex:
+    """Bounded inverted index of the landmark hashes of accepted utterances.
+
+    Postings are kept in packed NumPy columns sorted by hash, 13 bytes each;
+    a second of stored audio takes about 480 postings over the sub-hop
+    copies, so about 6 KB, and 10,000 one second utterances about 60 MB.
+    """
+
+    def __init__(
+        self,
+        max_utterances=10000,
+        max_age_seconds=30 * 24 * 3600,
+        min_matches=MIN_MATCHES,
+        min_match_fraction=MIN_MATCH_FRACTION,
+        sampling_rate=SAMPLING_RATE,
+        num_shifts=SUB_HOP_SHIFTS,
+    ):
+        self.max_utterances = max_utterances
+        self.max_age_seconds = max_age_seconds
+        self.min_matches = min_matches
+        self.min_match_fraction = min_match_fraction
+        self.sampling_rate = sampling_rate
+        self.num_shifts = num_shifts
+        # utterance -> (added at, slot, number of postings), oldest first
+        self._utterances = OrderedDict()
+        # slot -> utterance, or None once removed, and whether it is live
+        self._names = []
+        self._live = np.zeros(0, dtype=bool)
+        self._postings = _empty_postings()
+        self._pending = _empty_postings()
+        self._dead_postings = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._utterances)
+
+    def __contains__(self, utterance):
+        return utterance in self._utterances
+
+    @property
+    def num_postings(self):
+        return sum(record[2] for record in self._utterances.values())
+
+    @property
+    def nbytes(self):
+        """Bytes held by the posting arrays, including removed postings not yet compacted."""
+        with self._lock:
+            return sum(c.nbytes for c in self._postings + self._pending) + self._live.nbytes
+
+    def add(self, utterance, audio, added_at=None):
+        """Stores the hashes of `audio` under the string `utterance`, evicting old ones."""
+        hashes, anchors, shifts = shifted_landmark_hashes(
+            audio, self.sampling_rate, self.num_shifts
+        )
+        added_at = time.time() if added_at is None else added_at
+        with self._lock:
+            self._add(utterance, hashes, anchors, shifts, added_at)
+            self.evict()
+
+    def add_recordings(self, audio_paths):
+        """Stores enrollment recordings, named by their path, so replaying them is caught too."""
+        from .audio import load_mono
+
+        for path in audio_paths:
+            self.add(str(path), load_mono(path, self.sampling_rate))
+
+    def _add(self, utterance, hashes, anchors, shifts, added_at):
+        if utterance in self._utterances:
+            self.remove(utterance)
+        slot = len(self._names)
+        self._names.append(utterance)
+        if slot >= len(self._live):
+            self._live = np.concatenate([self._live, np.zeros(max(64, slot), dtype=bool)])
+        self._live[slot] = True
+        self._utterances[utterance] = (added_at, slot, len(hashes))
+
+        order = np.argsort(hashes, kind="stable")
+        new = (
+            hashes[order].astype(np.int32),
+            np.full(len(hashes), slot, dtype=np.int32),
+            anchors[order].astype(np.int32),
+            shifts[order].astype(np.int8),
+        )
+        self._pending = _merge_postings(self._pending, new)
+        if len(self._pending[0]) > max(MIN_PENDING_POSTINGS, len(self._postings[0]) // 8):
+            self._postings = _merge_postings(self._postings, self._pending)
+            self._pending = _empty_postings()
+
+    def remove(self, utterance):
+        with self._lock:
+            _, slot, num_postings = self._utterances.pop(utterance)
+            self._names[slot] = None
+            self._live[slot] = False
+            self._dead_postings += num_postings
+            if self._dead_postings > self.num_postings:
+                self._compact()
+
+    def _compact(self):
+        """Drops the postings of removed utterances and renumbers the live slots."""
+        live_slots = np.flatnonzero(self._live[: len(self._names)])
+        new_slots = np.full(len(self._names), -1, dtype=np.int32)
+        new_slots[live_slots] = np.arange(len(live_slots), dtype=np.int32)
+        compacted = []
+        for postings in (self._postings, self._pending):
+            keep = self._live[postings[1]]
+            hashes, slots, anchors, shifts = (column[keep] for column in postings)
+            compacted.append((hashes, new_slots[slots], anchors, shifts))
+        self._postings, self._pending = compacted
+        self._names = [self._names[slot] for slot in live_slots]
+        self._live = np.ones(len(self._names), dtype=bool)
+        for utterance, (added_at, slot, num_postings) in list(self._utterances.items()):
+            self._utterances[utterance] = (added_at, int(new_slots[slot]), num_postings)
+        self._dead_postings = 0
+
+    def evict(self, now=None):
+        """Removes the oldest utterances beyond `max_utterances` or `max_age_seconds`."""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._utterances:
+                utterance, (added_at, *_) = next(iter(self._utterances.items()))
+                if (
+                    len(self._utterances) <= self.max_utterances
+                    and now - added_at <= self.max_age_seconds
+                ):
+                    break
+                self.remove(utterance)
+
+    def match(self, audio):
+        """Returns the `ReplayMatch` of an attempt against every stored utterance."""
+        hashes, anchors = landmark_hashes(audio, self.sampling_rate)
+        return self.match_hashes(hashes, anchors)
+
+    def match_hashes(self, hashes, anchors):
+        """`match` on precomputed landmark hashes."""
+        if not len(hashes):
+            return ReplayMatch(False, None, 0, 0.0)
+        keys = []
+        with self._lock:
+            for postings in (self._postings, self._pending):
+                positions, queries = _lookup(postings, hashes)
+                slots = postings[1][positions]
+                live = self._live[slots]
+                positions, queries, slots = positions[live], queries[live], slots[live]
+                # Offsets are binned by 2 frames to tolerate slight misalignment
+                offsets = (postings[2][positions].astype(np.int64) - anchors[queries]) // 2
+                # One vote per (utterance, shift, offset), packed into one integer
+                keys.append(
+                    (slots.astype(np.int64) * self.num_shifts + postings[3][positions]) << 32
+                    | (offsets & 0xFFFFFFFF)
+                )
+            keys = np.concatenate(keys)
+            if not len(keys):
+                return ReplayMatch(False, None, 0, 0.0)
+            values, counts = np.unique(keys, return_counts=True)
+            best = int(np.argmax(counts))
+            utterance = self._names[int(values[best] >> 32) // self.num_shifts]
+        matches = int(counts[best])
+        fraction = matches / len(hashes)
+        is_replay = matches >= self.min_matches and fraction >= self.min_match_fraction
+        return ReplayMatch(is_replay, utterance, matches, fraction)
+
+    def _records(self):
+        """Returns the names, added at times and postings of every utterance, oldest first."""
+        names = list(self._utterances)
+        rank = np.full(len(self._names), -1, dtype=np.int64)
+        for i, name in enumerate(names):
+            rank[self._utterances[name][1]] = i
+        hashes, slots, anchors, shifts = _merge_postings(self._postings, self._pending)
+        owner = rank[slots]
+        keep = owner >= 0
+        order = np.argsort(owner[keep], kind="stable")
+        lengths = np.bincount(owner[keep], minlength=len(names))
+        return (
+            names,
+            [self._utterances[name][0] for name in names],
+            hashes[keep][order].astype(np.int64),
+            anchors[keep][order].astype(np.int64),
+            shifts[keep][order].astype(np.int64),
+            lengths.astype(np.int64),
+        )
+
+    def save(self, path):
+        """Writes the index to the directory `path`.
+
+        Both files are written to a temporary name and then renamed, and
+        share a random version, so `load` notices when a crash left the
+        hashes of one save next to the names of another.
+        """
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            names, added_at, hashes, anchors, shifts, lengths = self._records()
+        version = uuid.uuid4().hex
+        np.savez(
+            os.path.join(path, "replay_index.tmp.npz"),
+            hashes=hashes,
+            anchors=anchors,
+            shifts=shifts,
+            lengths=lengths,
+            version=np.array(version),
+        )
+        os.replace(
+            os.path.join(path, "replay_index.tmp.npz"),
+            os.path.join(path, "replay_index.npz"),
+        )
+        meta = {"version": version, "utterances": names, "added_at": added_at}
+        with open(os.path.join(path, "replay_index.json.tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(
+            os.path.join(path, "replay_index.json.tmp"),
+            os.path.join(path, "replay_index.json"),
+        )
+
+    def load(self, path):
+        """Adds the utterances saved in the directory `path`, then evicts expired ones."""
+        with open(os.path.join(path, "replay_index.json")) as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, "replay_index.npz")) as data:
+            lengths = data["lengths"]
+            version = str(data["version"]) if "version" in data.files else None
+            if len(meta["utterances"]) != len(lengths) or meta.get("version") != version:
+                raise ValueError(
+                    "The replay index in {} is inconsistent: {} names for {} hash sets, "
+                    "versions {} and {}".format(
+                        path, len(meta["utterances"]), len(lengths), meta.get("version"), version
+                    )
+                )
+            bounds = np.cumsum(lengths)[:-1]
+            hashes = np.split(data["hashes"], bounds)
+            anchors = np.split(data["anchors"], bounds)
+            # Indexes saved before sub-hop shifts hold the unshifted copy only
+            if "shifts" in data.files:
+                shifts = np.split(data["shifts"], bounds)
+            else:
+                shifts = [np.zeros(len(h), dtype=np.int64) for h in hashes]
+        with self._lock:
+            for name, added_at, h, t, shift in zip(
+                meta["utterances"], meta["added_at"], hashes, anchors, shifts
+            ):
+                self._add(name, h, t, shift, added_at)
+            self.evict()
@@ -0,0 +1,178 @@
+"""HTTP verification service that keeps the speaker model loaded between requests.
+
+`POST /verify` takes the bytes of a wav file and returns the speaker, the
+confidence and whether the user is authenticated, as JSON. The model is
+loaded on the first request, or at startup with `--preload`, and then
+reused; concurrent requests are merged by a `MicroBatcher` running on its
+own event loop thread. `GET /health` reports whether the model is loaded,
+and `GET /metrics` the per-stage timings when started with `--profile`.
+Usage:
+
+    python -m speaker_recognition serve --model model_int8.tflite --port 8000
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .audio import read_wav
+from .config import SAMPLING_RATE
+from .profiling import profiler
+from .verify import DEFAULT_THRESHOLD, add_model_arguments, threshold_from_arguments
+
+
+class VerificationService:
+    """Loads the engine lazily and scores probes through a `MicroBatcher`."""
+
+    def __init__(
+        self,
+        model_path,
+        class_names_path,
+        threshold=DEFAULT_THRESHOLD,
+        known_speakers=None,
+        max_batch_size=32,
+        max_wait_ms=2.0,
+    ):
+        self.model_path = model_path
+        self.class_names_path = class_names_path
+        self.threshold = threshold
+        self.known_speakers = known_speakers
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._batcher = None
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def loaded(self):
+        return self._batcher is not None
+
+    def batcher(self):
+        """Returns the batcher, loading the engine on the first call."""
+        from .engine import MicroBatcher, load_engine
+
+        with self._lock:
+            if self._batcher is None:
+                engine = load_engine(self.model_path, self.class_names_path, self.threshold)
+                # The batcher starts on the event loop with its first request
+                self._batcher = MicroBatcher(engine, self.max_batch_size, self.max_wait_ms)
+            return self._batcher
+
+    def verify(self, audio):
+        """Returns the result of one float32 waveform as a dict."""
+        batcher = self.batcher()
+        speaker, confidence = asyncio.run_coroutine_threadsafe(
+            batcher.predict(audio), self._loop
+        ).result()
+        known_speakers = self.known_speakers or batcher.engine.class_names
+        return {
+            "speaker": speaker,
+            "confidence": confidence,
+            "authenticated": speaker in known_speakers,
+        }
+
+    def close(self):
+        if self._batcher is not None:
+            asyncio.run_coroutine_threadsafe(self._batcher.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class VerificationHandler(BaseHTTPRequestHandler):
+    # Set on the subclass made by `make_server`
+    service = None
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok", "model_loaded": self.service.loaded})
+        elif self.path == "/metrics":
+            self._reply(200, {"enabled": profiler.enabled, "stages": profiler.snapshot()})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/verify":
+            self._reply(404, {"error": "not found"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            with profiler.stage("serve.parse"):
+                audio, rate = read_wav(io.BytesIO(body))
+        except Exception as e:
+            self._reply(400, {"error": "not a PCM wav file: {}".format(e)})
+            return
+        if rate != SAMPLING_RATE:
+            self._reply(
+                400, {"error": "sampling rate is {}, expected {}".format(rate, SAMPLING_RATE)}
+            )
+            return
+        try:
+            with profiler.stage("serve.verify"):
+                result = self.service.verify(audio[:, 0])
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, result)
+
+
+def make_server(service, host="127.0.0.1", port=8000):
+    """Returns a threaded HTTP server answering with `service`."""
+    handler = type("Handler", (VerificationHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve speaker verification over HTTP.")
+    add_model_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--known-speakers", nargs="+", default=None)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--preload", action="store_true", help="load the model before serving")
+    parser.add_argument(
+        "--profile", action="store_true", help="time every request stage, see GET /metrics"
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        from .profiling import enable
+
+        enable()
+
+    service = VerificationService(
+        args.model,
+        args.class_names,
+        threshold_from_arguments(args),
+        args.known_speakers,
+        args.max_batch_size,
+        args.max_wait_ms,
+    )
+    if args.preload:
+        service.batcher()
+    server = make_server(service, args.host, args.port)
+    print("Serving on http://{}:{}".format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Sliding-window speaker verification for recordings of any length.
+
+Audio is consumed incrementally, from a generator of PCM chunks or from a wav
+file read block by block. Overlapping 1 second windows are cut from it,
+silent windows are skipped with an energy-based voice activity detector, and
+the remaining ones go through the speaker model in batches. Class
+probabilities are averaged online, and verification stops as soon as the
+averaged confidence reaches the threshold.
+
+Only the last window of audio and one batch of windows are ever held in
+memory, however long the recording is.
+"""
+
+import os
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+from .audio import decode_pcm
+from .config import SAMPLING_RATE
+from .frontend import numpy_fft
+
+# Windows whose RMS level is below this many dB relative to full scale are
+# considered silent
+VAD_THRESHOLD_DB = -45.0
+
+StreamingResult = namedtuple(
+    "StreamingResult", ["speaker", "confidence", "windows", "skipped", "early_exit"]
+)
+
+
+def iter_wav_blocks(path, block_size=SAMPLING_RATE // 4, sampling_rate=SAMPLING_RATE):
+    """Yields the first channel of a wav file as float32 blocks of `block_size` samples."""
+    with wave.open(str(path), "rb") as f:
+        if f.getframerate() != sampling_rate:
+            raise ValueError(
+                "Sampling rate for {} is {}, expected {}".format(
+                    path, f.getframerate(), sampling_rate
+                )
+            )
+        while True:
+            frames = f.readframes(block_size)
+            if not frames:
+                return
+            yield decode_pcm(frames, f.getsampwidth(), f.getnchannels())[:, 0]
+
+
+def to_float_pcm(chunk):
+    """Converts a chunk of int16 bytes, int16 samples or float samples to float32."""
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        return np.frombuffer(chunk, dtype="<i2").astype(np.float32) / 32768
+    chunk = np.asarray(chunk)
+    if chunk.dtype == np.int16:
+        return chunk.astype(np.float32) / 32768
+    return chunk.astype(np.float32, copy=False).reshape(-1)
+
+
+def window_energy_db(windows):
+    """Returns the RMS level of each window in dB relative to full scale."""
+    rms = np.sqrt(np.mean(np.square(windows), axis=-1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+class StreamingVerifier:
+    """Scores a stream of audio with a speaker model, one batch of windows at a time.
+
+    Call `feed` with successive chunks, then `finish` to get the decision, or
+    use `verify` to do both from an iterable of chunks. `feed` returns True
+    once the confidence has reached `threshold`, at which point the remaining
+    audio can be dropped.
+    """
+
+    def __init__(
+        self,
+        model,
+        class_names,
+        threshold=0.94,
+        window=SAMPLING_RATE,
+        hop=SAMPLING_RATE // 2,
+        batch_size=8,
+        vad_threshold_db=VAD_THRESHOLD_DB,
+        min_windows=1,
+        frontend=numpy_fft,
+    ):
+        self.model = model
+        self.class_names = class_names
+        self.threshold = threshold
+        self.window = window
+        self.hop = hop
+        self.batch_size = batch_size
+        self.vad_threshold_db = vad_threshold_db
+        self.min_windows = min_windows
+        self.frontend = frontend
+        self.reset()
+
+    def reset(self):
+        """Forgets all the audio and scores seen so far."""
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._batch = []
+        self._probability_sum = np.zeros(len(self.class_names), dtype=np.float64)
+        self._windows = 0
+        self._skipped = 0
+        self._cut = 0
+        self._decided = False
+
+    @property
+    def confidence(self):
+        """Averaged probability of the most likely speaker so far."""
+        if self._windows == 0:
+            return 0.0
+        return float(self._probability_sum.max() / self._windows)
+
+    def feed(self, chunk):
+        """Adds a chunk of audio and returns True once the speaker is verified."""
+        if self._decided:
+            return True
+        chunk = to_float_pcm(chunk)
+        # Split large chunks so that no more than one window is ever pending
+        for start in range(0, len(chunk), self.hop):
+            self._pending = np.concatenate([self._pending, chunk[start : start + self.hop]])
+            while len(self._pending) >= self.window:
+                self._add_window(self._pending[: self.window])
+                self._pending = self._pending[self.hop :]
+                if self._decided:
+                    return True
+        return False
+
+    def _add_window(self, window):
+        self._cut += 1
+        if window_energy_db(window) < self.vad_threshold_db:
+            self._skipped += 1
+            return
+        self._batch.append(window)
+        if len(self._batch) == self.batch_size:
+            self._score_batch()
+
+    def _score_batch(self):
+        if not self._batch:
+            return
+        batch = np.stack(self._batch)[..., np.newaxis]
+        self._batch = []
+        probabilities = np.asarray(self.model(self.frontend(batch), training=False))
+        self._probability_sum += probabilities.sum(axis=0)
+        self._windows += len(probabilities)
+        if self._windows >= self.min_windows and self.confidence >= self.threshold:
+            self._decided = True
+
+    def finish(self):
+        """Scores the windows still pending and returns a `StreamingResult`."""
+        if not self._decided:
+            if self._cut == 0 and len(self._pending):
+                # Recordings shorter than one window are zero-padded, as
+                # `load_and_pad_audio` does
+                padded = np.zeros(self.window, dtype=np.float32)
+                padded[: len(self._pending)] = self._pending
+                self._add_window(padded)
+            self._score_batch()
+
+        speaker = "Unknown"
+        if self._windows and self.confidence >= self.threshold:
+            speaker = self.class_names[int(np.argmax(self._probability_sum))]
+        return StreamingResult(
+            speaker, self.confidence, self._windows, self._skipped, self._decided
+        )
+
+    def verify(self, chunks):
+        """Feeds `chunks` until the speaker is verified or the stream ends."""
+        self.reset()
+        for chunk in chunks:
+            if self.feed(chunk):
+                break
+        return self.finish()
+
+
+def predict_stream(source, model, class_names, threshold=0.94, **kwargs):
+    """Verifies a wav path or an iterable of PCM chunks and returns the speaker and confidence.
+
+    Like `predict`, the speaker is "Unknown" when the confidence is below the threshold.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = iter_wav_blocks(source)
+    result = StreamingVerifier(model, class_names, threshold, **kwargs).verify(source)
+    return result.speaker, result.confidence
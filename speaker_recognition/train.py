@@ -0,0 +1,263 @@
+"""The training pipeline of `Speaker Recognition.py`, as a function and a command.
+
+Nothing runs on import: the dataset folders are only rearranged by
+`prepare_dataset_folders`, and TensorFlow is loaded when training starts.
+Usage:
+
+    python -m speaker_recognition train --dataset-root ~/Downloads/16000_pcm_speeches
+"""
+
+import argparse
+import logging
+import math
+import os
+import shutil
+from pathlib import Path
+
+from .config import (
+    AUDIO_SUBFOLDER,
+    BATCH_SIZE,
+    DATASET_ROOT,
+    EPOCHS,
+    NOISE_SUBFOLDER,
+    SAMPLING_RATE,
+    SCALE,
+    SHUFFLE_SEED,
+)
+from .dataset import list_audio_paths, split_paths
+
+# Where the samples are read from during training:
+#   "files":         one read and decode per wav file, every epoch
+#   "packed":        a few large shards of fixed-length int16 records
+#   "feature_store": every clean sample decoded and transformed only once
+DATA_SOURCES = ("files", "packed", "feature_store")
+
+# Folders of the Kaggle archive that hold noise samples rather than a speaker
+NOISE_FOLDERS = ("other", "_background_noise_")
+
+# Folders the pipeline writes its caches to, next to `audio/` and `noise/`
+FEATURE_STORE_FOLDER = "feature_store"
+PACKED_FOLDER = "packed"
+NOISE_BANK_FOLDER = "noise_bank"
+
+
+def prepare_dataset_folders(dataset_root=DATASET_ROOT):
+    """Moves the Kaggle archive's speaker folders to `audio/` and its noise ones to `noise/`."""
+    audio_path = os.path.join(dataset_root, AUDIO_SUBFOLDER)
+    noise_path = os.path.join(dataset_root, NOISE_SUBFOLDER)
+    os.makedirs(audio_path, exist_ok=True)
+    os.makedirs(noise_path, exist_ok=True)
+    for folder in os.listdir(dataset_root):
+        if not os.path.isdir(os.path.join(dataset_root, folder)) or folder in (
+            AUDIO_SUBFOLDER,
+            NOISE_SUBFOLDER,
+            FEATURE_STORE_FOLDER,
+            PACKED_FOLDER,
+            NOISE_BANK_FOLDER,
+        ):
+            continue
+        destination = noise_path if folder in NOISE_FOLDERS else audio_path
+        shutil.move(os.path.join(dataset_root, folder), os.path.join(destination, folder))
+
+
+def list_noise_paths(dataset_noise_path):
+    """Returns the wav files of every noise folder."""
+    noise_paths = []
+    for subdir in os.listdir(dataset_noise_path):
+        subdir_path = Path(dataset_noise_path) / subdir
+        if os.path.isdir(subdir_path):
+            noise_paths += [
+                os.path.join(subdir_path, filepath)
+                for filepath in os.listdir(subdir_path)
+                if filepath.endswith(".wav")
+            ]
+    return noise_paths
+
+
+def make_datasets(
+    dataset_root,
+    class_names,
+    train_split,
+    valid_split,
+    noise_bank,
+    data_source="feature_store",
+    batch_size=BATCH_SIZE,
+):
+    """Returns the noisy training dataset, the validation dataset and the steps per epoch.
+
+    The training dataset repeats forever, so that the noise of every batch is
+    seeded from its epoch; pass the steps per epoch to `model.fit`.
+    """
+    import tensorflow as tf
+
+    from .augment import NoiseAugmenter
+    from .dataset import audio_to_fft, paths_and_labels_to_dataset
+
+    (train_audio_paths, train_labels), (valid_audio_paths, valid_labels) = train_split, valid_split
+    if data_source == "feature_store":
+        from .feature_store import FeatureStore
+
+        # The training set streams the clean waveforms, since noise is added
+        # to them before the FFT, while the validation set is served straight
+        # from the stored FFT
+        store = FeatureStore(os.path.join(dataset_root, FEATURE_STORE_FOLDER))
+        store.refresh(train_audio_paths + valid_audio_paths)
+        train_ds = store.to_dataset(train_audio_paths, train_labels, kind="audio", shuffle=True)
+        valid_ds = store.to_dataset(valid_audio_paths, valid_labels, kind="fft")
+    elif data_source == "packed":
+        from .packed import ensure_packed, packed_to_dataset
+
+        # Each split is repacked only when its files, labels or classes changed
+        packed_path = os.path.join(dataset_root, PACKED_FOLDER)
+        for split, paths, split_labels in [
+            ("train", train_audio_paths, train_labels),
+            ("valid", valid_audio_paths, valid_labels),
+        ]:
+            ensure_packed(
+                paths, split_labels, os.path.join(packed_path, split), class_names=class_names
+            )
+        train_ds = packed_to_dataset(
+            os.path.join(packed_path, "train"), shuffle_shards=True, seed=SHUFFLE_SEED
+        )
+        valid_ds = packed_to_dataset(os.path.join(packed_path, "valid"))
+    elif data_source == "files":
+        train_ds = paths_and_labels_to_dataset(train_audio_paths, train_labels)
+        valid_ds = paths_and_labels_to_dataset(valid_audio_paths, valid_labels)
+    else:
+        raise ValueError(
+            "Unknown data source {}, expected one of {}".format(data_source, DATA_SOURCES)
+        )
+
+    train_ds = train_ds.shuffle(buffer_size=batch_size * 8, seed=SHUFFLE_SEED).batch(batch_size)
+    valid_ds = valid_ds.shuffle(buffer_size=32 * 8, seed=SHUFFLE_SEED).batch(32)
+
+    steps_per_epoch = math.ceil(len(train_audio_paths) / batch_size)
+    noise_augmenter = NoiseAugmenter(noise_bank, scale=SCALE, seed=SHUFFLE_SEED)
+    train_ds = noise_augmenter.apply(train_ds, steps_per_epoch)
+    train_ds = train_ds.map(lambda x, y: (audio_to_fft(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+    train_ds = train_ds.prefetch(tf.data.AUTOTUNE)
+    if data_source != "feature_store":
+        valid_ds = valid_ds.map(
+            lambda x, y: (audio_to_fft(x), y), num_parallel_calls=tf.data.AUTOTUNE
+        )
+    valid_ds = valid_ds.prefetch(tf.data.AUTOTUNE)
+    return train_ds, valid_ds, steps_per_epoch
+
+
+def train(
+    dataset_root=DATASET_ROOT,
+    model_path="model.h5",
+    class_names_path="class_names.json",
+    epochs=EPOCHS,
+    batch_size=BATCH_SIZE,
+    data_source="feature_store",
+    int8_path=None,
+    profile=False,
+):
+    """Trains the speaker model on the dataset in `dataset_root` and saves it.
+
+    The best model by validation accuracy is written to `model_path`, and
+    its class names to `class_names_path`. With `int8_path`, an int8 TFLite
+    copy is exported too. With `profile`, the time and samples/sec of every
+    training step are logged after each epoch. Returns the model and its
+    training history.
+    """
+    from tensorflow import keras
+
+    from .enroll import save_class_names
+    from .model import build_model
+    from .noise_bank import build_noise_bank
+
+    dataset_audio_path = os.path.join(dataset_root, AUDIO_SUBFOLDER)
+    dataset_noise_path = os.path.join(dataset_root, NOISE_SUBFOLDER)
+    noise_bank = build_noise_bank(
+        list_noise_paths(dataset_noise_path), os.path.join(dataset_root, NOISE_BANK_FOLDER)
+    )
+
+    class_names, audio_paths, labels = list_audio_paths(dataset_audio_path)
+    print("Found {} files belonging to {} classes.".format(len(audio_paths), len(class_names)))
+    train_split, valid_split = split_paths(audio_paths, labels)
+    print(
+        "Using {} files for training and {} for validation.".format(
+            len(train_split[0]), len(valid_split[0])
+        )
+    )
+    train_ds, valid_ds, steps_per_epoch = make_datasets(
+        dataset_root, class_names, train_split, valid_split, noise_bank, data_source, batch_size
+    )
+
+    model = build_model((SAMPLING_RATE // 2, 1), len(class_names))
+    model.compile(optimizer="Adam", loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    save_class_names(class_names_path, class_names)
+    callbacks = [
+        keras.callbacks.EarlyStopping(patience=10, restore_best_weights=True),
+        keras.callbacks.ModelCheckpoint(model_path, monitor="val_accuracy", save_best_only=True),
+    ]
+    if profile:
+        from . import profiling
+
+        profiling.enable()
+        callbacks.append(profiling.training_callback(batch_size))
+    history = model.fit(
+        train_ds,
+        epochs=epochs,
+        steps_per_epoch=steps_per_epoch,
+        validation_data=valid_ds,
+        callbacks=callbacks,
+    )
+    print(model.evaluate(valid_ds))
+
+    if int8_path:
+        from .quantize import export_int8
+
+        export_int8(model, valid_ds, int8_path)
+    return model, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the speaker model.")
+    parser.add_argument("--dataset-root", default=DATASET_ROOT)
+    parser.add_argument(
+        "--prepare",
+        action="store_true",
+        help="first sort the Kaggle folders into audio/ and noise/",
+    )
+    parser.add_argument("--model", default="model.h5")
+    parser.add_argument("--class-names", default="class_names.json")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--data-source", choices=DATA_SOURCES, default="feature_store")
+    parser.add_argument("--int8", default=None, help="also export an int8 TFLite model here")
+    parser.add_argument(
+        "--profile", action="store_true", help="log per-step timings as JSON after each epoch"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="with --profile, also serve the timings at GET /metrics on this port",
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        from .profiling import start_metrics_server
+
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        if args.metrics_port is not None:
+            start_metrics_server(args.metrics_port)
+    if args.prepare:
+        prepare_dataset_folders(args.dataset_root)
+    train(
+        args.dataset_root,
+        args.model,
+        args.class_names,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        data_source=args.data_source,
+        int8_path=args.int8,
+        profile=args.profile,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Verifies recordings against a saved speaker model from the command line.
+
+Only the model runtime is loaded: a `.tflite` model runs without importing
+TensorFlow when `tflite_runtime` is installed. The exit status is 0 when
+every recording is authenticated and 1 otherwise. Usage:
+
+    python -m speaker_recognition verify --model model_int8.tflite probe.wav
+"""
+
+import argparse
+
+DEFAULT_THRESHOLD = 0.94
+
+
+def add_model_arguments(parser):
+    """Adds the model, class names and threshold options shared by `verify` and `serve`."""
+    parser.add_argument("--model", default="model.h5", help="Keras or .tflite model")
+    parser.add_argument("--class-names", default="class_names.json")
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument(
+        "--thresholds",
+        default=None,
+        help="use the EER threshold calibrated in this file by speaker_recognition.evaluation",
+    )
+
+
+def threshold_from_arguments(args):
+    if args.threshold is not None:
+        return args.threshold
+    if args.thresholds is not None:
+        from .evaluation import load_threshold
+
+        return load_threshold(args.thresholds, "speaker_model")
+    return DEFAULT_THRESHOLD
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify recordings against the speaker model.")
+    parser.add_argument("paths", nargs="+", help="wav files to verify")
+    add_model_arguments(parser)
+    parser.add_argument(
+        "--known-speakers", nargs="+", default=None, help="defaults to every class"
+    )
+    args = parser.parse_args(argv)
+
+    from .engine import authentication_message, load_engine
+
+    engine = load_engine(args.model, args.class_names, threshold_from_arguments(args))
+    known_speakers = args.known_speakers or engine.class_names
+    authenticated = True
+    for path, (speaker, confidence) in zip(args.paths, engine.predict_batch(args.paths)):
+        print("{}: {}".format(path, authentication_message(speaker, confidence, known_speakers)))
+        authenticated &= speaker in known_speakers
+    return 0 if authenticated else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from speaker_recognition.augment import NoiseAugmenter  # noqa: E402
+from speaker_recognition.noise_bank import NoiseBank  # noqa: E402
+
+SAMPLING_RATE = 1000
+STEPS_PER_EPOCH = 3
+
+
+def synthetic_bank(num_streams=3, seconds=4, seed=0):
+    rng = np.random.RandomState(seed)
+    length = seconds * SAMPLING_RATE
+    streams = rng.uniform(-0.5, 0.5, num_streams * length).astype(np.float32)
+    chunk_starts = list(range(0, len(streams), SAMPLING_RATE))
+    manifest = {
+        "sampling_rate": SAMPLING_RATE,
+        "sources": [
+            {"path": "synthetic-{}".format(i), "offset": i * length, "length": length}
+            for i in range(num_streams)
+        ],
+        "chunk_starts": chunk_starts,
+        "peaks": [float(streams[s : s + SAMPLING_RATE].max()) for s in chunk_starts],
+    }
+    return NoiseBank(streams, manifest)
+
+
+def epoch_dataset():
+    audio = np.full((STEPS_PER_EPOCH * 4, SAMPLING_RATE, 1), 0.25, dtype=np.float32)
+    labels = np.arange(len(audio), dtype=np.int32)
+    return tf.data.Dataset.from_tensor_slices((audio, labels)).batch(4)
+
+
+def noisy_batches(num_batches):
+    augmenter = NoiseAugmenter(synthetic_bank(), seed=7)
+    ds = augmenter.apply(epoch_dataset(), STEPS_PER_EPOCH)
+    return augmenter, [x.numpy() for x, _ in ds.take(num_batches)]
+
+
+def test_noise_of_every_batch_is_reproducible():
+    _, first = noisy_batches(2 * STEPS_PER_EPOCH)
+    _, second = noisy_batches(2 * STEPS_PER_EPOCH)
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_noise_is_seeded_by_epoch_and_batch():
+    augmenter, batches = noisy_batches(2 * STEPS_PER_EPOCH)
+    clean = np.full((4, SAMPLING_RATE, 1), 0.25, dtype=np.float32)
+    for i, batch in enumerate(batches):
+        epoch, batch_index = divmod(i, STEPS_PER_EPOCH)
+        np.testing.assert_array_equal(batch, augmenter(clean, batch_index, epoch).numpy())
+    # The same batch of the next epoch gets different noise
+    assert not np.array_equal(batches[0], batches[STEPS_PER_EPOCH])
+
+
+def test_apply_needs_a_known_epoch_length():
+    augmenter = NoiseAugmenter(synthetic_bank())
+    with pytest.raises(ValueError):
+        augmenter.apply(epoch_dataset().repeat())
@@ -0,0 +1,38 @@
+import threading
+
+import numpy as np
+
+from speaker_recognition.authentication import TwoLayerAuthenticator
+
+
+def test_raising_layer_rejects_and_cancels_the_others():
+    started = threading.Event()
+    stopped = threading.Event()
+
+    def slow_layer(audio, cancelled, user):
+        started.set()
+        if cancelled.wait(5):
+            stopped.set()
+        return True, "slow"
+
+    def failing_layer(audio, cancelled, user):
+        started.wait(5)
+        raise KeyError(user)
+
+    with TwoLayerAuthenticator({"slow": slow_layer, "failing": failing_layer}) as auth:
+        result = auth.authenticate(np.zeros(1600, dtype=np.float32), user="nobody")
+    assert not result.accepted
+    assert result.details["failing"] == {"error": "KeyError: 'nobody'"}
+    assert stopped.wait(5)
+
+
+def test_every_layer_accepting():
+    layers = {
+        "a": lambda audio, cancelled, user: (True, "a"),
+        "b": lambda audio, cancelled, user: (True, "b"),
+    }
+    with TwoLayerAuthenticator(layers) as auth:
+        result = auth.authenticate(np.zeros(1600, dtype=np.float32))
+    assert result.accepted
+    assert result.details == {"a": "a", "b": "b"}
+    assert "total" in result.timings_ms
@@ -0,0 +1,46 @@
+import numpy as np
+
+from speaker_recognition.embedding_index import EmbeddingIndex, l2_normalize
+
+
+def make_index(num_speakers=2, dim=8, seed=0):
+    rng = np.random.RandomState(seed)
+    index = EmbeddingIndex(dim=dim)
+    for i in range(num_speakers):
+        index.add("speaker_{}".format(i), rng.standard_normal(dim))
+    return index
+
+
+def test_save_load_round_trip(tmp_path):
+    index = make_index()
+    index.save(tmp_path)
+    loaded = EmbeddingIndex.load(tmp_path)
+    assert loaded.speakers == index.speakers
+    np.testing.assert_array_equal(loaded.embeddings, index.embeddings)
+
+
+def test_save_over_memory_mapped_source(tmp_path):
+    index = make_index()
+    index.save(tmp_path)
+
+    # Saving an unchanged memory-mapped index back to where it was loaded from
+    loaded = EmbeddingIndex.load(tmp_path, mmap=True)
+    loaded.save(tmp_path)
+    reloaded = EmbeddingIndex.load(tmp_path, mmap=False)
+    assert reloaded.speakers == index.speakers
+    np.testing.assert_array_equal(reloaded.embeddings, index.embeddings)
+
+    # ... and after a change, which copies the mapping first
+    loaded.add("speaker_new", np.ones(index.dim))
+    loaded.save(tmp_path)
+    reloaded = EmbeddingIndex.load(tmp_path, mmap=False)
+    assert reloaded.speakers == index.speakers + ["speaker_new"]
+    np.testing.assert_allclose(reloaded.embeddings[:2], index.embeddings)
+    np.testing.assert_allclose(reloaded.embeddings[2], l2_normalize(np.ones(index.dim)))
+
+
+def test_identify_known_and_unknown():
+    index = make_index()
+    probe = index.embeddings[1]
+    assert index.identify(probe)[0][0] == "speaker_1"
+    assert index.identify(-probe, threshold=0.5)[0][0] == "Unknown"
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+from speaker_recognition.evaluation import (
+    calibrate,
+    det_curve,
+    equal_error_rate,
+    load_threshold,
+    save_thresholds,
+    threshold_at_far,
+)
+
+
+def make_trials(num_genuine=300, num_impostor=2000, seed=0):
+    rng = np.random.RandomState(seed)
+    # Rounded, so that scores tie and thresholds fall on repeated values
+    genuine = np.round(rng.normal(2.0, 1.0, num_genuine), 2)
+    impostor = np.round(rng.normal(0.0, 1.0, num_impostor), 2)
+    return genuine, impostor
+
+
+def test_det_curve_matches_per_threshold_loop():
+    genuine, impostor = make_trials()
+    curve = det_curve(genuine, impostor)
+    for threshold, far, frr in zip(curve.thresholds, curve.far, curve.frr):
+        assert far == pytest.approx(np.mean(impostor >= threshold))
+        assert frr == pytest.approx(np.mean(genuine < threshold))
+
+
+def test_equal_error_rate_matches_per_threshold_loop():
+    genuine, impostor = make_trials()
+    eer, threshold = equal_error_rate(det_curve(genuine, impostor))
+
+    thresholds = np.unique(np.concatenate([genuine, impostor]))
+    far = np.array([np.mean(impostor >= t) for t in thresholds])
+    frr = np.array([np.mean(genuine < t) for t in thresholds])
+    k = int(np.argmax(far <= frr))
+    assert threshold == thresholds[k]
+    before, after = far[k - 1] - frr[k - 1], far[k] - frr[k]
+    expected = frr[k - 1] + before / (before - after) * (frr[k] - frr[k - 1])
+    assert eer == pytest.approx(expected)
+
+
+def test_threshold_at_far_matches_per_threshold_loop():
+    genuine, impostor = make_trials()
+    threshold, frr = threshold_at_far(det_curve(genuine, impostor), 0.01)
+
+    thresholds = np.unique(np.concatenate([genuine, impostor]))
+    expected = min(t for t in thresholds if np.mean(impostor >= t) <= 0.01)
+    assert threshold == expected
+    assert frr == pytest.approx(np.mean(genuine < expected))
+
+
+def test_threshold_at_far_raises_when_an_impostor_scores_highest():
+    genuine, impostor = make_trials()
+    impostor[0] = genuine.max() + 1
+    with pytest.raises(ValueError):
+        threshold_at_far(det_curve(genuine, impostor), 0.0001)
+
+
+def test_unreachable_far_is_saved_as_null(tmp_path):
+    # 2000 impostor trials cannot measure a FAR of 0.0001
+    genuine, impostor = make_trials()
+    calibration = calibrate(genuine, impostor, target_fars=(0.01, 0.0001))
+    assert calibration["far"]["0.0001"] == {"threshold": None, "frr": None}
+
+    path = str(tmp_path / "thresholds.json")
+    save_thresholds(path, "speaker_model", calibration)
+    with open(path) as f:
+        assert "Infinity" not in f.read()
+    assert load_threshold(path, "speaker_model", 0.01) == calibration["far"]["0.01"]["threshold"]
+    with pytest.raises(ValueError):
+        load_threshold(path, "speaker_model", 0.0001)
+    with open(path) as f:
+        assert json.load(f)["speaker_model"]["far"]["0.0001"]["threshold"] is None
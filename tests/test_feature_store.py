@@ -0,0 +1,62 @@
+import os
+import wave
+
+import numpy as np
+
+from speaker_recognition.feature_store import FeatureStore
+
+SAMPLING_RATE = 1000
+
+
+def write_wav(path, seed, mtime_ns):
+    audio = np.random.RandomState(seed).randint(-3000, 3000, SAMPLING_RATE).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLING_RATE)
+        f.writeframes(audio.tobytes())
+    # Explicit mtimes, so that a rewrite is noticed on coarse filesystem clocks
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return audio
+
+
+def make_files(directory, num_files):
+    paths = [str(directory / "{}.wav".format(i)) for i in range(num_files)]
+    audios = [write_wav(path, i, 10 ** 9) for i, path in enumerate(paths)]
+    return paths, audios
+
+
+def test_modified_file_is_rewritten_in_its_row(tmp_path):
+    paths, audios = make_files(tmp_path, 6)
+    store = FeatureStore(str(tmp_path / "store"), shard_size=4, sampling_rate=SAMPLING_RATE)
+    assert store.refresh(paths) == (6, 0)
+    before = dict(store.index["entries"])
+
+    audios[1] = write_wav(paths[1], 100, 2 * 10 ** 9)
+    assert store.refresh(paths) == (1, 0)
+    assert store.index["entries"][paths[1]][1:] == before[paths[1]][1:]
+    assert store.index["shards"] == {"shard-00000": 4, "shard-00001": 2}
+    np.testing.assert_array_equal(store.load(paths, kind="audio"), np.stack(audios))
+
+    # Reopened from disk
+    reopened = FeatureStore(str(tmp_path / "store"), shard_size=4, sampling_rate=SAMPLING_RATE)
+    assert reopened.refresh(paths) == (0, 0)
+    np.testing.assert_array_equal(reopened.load(paths, kind="audio"), np.stack(audios))
+
+
+def test_sparse_shards_are_compacted(tmp_path):
+    paths, audios = make_files(tmp_path, 8)
+    store = FeatureStore(str(tmp_path / "store"), shard_size=4, sampling_rate=SAMPLING_RATE)
+    store.refresh(paths)
+
+    # One removed row out of four is kept, a second one compacts the shard
+    store.refresh(paths[1:])
+    assert store.index["shards"] == {"shard-00000": 4, "shard-00001": 4}
+    store.refresh(paths[2:])
+    assert store.index["shards"] == {"shard-00001": 4, "shard-00002": 2}
+    assert not os.path.exists(str(tmp_path / "store" / "shard-00000.audio.npy"))
+    np.testing.assert_array_equal(store.load(paths[2:], kind="audio"), np.stack(audios[2:]))
+    expected_fft = store.load(paths[2:])
+    rebuilt = FeatureStore(str(tmp_path / "rebuilt"), shard_size=4, sampling_rate=SAMPLING_RATE)
+    rebuilt.refresh(paths[2:])
+    np.testing.assert_allclose(rebuilt.load(paths[2:]), expected_fft, rtol=1e-6)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from speaker_recognition.frontend import FRONTENDS, get_frontend  # noqa: E402
+
+
+def make_batch(batch_size=3, samples=4000, seed=0):
+    rng = np.random.RandomState(seed)
+    t = np.arange(samples) / 16000
+    tones = np.sin(2 * np.pi * rng.uniform(100, 4000, (batch_size, 1)) * t)
+    audio = 0.5 * tones + 0.05 * rng.standard_normal((batch_size, samples))
+    return audio[..., np.newaxis].astype(np.float32)
+
+
+@pytest.mark.parametrize("name", sorted(FRONTENDS))
+def test_numpy_frontend_matches_tensorflow(name):
+    audio = make_batch()
+    expected = np.asarray(get_frontend(name, "tf")(tf.constant(audio)))
+    actual = get_frontend(name, "numpy")(audio)
+    assert actual.shape == expected.shape
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-3)
+
+
+def test_frontend_keyword_arguments_are_bound():
+    audio = make_batch(batch_size=1)
+    actual = get_frontend("log_mel", "numpy", num_mel_bins=40)(audio)
+    expected = np.asarray(get_frontend("log_mel", "tf", num_mel_bins=40)(tf.constant(audio)))
+    assert actual.shape[-1] == 40
+    np.testing.assert_allclose(actual, expected, atol=1e-3)
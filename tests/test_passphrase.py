@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from speaker_recognition.passphrase import dtw_distance, frame_distances
+
+
+def naive_dtw(query, template, allowed=None):
+    """The textbook DTW recurrence, cell by cell, over the cells `allowed(i, j)`."""
+    n, m = len(query), len(template)
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if allowed is not None and not allowed(i - 1, j - 1):
+                continue
+            d = np.linalg.norm(query[i - 1] - template[j - 1])
+            cost[i, j] = d + min(cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1])
+    return cost[n, m] / (n + m)
+
+
+def sakoe_chiba(n, m, band):
+    radius = max(int(np.ceil(band * m)), int(np.ceil((m - 1) / max(n - 1, 1))), 1)
+
+    def allowed(i, j):
+        center = i * (m - 1) / max(n - 1, 1)
+        return np.floor(center - radius) <= j <= np.ceil(center + radius)
+
+    return allowed
+
+
+def sequences(n, m, seed):
+    rng = np.random.RandomState(seed)
+    return rng.standard_normal((n, 5)), rng.standard_normal((m, 5))
+
+
+def test_frame_distances_match_norms():
+    query, template = sequences(7, 9, 0)
+    expected = np.linalg.norm(query[:, np.newaxis] - template[np.newaxis], axis=-1)
+    np.testing.assert_allclose(frame_distances(query, template), expected, atol=1e-9)
+
+
+@pytest.mark.parametrize("n, m", [(1, 1), (1, 6), (6, 1), (12, 12), (10, 25), (30, 14)])
+def test_unbanded_dtw_matches_naive(n, m):
+    query, template = sequences(n, m, n * 100 + m)
+    # A band wider than the template allows every cell
+    assert dtw_distance(query, template, band=2.0) == pytest.approx(naive_dtw(query, template))
+
+
+@pytest.mark.parametrize("band", [0.05, 0.1, 0.2, 0.5])
+@pytest.mark.parametrize("n, m", [(12, 12), (10, 25), (30, 14), (40, 43)])
+def test_banded_dtw_matches_naive(n, m, band):
+    query, template = sequences(n, m, n * 100 + m)
+    expected = naive_dtw(query, template, sakoe_chiba(n, m, band))
+    assert dtw_distance(query, template, band=band) == pytest.approx(expected)
+    # The band only removes alignments
+    assert expected >= naive_dtw(query, template) - 1e-12
+
+
+def test_dtw_abandons_above_limit():
+    query, template = sequences(20, 24, 1)
+    distance = dtw_distance(query, template)
+    assert dtw_distance(query, template, abandon_above=distance * 1.01) == distance
+    assert dtw_distance(query, template, abandon_above=distance * 0.5) == np.inf
+    assert dtw_distance(query[:0], template) == np.inf
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from speaker_recognition.config import SAMPLING_RATE
+from speaker_recognition.frontend import FRAME_STEP
+from speaker_recognition.replay import ReplayIndex
+
+
+def chirps(seed, seconds=1.0):
+    """A few random chirps over background noise, like `benchmarks.replay`."""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * SAMPLING_RATE)) / SAMPLING_RATE
+    audio = 0.02 * rng.standard_normal(len(t))
+    for _ in range(6):
+        f0, f1 = rng.uniform(100, 4000, 2)
+        onset, length = rng.uniform(0, seconds), rng.uniform(0.1, 0.4)
+        active = (t >= onset) & (t < onset + length)
+        phase = 2 * np.pi * (f0 * t + (f1 - f0) * t ** 2 / (2 * seconds))
+        audio[active] += 0.3 * np.sin(phase[active])
+    return audio.astype(np.float32)
+
+
+def delayed(audio, shift):
+    return np.pad(audio, (shift, 0))[: len(audio)]
+
+
+@pytest.fixture(scope="module")
+def utterances():
+    return [chirps(seed) for seed in range(12)]
+
+
+def make_index(utterances, **kwargs):
+    index = ReplayIndex(**kwargs)
+    # A minute ago, one second apart, so the order is known
+    start = time.time() - 60
+    for i, audio in enumerate(utterances):
+        index.add(str(i), audio, added_at=start + i)
+    return index
+
+
+def test_replays_match_and_fresh_utterances_do_not(utterances):
+    index = make_index(utterances[:8])
+    for i, audio in enumerate(utterances[:8]):
+        match = index.match(audio)
+        assert match.is_replay and match.utterance == str(i)
+    for audio in utterances[8:]:
+        assert not index.match(audio).is_replay
+
+
+def test_sub_hop_shifts_catch_replays_between_frames(utterances):
+    single = make_index(utterances[:8], num_shifts=1)
+    shifted = make_index(utterances[:8])
+    # Half a hop is as far as a replay can fall from the stored framing
+    for i, audio in enumerate(utterances[:8]):
+        replay = delayed(audio, FRAME_STEP * 3 + FRAME_STEP // 2)
+        match = shifted.match(replay)
+        assert match.is_replay and match.utterance == str(i)
+        assert match.matches > single.match(replay).matches
+
+
+def test_remove_and_evict_forget_utterances(utterances):
+    index = make_index(utterances[:8], max_utterances=6)
+    assert len(index) == 6 and "0" not in index and "1" not in index
+    assert not index.match(utterances[0]).is_replay
+    index.remove("5")
+    assert index.match(utterances[5]).utterance != "5"
+    # Re-adding a name replaces its hashes
+    index.add("2", utterances[9])
+    assert index.match(utterances[9]).utterance == "2"
+    assert not index.match(utterances[2]).is_replay
+    # Only the re-added "2" is younger than a minute
+    index.evict(now=index._utterances["2"][0] + index.max_age_seconds - 1)
+    assert list(index._utterances) == ["2"]
+    # Removed postings are compacted away once they outnumber the live ones
+    assert index._dead_postings < index.num_postings
+    assert index.match(utterances[9]).utterance == "2"
+
+
+def test_save_load_round_trip(tmp_path, utterances):
+    index = make_index(utterances[:8])
+    index.remove("3")
+    index.save(str(tmp_path))
+    loaded = ReplayIndex()
+    loaded.load(str(tmp_path))
+    assert list(loaded._utterances) == list(index._utterances)
+    assert loaded.num_postings == index.num_postings
+    for audio in utterances:
+        assert loaded.match(audio) == index.match(audio)
+
+
+def test_load_rejects_mismatched_files(tmp_path, utterances):
+    make_index(utterances[:4]).save(str(tmp_path / "a"))
+    make_index(utterances[4:8]).save(str(tmp_path / "b"))
+    # The names of one save next to the hashes of another
+    os.replace(
+        str(tmp_path / "b" / "replay_index.json"), str(tmp_path / "a" / "replay_index.json")
+    )
+    with pytest.raises(ValueError):
+        ReplayIndex().load(str(tmp_path / "a"))
+
+    with open(str(tmp_path / "b" / "replay_index.json"), "w") as f:
+        json.dump({"version": None, "utterances": ["x"], "added_at": [0.0]}, f)
+    with pytest.raises(ValueError):
+        ReplayIndex().load(str(tmp_path / "b"))